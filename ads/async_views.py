@@ -0,0 +1,264 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from drf_spectacular.utils import extend_schema
+from rest_framework.decorators import permission_classes
+from rest_framework.pagination import _reverse_ordering
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .serializers import AdSerializer, ExchangeSerializer, CategorySerializer, ConditionSerializer
+from .services.ads_service import AdsService
+from .services.exchanges_service import ExchangeService
+from .services.listing_cache import ads_listing
+from .services.reference_cache import categories, conditions
+from .views import AdsCursorPagination, ExchangesCursorPagination, MostWantedCursorPagination, ReferenceDataView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView with coroutine handlers for ASGI deployments.
+
+    DRF authenticates, checks permissions and throttles synchronously, so that
+    step runs through sync_to_async; the handler itself awaits the async ORM.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncCursorPaginationMixin:
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Mirrors CursorPagination.paginate_queryset with the page read through the async ORM
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            order = self.ordering[0]
+            is_reversed = order.startswith('-')
+            order_attr = order.lstrip('-')
+
+            if self.cursor.reverse != is_reversed:
+                queryset = queryset.filter(**{order_attr + '__lt': current_position})
+            else:
+                queryset = queryset.filter(**{order_attr + '__gt': current_position})
+
+        results = [obj async for obj in queryset[offset:offset + self.page_size + 1].aiterator()]
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        return self.page
+
+
+class AsyncKeysetPaginationMixin:
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # KeysetCursorPagination.paginate_queryset with the page read through the async ORM
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page([row async for row in queryset.aiterator()])
+
+
+class AsyncAdsCursorPagination(AsyncKeysetPaginationMixin, AdsCursorPagination):
+    pass
+
+
+class AsyncExchangesCursorPagination(AsyncCursorPaginationMixin, ExchangesCursorPagination):
+    pass
+
+
+class AsyncMostWantedCursorPagination(AsyncKeysetPaginationMixin, MostWantedCursorPagination):
+    pass
+
+
+@extend_schema(
+    tags=["Объявления"],
+    summary="Получение объявлений с фильтрацией (async)",
+    description="Асинхронная версия /ads/ для ASGI с теми же параметрами и ответом.",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "example": "телефон"},
+                "category": {"type": "array", "items": {"type": "string"}, "example": ["Техника"]},
+                "condition": {"type": "array", "items": {"type": "string"}, "example": ["Б/у"]},
+                "sort": {"type": "string", "enum": ["created_at", "most_wanted"], "example": "most_wanted"}
+            }
+        }
+    },
+    responses=AdSerializer(many=True),
+)
+@permission_classes([IsAuthenticated])
+class AsyncAdsView(AsyncAPIView):
+    pagination_class = AsyncAdsCursorPagination
+    sort_pagination_classes = {'most_wanted': AsyncMostWantedCursorPagination}
+
+    async def post(self, request):
+        data = request.data
+
+        cache_key = await ads_listing.akey(request, data)
+        if cache_key is not None:
+            cached = await ads_listing.aget(cache_key)
+            if cached is not None:
+                return Response(cached, headers={'X-Cache': 'HIT'})
+
+        ads_service = AdsService()
+        ads_result = await ads_service.aall_ads(data)
+
+        if isinstance(ads_result, int):
+            return Response({'error': 'Invalid filters'}, status=ads_result)
+
+        ads_values = ads_service.ad_values(ads_result)
+        if cache_key is not None:
+            ads_values = ads_listing.source(ads_values)
+
+        paginator = self.sort_pagination_classes.get(data.get('sort'), self.pagination_class)()
+        rows = await paginator.apaginate_queryset(ads_values, request, view=self)
+        serialized_data = ads_service.ad_page(rows)
+
+        response = paginator.get_paginated_response(serialized_data)
+        if cache_key is not None:
+            await ads_listing.aset(cache_key, response.data)
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+@extend_schema(
+    tags=["Обмены"],
+    summary="Получение списка предложений обмена (async)",
+    description="Асинхронная версия /exchanges/ для ASGI с теми же параметрами и ответом.",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "sender_username": {"type": "string", "example": "user1"},
+                "receiver_username": {"type": "string", "example": "user2"},
+                "status": {"type": "array", "items": {"type": "string"}, "example": ["pending"]},
+                "compact": {"type": "boolean", "example": False}
+            }
+        }
+    },
+    responses=ExchangeSerializer(many=True),
+)
+@permission_classes([IsAuthenticated])
+class AsyncExchangesView(AsyncAPIView):
+    pagination_class = AsyncExchangesCursorPagination
+
+    async def post(self, request):
+        data = request.data
+        exchange_service = ExchangeService()
+        exchanges_result = await exchange_service.aall_exchanges(data, request.user)
+
+        if isinstance(exchanges_result, int):
+            return Response({'error': 'Invalid filters'}, status=exchanges_result)
+
+        paginator = self.pagination_class()
+        rows = await paginator.apaginate_queryset(exchange_service.compact_exchanges(exchanges_result),
+                                                  request, view=self)
+
+        if data.get('compact'):
+            return Response({
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                **exchange_service.compact_page(rows),
+            })
+
+        serialized_data = exchange_service.exchange_page(rows)
+
+        return paginator.get_paginated_response(serialized_data)
+
+
+@extend_schema(
+    tags=["Пользователь"],
+    summary="Информация о текущем пользователе (async)",
+    responses={200: {"type": "object", "properties": {"account": {"type": "string"}}}},
+)
+@permission_classes([IsAuthenticated])
+class AsyncUserInfoView(AsyncAPIView):
+    async def get(self, request):
+        return Response({"account": request.user.username})
+
+
+class AsyncReferenceDataView(AsyncAPIView, ReferenceDataView):
+    async def get(self, request):
+        rendered = await self.reference.amemoize(self.serializer_class, self.render_reference)
+        return self.reference_response(request, rendered)
+
+
+@extend_schema(
+    tags=["Справочники"],
+    summary="Получение всех категорий (async)",
+    responses=CategorySerializer(many=True),
+)
+@permission_classes([IsAuthenticated])
+class AsyncCategoriesView(AsyncReferenceDataView):
+    reference = categories
+    serializer_class = CategorySerializer
+
+
+@extend_schema(
+    tags=["Справочники"],
+    summary="Получение всех состояний товара (async)",
+    responses=ConditionSerializer(many=True),
+)
+@permission_classes([IsAuthenticated])
+class AsyncConditionsView(AsyncReferenceDataView):
+    reference = conditions
+    serializer_class = ConditionSerializer
@@ -0,0 +1,86 @@
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .services.auth_cache import token_versions, users
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from the token claims (id, username, is_active).
+
+    Anything the claims do not carry is read from the full User, which is
+    loaded through the bounded user cache on first use.
+    """
+
+    @cached_property
+    def username(self):
+        return self.token.get('username') or self.user.username
+
+    @cached_property
+    def is_active(self):
+        if 'is_active' in self.token:
+            return self.token['is_active']
+        # Tokens issued without the claim go by the stored user, a deleted one is not active
+        return self.user is not None and self.user.is_active
+
+    @cached_property
+    def user(self):
+        return users.get(self.id)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.user, attr)
+
+
+class ClaimsRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        # Access tokens derived from the refresh token copy these claims
+        token = super().for_user(user)
+        token['username'] = user.username
+        token['is_active'] = user.is_active
+        token[TOKEN_VERSION_CLAIM] = token_versions.get(user.pk)
+        return token
+
+
+def check_token_version(token):
+    if token.get(TOKEN_VERSION_CLAIM, 0) != token_versions.get(token[api_settings.USER_ID_CLAIM]):
+        raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication without a User query: the user comes from the token claims
+    and revocation is checked against the cached token version.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        check_token_version(validated_token)
+
+        # Tokens issued without the claims load the full user here, while still in sync code
+        if 'username' not in validated_token and user.user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        check_token_version(self.token_class(attrs['refresh']))
+        return super().validate(attrs)
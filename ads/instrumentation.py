@@ -0,0 +1,130 @@
+import json
+import logging
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Timings of the request being handled, set by RequestTimingMiddleware
+_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.sql_count = 0
+        self.durations = {'db': 0.0, 'serialize': 0.0, 'render': 0.0}
+
+    def add(self, name, duration):
+        self.durations[name] += duration
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.durations['db'] += perf_counter() - started
+
+    def header(self, total):
+        metrics = [f'db;dur={self.durations["db"] * 1000:.2f};desc="{self.sql_count} queries"']
+        metrics += [f'{name};dur={self.durations[name] * 1000:.2f}' for name in ('serialize', 'render')]
+        metrics.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def timing(name):
+    """Add the time spent in the block to the current request's Server-Timing metric."""
+
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, perf_counter() - started)
+
+
+class RequestTimingMiddleware:
+    """
+    Reports SQL count and time, serialization, rendering and total time of each request.
+
+    The numbers go to a Server-Timing header and to a JSON line on the
+    ads.instrumentation logger. Enabled by REQUEST_TIMING; otherwise the
+    middleware removes itself from the chain when it is loaded.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = perf_counter()
+        try:
+            with self.wrap_connections(timings):
+                response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.report(request, response, timings, perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        started = perf_counter()
+        # Connections belong to the thread that runs the ORM calls of this request, they are wrapped there
+        stack = await sync_to_async(self.wrap_connections)(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _timings.reset(token)
+        return self.report(request, response, timings, perf_counter() - started)
+
+    @staticmethod
+    def wrap_connections(timings):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timings))
+        return stack
+
+    @staticmethod
+    def report(request, response, timings, total):
+        response['Server-Timing'] = timings.header(total)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'sql_count': timings.sql_count,
+            **{f'{name}_ms': round(duration * 1000, 2) for name, duration in timings.durations.items()},
+        }
+        logger.info(json.dumps(record), extra={'timing': record})
+        return response
+
+    def process_template_response(self, request, response):
+        # Rendering happens right after this hook, so it ends in a post-render callback
+        timings = _timings.get()
+        started = perf_counter()
+        response.add_post_render_callback(lambda response: timings.add('render', perf_counter() - started))
+        return response
@@ -0,0 +1,156 @@
+import itertools
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ads.models import Ad, Category, Condition, ExchangeProposal
+
+CATEGORIES = ['Техника', 'Одежда', 'Дом', 'Детям', 'Спорт', 'Книги', 'Часы', 'Запчасти', 'Хобби', 'Животные',
+              'Музыка', 'Коллекции']
+CONDITIONS = ['Б/у', 'Новое', 'На запчасти']
+ITEMS = ['телефон', 'часы', 'куртка', 'велосипед', 'ноутбук', 'наушники', 'кроссовки', 'книга', 'гитара', 'самокат',
+         'планшет', 'рюкзак', 'фотоаппарат', 'коляска', 'диван', 'лампа', 'iphone', 'samsung', 'casio', 'nike',
+         'lego', 'sony', 'xiaomi', 'dyson', 'ikea', 'apple']
+ADJECTIVES = ['новый', 'хороший', 'рабочий', 'отличный', 'детский', 'зимний', 'кожаный', 'черный', 'белый',
+              'большой', 'маленький', 'редкий', 'винтажный', 'удобный', 'легкий', 'мощный']
+PHRASES = ['Состояние отличное', 'Без торга', 'Возможен обмен', 'Есть небольшие царапины', 'Полный комплект',
+           'Самовывоз', 'Почти не использовался', 'Документы и коробка в наличии', 'Рассмотрю предложения']
+COMMENTS = ['Давай меняться?', 'Интересует обмен', 'Могу доплатить', None]
+
+
+def zipf_weights(count, skew):
+    # Cumulative weights of rank ** -skew, the first item being the most popular
+    return list(itertools.accumulate((rank + 1) ** -skew for rank in range(count)))
+
+
+def parse_status_mix(value):
+    try:
+        mix = {status: float(weight) for status, weight in (item.split('=') for item in value.split(','))}
+    except ValueError:
+        raise CommandError(f'Invalid --status-mix "{value}", expected e.g. pending=60,accepted=25,declined=15')
+
+    unknown = set(mix) - {status for status, _ in ExchangeProposal.STATUS_CHOICES}
+    if unknown:
+        raise CommandError(f'Unknown statuses in --status-mix: {", ".join(sorted(unknown))}')
+    return mix
+
+
+class Command(BaseCommand):
+    help = ('Generates users, categories, conditions, ads and exchange proposals for load testing. '
+            'Rows are added on top of existing data; the same seed produces the same data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--ads', type=int, default=100_000)
+        parser.add_argument('--proposals', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--skew', type=float, default=0.8,
+                            help='Zipf exponent for popular categories, hot users and wanted ads (0 is uniform)')
+        parser.add_argument('--status-mix', default='pending=60,accepted=25,declined=15')
+        parser.add_argument('--username-prefix', default='user')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        rng = random.Random(options['seed'])
+        status_mix = parse_status_mix(options['status_mix'])
+        self.chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        categories = [Category.objects.get_or_create(name=name)[0] for name in CATEGORIES]
+        conditions = [Condition.objects.get_or_create(name=name)[0] for name in CONDITIONS]
+        user_ids = self.create_users(options['users'], options['username_prefix'])
+        ad_ids = self.create_ads(rng, options['ads'], user_ids, categories, conditions, options['skew'])
+        proposals = self.create_proposals(rng, options['proposals'], ad_ids, status_mix, options['skew'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(user_ids)} users, {len(ad_ids)} ads and {proposals} proposals '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def insert(self, model, objects, total, label, ignore_conflicts=False):
+        # Chunked bulk_create, one transaction per chunk
+        created = 0
+        for chunk in iter(lambda: list(itertools.islice(objects, self.chunk_size)), []):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, batch_size=self.chunk_size, ignore_conflicts=ignore_conflicts)
+            created += len(chunk)
+            if created % (self.chunk_size * 20) == 0 or created == total:
+                self.stdout.write(f'{label}: {created}/{total}')
+
+    def create_users(self, count, prefix):
+        start = User.objects.filter(username__startswith=prefix).count()
+        users = (User(username=f'{prefix}{i}', password='!') for i in range(start, start + count))
+        if count:
+            self.insert(User, users, count, 'users')
+        return list(User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True))
+
+    def create_ads(self, rng, count, user_ids, categories, conditions, skew):
+        if not user_ids:
+            raise CommandError('No users to own the ads, pass --users')
+
+        # Shuffled so that hot users are not simply the oldest accounts
+        hot_users = rng.sample(user_ids, len(user_ids))
+        user_weights = zipf_weights(len(hot_users), skew)
+        category_ids = [category.id for category in categories]
+        category_weights = zipf_weights(len(category_ids), skew)
+        condition_ids = [condition.id for condition in conditions]
+
+        def ads():
+            for _ in range(count):
+                item = rng.choice(ITEMS)
+                yield Ad(
+                    user_id=rng.choices(hot_users, cum_weights=user_weights)[0],
+                    title=f'{rng.choice(ADJECTIVES).capitalize()} {item} {rng.choice(ADJECTIVES)}',
+                    description=f'{item.capitalize()}. {". ".join(rng.sample(PHRASES, 3))}. '
+                                f'Модель {rng.randrange(100000)}',
+                    category_id=rng.choices(category_ids, cum_weights=category_weights)[0],
+                    condition_id=rng.choices(condition_ids, weights=[6, 3, 1])[0],
+                )
+
+        if count:
+            self.insert(Ad, ads(), count, 'ads')
+        return list(Ad.objects.order_by('id').values_list('id', flat=True))
+
+    def create_proposals(self, rng, count, ad_ids, status_mix, skew):
+        # Returns how many proposals were inserted, skipped pending duplicates are not counted
+        if count and len(ad_ids) < 2:
+            raise CommandError('At least two ads are needed for proposals, pass --ads')
+
+        # A few ads get most of the offers
+        wanted_ads = rng.sample(ad_ids, len(ad_ids))
+        wanted_weights = zipf_weights(len(wanted_ads), skew)
+        statuses, status_weights = list(status_mix), list(status_mix.values())
+
+        def proposals():
+            pending_pairs = set()
+            for _ in range(count):
+                # A pair can have one pending proposal (exchange_pending_pair_uniq), so a repeat is drawn again
+                for _ in range(100):
+                    ad_receiver_id = rng.choices(wanted_ads, cum_weights=wanted_weights)[0]
+                    ad_sender_id = rng.choice(ad_ids)
+                    while ad_sender_id == ad_receiver_id:
+                        ad_sender_id = rng.choice(ad_ids)
+                    proposal_status = rng.choices(statuses, weights=status_weights)[0]
+                    if proposal_status != 'pending' or (ad_sender_id, ad_receiver_id) not in pending_pairs:
+                        break
+                if proposal_status == 'pending':
+                    pending_pairs.add((ad_sender_id, ad_receiver_id))
+                yield ExchangeProposal(ad_sender_id=ad_sender_id, ad_receiver_id=ad_receiver_id,
+                                       status=proposal_status, comment=rng.choice(COMMENTS))
+
+        if not count:
+            return 0
+
+        # Pending pairs already in the database are skipped
+        before = ExchangeProposal.objects.count()
+        self.insert(ExchangeProposal, proposals(), count, 'proposals', ignore_conflicts=True)
+        # bulk_create bypasses the services that keep the Ad proposal counters
+        call_command('reconcile_proposal_counts', chunk_size=self.chunk_size, stdout=self.stdout)
+        return ExchangeProposal.objects.count() - before
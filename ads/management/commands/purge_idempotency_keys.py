@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ads.services.idempotency_service import IdempotencyService
+
+
+class Command(BaseCommand):
+    help = ('Deletes idempotency keys older than IDEMPOTENCY_KEY_TTL seconds, '
+            'one transaction per --chunk-size keys.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        started = time.perf_counter()
+        idempotency_service = IdempotencyService()
+        deleted = 0
+
+        while True:
+            purged = idempotency_service.purge(chunk_size)
+            deleted += purged
+            if purged < chunk_size:
+                break
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired idempotency keys in {time.perf_counter() - started:.1f}s'
+        ))
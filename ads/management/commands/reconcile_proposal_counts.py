@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from ads.models import Ad
+from ads.services.exchanges_service import ExchangeService
+from ads.services.listing_cache import ads_listing
+
+
+class Command(BaseCommand):
+    help = ('Recomputes Ad.received_count and Ad.pending_count from the exchange proposals, '
+            'one transaction per range of --chunk-size ad ids.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        started = time.perf_counter()
+        bounds = Ad.objects.aggregate(first=Min('id'), last=Max('id'))
+        exchange_service = ExchangeService()
+        fixed = 0
+
+        if bounds['first'] is not None:
+            for from_id in range(bounds['first'], bounds['last'] + 1, chunk_size):
+                fixed += exchange_service.reconcile_counts(from_id, from_id + chunk_size)
+                if (from_id - bounds['first']) // chunk_size % 20 == 19:
+                    self.stdout.write(f'ads: {from_id + chunk_size - bounds["first"]}/'
+                                      f'{bounds["last"] - bounds["first"] + 1} ids checked')
+
+        if fixed:
+            ads_listing.invalidate_popularity()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed the proposal counts of {fixed} ads in {time.perf_counter() - started:.1f}s'
+        ))
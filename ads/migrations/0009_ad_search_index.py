@@ -0,0 +1,36 @@
+import ads.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+from ads.services.search_service import SQLiteFTSSearchBackend
+
+
+def install_search_index(apps, schema_editor):
+    SQLiteFTSSearchBackend().install(schema_editor)
+
+
+def uninstall_search_index(apps, schema_editor):
+    SQLiteFTSSearchBackend().uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0008_alter_exchangeproposal_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdSearchDocument',
+            fields=[
+                ('ad', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='ads.ad')),
+                ('document', ads.models.SearchDocumentField(db_column='ads_ad_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'ads_ad_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from ads.services.search_service import SQLiteFTSSearchBackend
+
+
+def install_search_triggers(apps, schema_editor):
+    # SQLite rebuilds ads_ad to drop the foreign key indexes, which drops its triggers
+    SQLiteFTSSearchBackend().install_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0009_ad_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_search_triggers),
+        migrations.AlterField(
+            model_name='ad',
+            name='category',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='ads.category'),
+        ),
+        migrations.AlterField(
+            model_name='ad',
+            name='condition',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='ads.condition'),
+        ),
+        migrations.AlterField(
+            model_name='ad',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='exchangeproposal',
+            name='ad_receiver',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='receiver_proposals', to='ads.ad'),
+        ),
+        migrations.AlterField(
+            model_name='exchangeproposal',
+            name='ad_sender',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sent_proposals', to='ads.ad'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['created_at', 'id'], name='ad_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='ad_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['condition', 'created_at', 'id'], name='ad_condition_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['user', 'created_at'], name='ad_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeproposal',
+            index=models.Index(fields=['created_at', 'id'], name='exchange_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeproposal',
+            index=models.Index(fields=['status', 'created_at'], name='exchange_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeproposal',
+            index=models.Index(fields=['ad_sender', 'status', 'created_at'], name='exchange_sender_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exchangeproposal',
+            index=models.Index(fields=['ad_receiver', 'status', 'created_at'], name='exchange_receiver_status_idx'),
+        ),
+        migrations.RunPython(install_search_triggers, migrations.RunPython.noop),
+    ]
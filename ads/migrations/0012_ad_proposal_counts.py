@@ -0,0 +1,55 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:34
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from ads.services.search_service import SQLiteFTSSearchBackend
+
+
+def install_search_triggers(apps, schema_editor):
+    # SQLite rebuilds ads_ad to add the NOT NULL columns, which drops its triggers
+    SQLiteFTSSearchBackend().install_triggers(schema_editor)
+
+
+def count_proposals(apps, schema_editor):
+    Ad = apps.get_model('ads', 'Ad')
+    ExchangeProposal = apps.get_model('ads', 'ExchangeProposal')
+    db = schema_editor.connection.alias
+
+    def received(**filters):
+        return Coalesce(Subquery(
+            ExchangeProposal.objects.using(db).filter(ad_receiver=OuterRef('pk'), **filters)
+            .order_by().values('ad_receiver').annotate(count=Count('*')).values('count')
+        ), 0)
+
+    Ad.objects.using(db).update(received_count=received(), pending_count=received(status='pending'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0011_user_token_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_search_triggers),
+        migrations.AddField(
+            model_name='ad',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='received_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['received_count', 'created_at', 'id'], name='ad_received_created_idx'),
+        ),
+        migrations.RunPython(count_proposals, migrations.RunPython.noop),
+        migrations.RunPython(install_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:54
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def decline_duplicates(apps, schema_editor):
+    # Keeps the oldest pending proposal of each pair and declines the rest, then recounts their receivers
+    Ad = apps.get_model('ads', 'Ad')
+    ExchangeProposal = apps.get_model('ads', 'ExchangeProposal')
+    db = schema_editor.connection.alias
+
+    pending = ExchangeProposal.objects.using(db).filter(status='pending')
+    duplicates = pending.filter(Exists(pending.filter(ad_sender=OuterRef('ad_sender'),
+                                                      ad_receiver=OuterRef('ad_receiver'), id__lt=OuterRef('id'))))
+    receiver_ids = list(duplicates.order_by().values_list('ad_receiver', flat=True).distinct())
+    if not receiver_ids:
+        return
+
+    duplicates.update(status='declined')
+    pending_count = Coalesce(Subquery(
+        pending.filter(ad_receiver=OuterRef('pk')).order_by().values('ad_receiver')
+        .annotate(count=Count('*')).values('count')
+    ), 0)
+    for start in range(0, len(receiver_ids), 500):
+        Ad.objects.using(db).filter(id__in=receiver_ids[start:start + 500]).update(pending_count=pending_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0013_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(decline_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exchangeproposal',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('ad_sender', 'ad_receiver'), name='exchange_pending_pair_uniq'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:09
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+STATUS_LABELS = {'Ожидает': 'pending', 'Принято': 'accepted', 'Отклонено': 'declined'}
+
+
+def store_status_keys(apps, schema_editor):
+    # edit-exchange used to store display labels. A pair pending under either spelling keeps its oldest
+    # proposal, as in 0014, the rest are declined before the labels become keys; their receivers are recounted
+    Ad = apps.get_model('ads', 'Ad')
+    ExchangeProposal = apps.get_model('ads', 'ExchangeProposal')
+    db = schema_editor.connection.alias
+
+    proposals = ExchangeProposal.objects.using(db)
+    pending = proposals.filter(status__in=['pending', 'Ожидает'])
+    receiver_ids = list(proposals.filter(status='Ожидает').order_by().values_list('ad_receiver', flat=True).distinct())
+    if not receiver_ids and not proposals.filter(status__in=list(STATUS_LABELS)).exists():
+        return
+
+    pending.filter(Exists(pending.filter(ad_sender=OuterRef('ad_sender'), ad_receiver=OuterRef('ad_receiver'),
+                                         id__lt=OuterRef('id')))).update(status='declined')
+    for label, key in STATUS_LABELS.items():
+        proposals.filter(status=label).update(status=key)
+
+    pending_count = Coalesce(Subquery(
+        proposals.filter(status='pending', ad_receiver=OuterRef('pk')).order_by().values('ad_receiver')
+        .annotate(count=Count('*')).values('count')
+    ), 0)
+    for start in range(0, len(receiver_ids), 500):
+        Ad.objects.using(db).filter(id__in=receiver_ids[start:start + 500]).update(pending_count=pending_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0014_exchange_pending_pair_uniq'),
+    ]
+
+    operations = [
+        migrations.RunPython(store_status_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exchangeproposal',
+            constraint=models.CheckConstraint(condition=models.Q(('status__in', ['pending', 'accepted', 'declined'])), name='exchange_status_valid'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import Lookup
 
 
 # Create your models here.
@@ -18,17 +19,58 @@ class Condition(models.Model):
 
 
 class Ad(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     title = models.CharField(max_length=100)
     description = models.CharField(max_length=350)
-    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True)
-    condition = models.ForeignKey(Condition, on_delete=models.CASCADE, null=True)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, db_index=False)
+    condition = models.ForeignKey(Condition, on_delete=models.CASCADE, null=True, db_index=False)
+    # Denormalized counts of received proposals, all and pending, kept up to date by the services
+    # and recomputed by the reconcile_proposal_counts command
+    received_count = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Foreign keys are covered by the leading column of these indexes
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='ad_created_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='ad_category_created_idx'),
+            models.Index(fields=['condition', 'created_at', 'id'], name='ad_condition_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='ad_user_created_idx'),
+            models.Index(fields=['received_count', 'created_at', 'id'], name='ad_received_created_idx'),
+        ]
 
     def __str__(self):
         return f"[ID: {self.id}] AUTHOR: {self.user} | TITLE: {self.title} CATEGORY: {self.category}"
 
 
+class SearchDocumentField(models.TextField):
+    # FTS5 hidden column named after the table itself, used as the left side of MATCH
+    pass
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class AdSearchDocument(models.Model):
+    # Read-only view of the full-text index maintained by ads.services.search_service
+    ad = models.OneToOneField(Ad, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                              related_name='search_document')
+    document = SearchDocumentField(db_column='ads_ad_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'ads_ad_fts'
+
+
 class ExchangeProposal(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Ожидает'),
@@ -37,8 +79,9 @@ class ExchangeProposal(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
-    ad_sender = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='sent_proposals')
-    ad_receiver = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='receiver_proposals')
+    ad_sender = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='sent_proposals', db_index=False)
+    ad_receiver = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='receiver_proposals',
+                                    db_index=False)
     status = models.CharField(
         max_length=10,
         choices=STATUS_CHOICES,
@@ -46,5 +89,52 @@ class ExchangeProposal(models.Model):
     )
     comment = models.CharField(max_length=350, null=True)
 
+    class Meta:
+        # Foreign keys are covered by the leading column of these indexes
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='exchange_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='exchange_status_created_idx'),
+            models.Index(fields=['ad_sender', 'status', 'created_at'], name='exchange_sender_status_idx'),
+            models.Index(fields=['ad_receiver', 'status', 'created_at'], name='exchange_receiver_status_idx'),
+        ]
+        # One pending proposal per pair of ads; the partial index also serves pending lookups by pair
+        constraints = [
+            models.CheckConstraint(condition=models.Q(status__in=['pending', 'accepted', 'declined']),
+                                   name='exchange_status_valid'),
+            models.UniqueConstraint(fields=['ad_sender', 'ad_receiver'], condition=models.Q(status='pending'),
+                                    name='exchange_pending_pair_uniq'),
+        ]
+
     def __str__(self):
         return f"[ID: {self.id}] STATUS: {self.status} AD_SENDER: {self.ad_sender.id} AD_RECEIVER: {self.ad_receiver.id}"
+
+
+class UserTokenVersion(models.Model):
+    # Bumped to revoke every JWT issued to the user; tokens carry the version they were issued with
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='token_version')
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"USER: {self.user_id} TOKEN VERSION: {self.version}"
+
+
+class IdempotencyKey(models.Model):
+    # Response to the first request sent with an Idempotency-Key header, replayed to its retries
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=50)
+    # SHA-256 of the request body, a retry has to send the same one
+    fingerprint = models.CharField(max_length=64)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"USER: {self.user_id} KEY: {self.key} ENDPOINT: {self.endpoint}"
@@ -1,10 +1,20 @@
 from rest_framework import serializers
+from .instrumentation import timing
 from .models import Ad, Category, Condition, ExchangeProposal
+from .services.reference_cache import categories, conditions
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 
+class TimedListSerializer(serializers.ListSerializer):
+    # Reports list serialization as the "serialize" Server-Timing metric
+    @property
+    def data(self):
+        with timing('serialize'):
+            return super().data
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -26,6 +36,7 @@ class AdSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ad
+        list_serializer_class = TimedListSerializer
         fields = [
             'id',
             'user',
@@ -43,15 +54,13 @@ class AdSerializer(serializers.ModelSerializer):
         condition_name = data.pop('condition_name', None)
 
         if category_name:
-            try:
-                data['category'] = Category.objects.get(name=category_name)
-            except Category.DoesNotExist:
+            data['category'] = categories.get(category_name)
+            if data['category'] is None:
                 raise serializers.ValidationError({'category': 'Invalid category name'})
 
         if condition_name:
-            try:
-                data['condition'] = Condition.objects.get(name=condition_name)
-            except Condition.DoesNotExist:
+            data['condition'] = conditions.get(condition_name)
+            if data['condition'] is None:
                 raise serializers.ValidationError({'condition': 'Invalid condition name'})
 
         return data
@@ -64,6 +73,7 @@ class ExchangeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ExchangeProposal
+        list_serializer_class = TimedListSerializer
         fields = [
             'id',
             'ad_sender',
@@ -1,6 +1,22 @@
-from django.db.models import Q
+from django.db import router, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 from rest_framework import status
 from ..models import *
+from ..instrumentation import timing
+from .barter_graph import barter_graph
+from .database import run_with_lock_retry
+from .exchanges_service import COMPACT_AD_FIELDS, PENDING_STATUS, ad_from_row, datetime_formatter, proposal_count
+from .listing_cache import ads_listing
+from .reference_cache import categories, conditions
+from .search_service import SEARCH_RANK, get_search_backend
+
+
+# Keys of the proposal counts in my_ads and the ExchangeProposal field pointing at the ad
+PROPOSAL_DIRECTIONS = (('received', 'ad_receiver'), ('sent', 'ad_sender'))
+# Values of the "sort" filter; most_wanted orders by Ad.received_count
+DEFAULT_SORT = 'created_at'
+AD_SORTS = (DEFAULT_SORT, 'most_wanted')
 
 
 class AdsService:
@@ -9,36 +25,95 @@ class AdsService:
         self.Category = Category.objects
         self.Condition = Condition.objects
         self.User = User.objects
+        self.ExchangeProposal = ExchangeProposal.objects
 
-    def create_ad(self, username, data):
-        try:
-            title = data.get('title')
-            description = data.get('description')
-            category_name = data.get('category')
-            condition_name = data.get('condition')
+    # Max number of ads accepted by create_ads in one request
+    BULK_CREATE_LIMIT = 500
 
-            if not all([username, title, description, category_name, condition_name]):
-                return {'is_created': False,
-                        'message': 'Send all required fields (username, title, description, category, condition)'}
+    def _build_ad(self, user, data):
+        # Unsaved Ad for the create payload, or an error message
+        title = data.get('title')
+        description = data.get('description')
+        category_name = data.get('category')
+        condition_name = data.get('condition')
+
+        if not all([user, title, description, category_name, condition_name]):
+            return None, 'Send all required fields (username, title, description, category, condition)'
+
+        if not all(isinstance(value, str) for value in (title, description, category_name, condition_name)):
+            return None, 'Title, description, category and condition must be strings'
 
-            if not self.Category.filter(name=category_name).exists():
-                return {'is_created': False, 'message': f'Invalid category: {category_name}'}
+        for field, value in (('title', title), ('description', description)):
+            max_length = Ad._meta.get_field(field).max_length
+            if len(value) > max_length:
+                return None, f'{field.capitalize()} must be at most {max_length} characters'
 
-            if not self.Condition.filter(name=condition_name).exists():
-                return {'is_created': False, 'message': f'Invalid condition: {condition_name}'}
+        category_obj = categories.get(category_name)
+        if category_obj is None:
+            return None, f'Invalid category: {category_name}'
 
-            user_obj = self.User.get(username=username)
-            category_obj = self.Category.get(name=category_name)
-            condition_obj = self.Condition.get(name=condition_name)
-            self.Ad.create(user=user_obj, title=title, description=description,
-                           category=category_obj, condition=condition_obj)
+        condition_obj = conditions.get(condition_name)
+        if condition_obj is None:
+            return None, f'Invalid condition: {condition_name}'
+
+        return Ad(user_id=user.id, title=title, description=description,
+                  category=category_obj, condition=condition_obj), None
+
+    def create_ad(self, user, data):
+        try:
+            ad_obj, message = self._build_ad(user, data)
+            if ad_obj is None:
+                return {'is_created': False, 'message': message}
+
+            run_with_lock_retry(lambda: ad_obj.save(force_insert=True), Ad)
 
             return {'is_created': True,
-                    'message': f'Ad created successfully ({username}, {title}, {category_name}, {condition_name})'}
+                    'message': f'Ad created successfully ({user.username}, {ad_obj.title}, '
+                               f'{ad_obj.category.name}, {ad_obj.condition.name})'}
+        except Exception as e:
+            return {'is_created': False, 'message': str(e)}
+
+    def create_ads(self, user, data):
+        try:
+            items = data.get('ads')
+
+            if not isinstance(items, list) or not items:
+                return {'is_created': False, 'message': 'Send a non-empty list of ads'}
+
+            if len(items) > self.BULK_CREATE_LIMIT:
+                return {'is_created': False,
+                        'message': f'Too many ads, send at most {self.BULK_CREATE_LIMIT} per request'}
+
+            results = []
+            valid = []
+            for index, item in enumerate(items):
+                ad_obj, message = self._build_ad(user, item) if isinstance(item, dict) else (None, 'Ad must be an object')
+                if ad_obj is None:
+                    results.append({'index': index, 'is_created': False, 'message': message})
+                else:
+                    results.append({'index': index, 'is_created': True, 'id': None})
+                    valid.append((index, ad_obj))
+
+            def insert():
+                # bulk_create runs its batches in one transaction; a retry starts over without ids
+                for _, ad_obj in valid:
+                    ad_obj.pk = None
+                return self.Ad.bulk_create([ad_obj for _, ad_obj in valid])
+
+            created = run_with_lock_retry(insert, Ad)
+            for (index, _), ad_obj in zip(valid, created):
+                results[index]['id'] = ad_obj.id
+            # bulk_create sends no post_save signals
+            if valid:
+                ads_listing.invalidate(ad_obj.category_id for _, ad_obj in valid)
+
+            return {'is_created': bool(valid),
+                    'message': f'Created {len(valid)} of {len(items)} ads',
+                    'results': results}
         except Exception as e:
             return {'is_created': False, 'message': str(e)}
 
-    def delete_ad(self, username, data):
+    def delete_ad(self, user, data):
         try:
             ad_id = data.get('ad_id')
 
@@ -46,21 +121,36 @@ class AdsService:
                 return {'is_deleted': False,
                         'message': 'Send all required fields (username, ad_id)'}
 
-            if not self.User.filter(username=username).exists():
-                return {'is_deleted': False, 'message': f'Invalid username (now: {username})'}
-
-            user_obj = self.User.get(username=username)
-            if not self.Ad.filter(id=ad_id, user=user_obj).exists():
+            db = router.db_for_write(Ad)
+
+            def delete():
+                with transaction.atomic(using=db, savepoint=False):
+                    # The ads this one made offers to lose those proposals from their counters
+                    sent = self.ExchangeProposal.filter(ad_sender_id=ad_id, ad_sender__user_id=user.id)
+                    self.Ad.filter(id__in=sent.values('ad_receiver_id')).update(
+                        received_count=Greatest(
+                            F('received_count') - proposal_count('ad_receiver', ad_sender_id=ad_id), Value(0)),
+                        pending_count=Greatest(
+                            F('pending_count') - proposal_count('ad_receiver', ad_sender_id=ad_id,
+                                                                status=PENDING_STATUS), Value(0)),
+                    )
+                    # The collector selects the ad, then deletes its proposals in one query and the ad;
+                    # post_delete drops the listing pages of its category
+                    return self.Ad.filter(id=ad_id, user_id=user.id).delete()[1].get(Ad._meta.label, 0)
+
+            deleted = run_with_lock_retry(delete, Ad)
+            if deleted:
+                transaction.on_commit(lambda: barter_graph.remove_ad(int(ad_id)), using=db)
+
+            if not deleted:
                 return {'is_deleted': False,
                         'message': f'Ad with ID:{ad_id} does not exist or does not belong to the user'}
 
-            self.Ad.filter(id=ad_id, user=user_obj).delete()
-
             return {'is_deleted': True, 'message': 'Ad successfully deleted'}
         except Exception as e:
             return {'is_deleted': False, 'message': str(e)}
 
-    def edit_ad(self, username, data):
+    def edit_ad(self, user, data):
         try:
             ad_id = data.get('ad_id')
             title = data.get('title')
@@ -72,67 +162,112 @@ class AdsService:
                 return {'is_edited': False,
                         'message': 'Send all required fields (username, ad_id, title, description, category_name, condition_name)'}
 
-            if not self.User.filter(username=username).exists():
-                return {'is_edited': False, 'message': f'Invalid username (now: {username})'}
-
-            user_obj = self.User.get(username=username)
-            if not self.Ad.filter(id=ad_id, user=user_obj).exists():
-                return {'is_edited': False,
-                        'message': f'Ad with ID "{ad_id}" does not exist or does not belong to the user'}
-
-            if not self.Category.filter(name=category_name).exists():
+            category_obj = categories.get(category_name)
+            if category_obj is None:
                 return {'is_edited': False, 'message': f'Invalid category: {category_name}'}
 
-            if not self.Condition.filter(name=condition_name).exists():
+            condition_obj = conditions.get(condition_name)
+            if condition_obj is None:
                 return {'is_edited': False, 'message': f'Invalid condition: {condition_name}'}
 
-            category_obj = self.Category.get(name=category_name)
-            condition_obj = self.Condition.get(name=condition_name)
+            edited = run_with_lock_retry(lambda: self.Ad.filter(id=ad_id, user_id=user.id).update(
+                title=title, description=description, category=category_obj, condition=condition_obj
+            ), Ad)
+            if not edited:
+                return {'is_edited': False,
+                        'message': f'Ad with ID "{ad_id}" does not exist or does not belong to the user'}
 
-            ad_obj = self.Ad.get(id=ad_id, user=user_obj)
-            ad_obj.title = title
-            ad_obj.description = description
-            ad_obj.category = category_obj
-            ad_obj.condition = condition_obj
+            # The previous category is unknown here, so every listing is dropped
+            ads_listing.invalidate()
 
-            ad_obj.save()
             return {'is_edited': True,
-                    'message': f'Ad edited successfully ({username}, {title}, {category_name}, {condition_name})'}
+                    'message': f'Ad edited successfully ({user.username}, {title}, {category_name}, {condition_name})'}
         except Exception as e:
             return {'is_edited': False, 'message': str(e)}
 
+    def _ads_queryset(self, data, valid_categories, valid_conditions):
+        # Shared by all_ads and aall_ads, which look the reference rows up beforehand
+        query = data.get('query')
+
+        if data.get('sort', DEFAULT_SORT) not in AD_SORTS:
+            return status.HTTP_400_BAD_REQUEST
+
+        result = self.Ad.select_related('user', 'category', 'condition')
+
+        if query:
+            result = get_search_backend().search(result, query)
+
+        if data.get('category', []):
+            if valid_categories is None:
+                return status.HTTP_400_BAD_REQUEST
+
+            result = result.filter(category__in=valid_categories)
+
+        if data.get('condition', []):
+            if valid_conditions is None:
+                return status.HTTP_400_BAD_REQUEST
+
+            result = result.filter(condition__in=valid_conditions)
+
+        return result
+
     def all_ads(self, data):
         try:
-            query = data.get('query')
             category_names = data.get('category', [])
             condition_names = data.get('condition', [])
+            valid_categories = categories.get_many(category_names) if category_names else []
+            valid_conditions = conditions.get_many(condition_names) if condition_names else []
 
-            result = self.Ad.all()
-
-            if query:
-                q_object = Q(title__icontains=query) | Q(description__icontains=query)
-                result = result.filter(q_object)
+            return self._ads_queryset(data, valid_categories, valid_conditions)
 
-            if category_names:
-                valid_categories = []
-                for name in category_names:
-                    if not self.Category.filter(name=name).exists():
-                        return status.HTTP_400_BAD_REQUEST
-                    valid_categories.append(self.Category.get(name=name))
-
-                result = result.filter(category__in=valid_categories)
-
-            if condition_names:
-                valid_conditions = []
-                for name in condition_names:
-                    if not self.Condition.filter(name=name).exists():
-                        return status.HTTP_400_BAD_REQUEST
-                    valid_conditions.append(self.Condition.get(name=name))
+        except Exception as e:
+            print(e)
+            return status.HTTP_400_BAD_REQUEST
 
-                result = result.filter(condition__in=valid_conditions)
+    async def aall_ads(self, data):
+        try:
+            category_names = data.get('category', [])
+            condition_names = data.get('condition', [])
+            valid_categories = await categories.aget_many(category_names) if category_names else []
+            valid_conditions = await conditions.aget_many(condition_names) if condition_names else []
 
-            return result
+            return self._ads_queryset(data, valid_categories, valid_conditions)
 
         except Exception as e:
             print(e)
             return status.HTTP_400_BAD_REQUEST
+
+    def ad_values(self, ads):
+        # The pagination orders and positions by the search rank or the received count, so both stay in the rows
+        fields = COMPACT_AD_FIELDS + ['received_count']
+        if SEARCH_RANK in ads.query.annotations:
+            fields.append(SEARCH_RANK)
+        return ads.values(*fields)
+
+    def ad_page(self, rows):
+        # AdSerializer output built from ad_values rows without model instances
+        format_datetime = datetime_formatter()
+        with timing('serialize'):
+            return [ad_from_row(row, format_datetime) for row in rows]
+
+    def my_ads(self, user):
+        # The user's ads with received and sent proposal counts per status, each count a correlated
+        # subquery over the exchange_*_status_idx indexes, so the page is still one query
+        counts = {}
+        for direction, field in PROPOSAL_DIRECTIONS:
+            for proposal_status, _ in ExchangeProposal.STATUS_CHOICES:
+                counts[f'{direction}_{proposal_status}'] = proposal_count(field, status=proposal_status)
+
+        return self.Ad.filter(user_id=user.id).annotate(**counts).values(*COMPACT_AD_FIELDS, *counts)
+
+    def my_ads_page(self, rows):
+        format_datetime = datetime_formatter()
+        with timing('serialize'):
+            return [{
+                **ad_from_row(row, format_datetime),
+                'proposals': {
+                    direction: {proposal_status: row[f'{direction}_{proposal_status}']
+                                for proposal_status, _ in ExchangeProposal.STATUS_CHOICES}
+                    for direction, _ in PROPOSAL_DIRECTIONS
+                },
+            } for row in rows]
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import F
+from rest_framework_simplejwt.settings import api_settings
+
+from ..models import UserTokenVersion
+
+
+class TokenVersionCache:
+    """
+    Current token version of each user, read from the shared Django cache.
+
+    The UserTokenVersion row is only queried on a cache miss; users who never
+    revoked their tokens have no row and version 0.
+    """
+
+    prefix = 'ads:auth:token_version'
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'AUTH_TOKEN_VERSION_TTL', 300)
+
+    def key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def get(self, user_id):
+        version = cache.get(self.key(user_id))
+        if version is None:
+            # From the primary: a lagging replica would cache a revoked version for the whole TTL
+            version = UserTokenVersion.objects.using(router.db_for_write(UserTokenVersion, read=True)) \
+                .filter(user_id=user_id).values_list('version', flat=True).first()
+            version = version or 0
+            cache.set(self.key(user_id), version, timeout=self.timeout)
+        return version
+
+    def revoke(self, user_id, using=None):
+        # Invalidates every token issued so far; the cached version is dropped now and once the bump commits
+        using = using or router.db_for_write(UserTokenVersion)
+        updated = UserTokenVersion.objects.using(using).filter(user_id=user_id).update(version=F('version') + 1)
+        if not updated:
+            UserTokenVersion.objects.using(using).create(user_id=user_id, version=1)
+
+        cache.delete(self.key(user_id))
+        transaction.on_commit(lambda: cache.delete(self.key(user_id)), using=using)
+
+    def revoke_deleted(self, user_id):
+        # The version row is gone with the user, so a version no token has is kept until its tokens expire
+        cache.set(self.key(user_id), -1, timeout=api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+class UserCache:
+    """
+    Bounded, process-local cache of full User rows for token-authenticated requests.
+
+    Keeps at most AUTH_USER_CACHE_SIZE users for AUTH_USER_CACHE_TTL seconds,
+    evicting the least recently used first.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._users.move_to_end(user_id)
+                return entry[1]
+
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+
+        with self._lock:
+            self._users[user_id] = (now + getattr(settings, 'AUTH_USER_CACHE_TTL', 60), user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000):
+                self._users.popitem(last=False)
+        return user
+
+    def forget(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+token_versions = TokenVersionCache()
+users = UserCache()
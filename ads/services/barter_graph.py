@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from ..models import ExchangeProposal
+
+PENDING_STATUS = 'pending'
+# A 2-cycle is a direct swap, which the proposals already express
+MIN_CYCLE_LENGTH = 3
+
+
+class BarterGraph:
+    """
+    Process-local adjacency index of pending proposals, ad_sender -> ad_receiver.
+
+    Built from the database on first use and again after BARTER_GRAPH_TTL seconds;
+    in between, writes made through the services of this process are applied as
+    they commit. The index only proposes candidate cycles: callers check them
+    against the database, so edges missed or kept too long cost a suggestion at
+    worst, never a wrong one.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._out = {}
+        self._in = {}
+        self._expires = None
+
+    @property
+    def edge_count(self):
+        with self._lock:
+            return sum(sum(receivers.values()) for receivers in self._out.values())
+
+    def load(self, edges, ttl=None):
+        # Replaces the index with the given (ad_sender_id, ad_receiver_id) pairs
+        out, in_ = {}, {}
+        for sender, receiver in edges:
+            receivers = out.setdefault(sender, {})
+            receivers[receiver] = receivers.get(receiver, 0) + 1
+            senders = in_.setdefault(receiver, {})
+            senders[sender] = senders.get(sender, 0) + 1
+
+        ttl = getattr(settings, 'BARTER_GRAPH_TTL', 300) if ttl is None else ttl
+        with self._lock:
+            self._out, self._in = out, in_
+            self._expires = time.monotonic() + ttl
+
+    def _ensure_loaded(self):
+        if self._expires is not None and self._expires > time.monotonic():
+            return
+        self.load(ExchangeProposal.objects.filter(status=PENDING_STATUS)
+                  .values_list('ad_sender_id', 'ad_receiver_id').iterator(chunk_size=10000))
+
+    def clear(self):
+        with self._lock:
+            self._out, self._in = {}, {}
+            self._expires = None
+
+    def add(self, sender, receiver):
+        with self._lock:
+            if self._expires is None:
+                return
+            receivers = self._out.setdefault(sender, {})
+            receivers[receiver] = receivers.get(receiver, 0) + 1
+            senders = self._in.setdefault(receiver, {})
+            senders[sender] = senders.get(sender, 0) + 1
+
+    def remove(self, sender, receiver, count=1):
+        with self._lock:
+            for adjacency, node, neighbour in ((self._out, sender, receiver), (self._in, receiver, sender)):
+                neighbours = adjacency.get(node)
+                if not neighbours or neighbour not in neighbours:
+                    continue
+                neighbours[neighbour] -= count
+                if neighbours[neighbour] <= 0:
+                    del neighbours[neighbour]
+                if not neighbours:
+                    del adjacency[node]
+
+    def discard(self, sender, receiver):
+        # Drops an edge the database no longer has, however many proposals it was counted for
+        with self._lock:
+            count = self._out.get(sender, {}).get(receiver)
+            if count:
+                self.remove(sender, receiver, count=count)
+
+    def remove_ad(self, ad_id):
+        # A deleted ad takes its sent and received proposals along
+        with self._lock:
+            for receiver in list(self._out.get(ad_id, {})):
+                self.remove(ad_id, receiver, count=self._out[ad_id][receiver])
+            for sender in list(self._in.get(ad_id, {})):
+                self.remove(sender, ad_id, count=self._in[ad_id][sender])
+
+    def change_status(self, sender, receiver, old_status, new_status):
+        if old_status == new_status:
+            return
+        if new_status == PENDING_STATUS:
+            self.add(sender, receiver)
+        elif old_status == PENDING_STATUS:
+            self.remove(sender, receiver)
+
+    @staticmethod
+    def _distances(ad_id, adjacency, max_hops, max_nodes):
+        # Hops between ad_id and each node along adjacency, by a BFS bounded in depth and size
+        distances = {ad_id: 0}
+        queue = deque([ad_id])
+        while queue and len(distances) < max_nodes:
+            node = queue.popleft()
+            hops = distances[node] + 1
+            if hops > max_hops:
+                continue
+            for neighbour in adjacency.get(node, ()):
+                if neighbour not in distances:
+                    distances[neighbour] = hops
+                    queue.append(neighbour)
+        return distances
+
+    def cycles(self, ad_id, max_length, limit):
+        """
+        Up to limit simple cycles through ad_id of MIN_CYCLE_LENGTH to max_length ads,
+        shortest first, each a list of ad ids starting with ad_id.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if not self._out.get(ad_id) or not self._in.get(ad_id):
+                return []
+
+            # A popular ad has far more incoming proposals than outgoing ones: bound the
+            # search by the BFS over its sparser side and walk the cycles the other way
+            backwards = len(self._in[ad_id]) > len(self._out[ad_id])
+            walk_edges, bfs_edges = (self._in, self._out) if backwards else (self._out, self._in)
+            distances = self._distances(ad_id, bfs_edges, max_length - 1,
+                                        getattr(settings, 'BARTER_CYCLE_SEARCH_NODES', 100_000))
+            # within[r]: the nodes at most r hops away, for steps where that beats the neighbour list
+            within = [[] for _ in range(max_length)]
+            for node, hops in distances.items():
+                for remaining in range(hops, max_length):
+                    within[remaining].append(node)
+            found = []
+
+            def walk(path, on_path, length):
+                remaining = length - len(path)
+                neighbours = walk_edges.get(path[-1], {})
+                if len(within[remaining]) < len(neighbours):
+                    neighbours = [node for node in within[remaining] if node in neighbours]
+                for neighbour in neighbours:
+                    if len(found) >= limit:
+                        return
+                    if neighbour == ad_id:
+                        if not remaining:
+                            found.append([ad_id, *reversed(path[1:])] if backwards else list(path))
+                    elif neighbour not in on_path and distances.get(neighbour, max_length) <= remaining:
+                        path.append(neighbour)
+                        on_path.add(neighbour)
+                        walk(path, on_path, length)
+                        on_path.discard(neighbour)
+                        path.pop()
+
+            for length in range(MIN_CYCLE_LENGTH, max_length + 1):
+                if len(found) >= limit:
+                    break
+                walk([ad_id], {ad_id}, length)
+            return found
+
+
+barter_graph = BarterGraph()
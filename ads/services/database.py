@@ -0,0 +1,74 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connections, router
+
+# Lock errors raised inside an outer transaction, gathered by collect_lock_errors()
+_lock_errors = ContextVar('lock_errors', default=None)
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    # connection_created receiver applying SQLITE_PRAGMAS in order
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+def is_unique_error(error):
+    # SQLite reports "UNIQUE constraint failed", PostgreSQL "violates unique constraint"
+    return isinstance(error, IntegrityError) and 'unique' in str(error).lower()
+
+
+@contextmanager
+def collect_lock_errors():
+    """
+    Gather the lock errors run_with_lock_retry raises inside an outer transaction.
+
+    Services turn exceptions into failure responses, so the owner of the transaction
+    learns this way that it has to be retried as a whole.
+    """
+    errors = []
+    token = _lock_errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _lock_errors.reset(token)
+
+
+def run_with_lock_retry(operation, model):
+    """
+    Run a write and retry it while SQLite reports the database as locked.
+
+    Waits grow exponentially from SQLITE_LOCK_BACKOFF with full jitter for at most
+    SQLITE_LOCK_RETRIES retries. Inside an outer transaction the error is raised
+    right away, since only the whole transaction can be retried.
+    """
+
+    using = router.db_for_write(model)
+    retries = getattr(settings, 'SQLITE_LOCK_RETRIES', 0)
+    backoff = getattr(settings, 'SQLITE_LOCK_BACKOFF', 0.05)
+
+    for attempt in range(retries + 1):
+        try:
+            return operation()
+        except OperationalError as e:
+            if not is_lock_error(e):
+                raise
+            if connections[using].in_atomic_block:
+                errors = _lock_errors.get()
+                if errors is not None:
+                    errors.append(e)
+                raise
+            if attempt == retries:
+                raise
+            time.sleep(random.uniform(0, backoff * 2 ** attempt))
@@ -1,9 +1,85 @@
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.fields import DateTimeField
 
+from ..instrumentation import timing
 from ..models import *
+from .barter_graph import MIN_CYCLE_LENGTH, PENDING_STATUS, barter_graph
+from .database import is_unique_error, run_with_lock_retry
+from .listing_cache import ads_listing
+
+# Statuses are accepted as keys or as display labels and always stored and filtered as keys
+EXCHANGE_STATUSES = {**{key: key for key, _ in ExchangeProposal.STATUS_CHOICES},
+                     **{label: key for key, label in ExchangeProposal.STATUS_CHOICES}}
+COMPACT_AD_FIELDS = ['id', 'user__username', 'created_at', 'title', 'description',
+                     'category_id', 'category__name', 'condition_id', 'condition__name']
+
+
+def proposal_count(field, **filters):
+    # Correlated COUNT of the proposals whose field points at the outer Ad, 0 when there are none
+    return Coalesce(Subquery(
+        ExchangeProposal.objects.filter(**{field: OuterRef('pk')}, **filters)
+        .order_by().values(field).annotate(count=Count('*')).values('count')
+    ), 0)
+
+
+def update_proposal_counts(received=None, pending=None):
+    """
+    Apply {ad_id: delta} changes to Ad.received_count and Ad.pending_count in one UPDATE.
+
+    Counters move with F() expressions, so concurrent writers never lose increments.
+    Proposals written around the services (bulk loads, the admin) are only counted by
+    reconcile_proposal_counts, so decrements stop at 0 instead of failing the write.
+    """
+    updates = {}
+    ad_ids = set()
+    for field, deltas in (('received_count', received), ('pending_count', pending)):
+        deltas = {ad_id: delta for ad_id, delta in (deltas or {}).items() if delta}
+        if deltas:
+            change = Case(*[When(id=ad_id, then=Value(delta)) for ad_id, delta in deltas.items()], default=Value(0))
+            updates[field] = Greatest(F(field) + change, Value(0))
+            ad_ids.update(deltas)
+
+    if updates:
+        Ad.objects.filter(id__in=ad_ids).update(**updates)
+
+
+def status_key(value):
+    return EXCHANGE_STATUSES.get(value) if isinstance(value, str) else None
+
+
+def pending_delta(old_status, new_status):
+    return (new_status == PENDING_STATUS) - (old_status == PENDING_STATUS)
+
+
+def datetime_formatter():
+    # DateTimeField.to_representation with the current timezone looked up once instead of per value
+    return DateTimeField(default_timezone=timezone.get_current_timezone() if settings.USE_TZ else None).to_representation
+
+
+def ad_from_row(row, format_datetime, prefix=''):
+    # AdSerializer output for a values() row of COMPACT_AD_FIELDS, the fields named prefix + field
+    category_id = row[f'{prefix}category_id']
+    condition_id = row[f'{prefix}condition_id']
+    return {
+        'id': row[f'{prefix}id'],
+        'user': row[f'{prefix}user__username'],
+        'created_at': format_datetime(row[f'{prefix}created_at']),
+        'title': row[f'{prefix}title'],
+        'description': row[f'{prefix}description'],
+        'category': None if category_id is None else {'id': category_id, 'name': row[f'{prefix}category__name']},
+        'condition': None if condition_id is None else {'id': condition_id, 'name': row[f'{prefix}condition__name']},
+    }
 
 
 class ExchangeService:
+    # Max number of proposals accepted by edit_exchanges in one request
+    BULK_EDIT_LIMIT = 500
+
     def __init__(self):
         self.Ad = Ad.objects
         self.Category = Category.objects
@@ -11,7 +87,7 @@ class ExchangeService:
         self.User = User.objects
         self.ExchangeProposal = ExchangeProposal.objects
 
-    def create_exchange(self, data):
+    def create_exchange(self, user, data):
         try:
             ad_sender_id = data.get('ad_sender_id')
             ad_receiver_id = data.get('ad_receiver_id')
@@ -23,21 +99,43 @@ class ExchangeService:
             if ad_sender_id == ad_receiver_id:
                 return {'is_created': False, 'message': 'You cant exchange with yourself'}
 
-            if not self.Ad.filter(id=ad_sender_id).exists():
+            ad_owners = dict(self.Ad.filter(id__in=[ad_sender_id, ad_receiver_id]).values_list('id', 'user_id'))
+
+            if int(ad_sender_id) not in ad_owners:
                 return {'is_created': False, 'message': f'Invalid ad_sender_id ({ad_sender_id})'}
 
-            if not self.Ad.filter(id=ad_receiver_id).exists():
+            if int(ad_receiver_id) not in ad_owners:
                 return {'is_created': False, 'message': f'Invalid ad_receiver_id ({ad_receiver_id})'}
 
-            ad_sender_obj = self.Ad.get(id=ad_sender_id)
-            ad_receiver_obj = self.Ad.get(id=ad_receiver_id)
-            self.ExchangeProposal.create(ad_sender=ad_sender_obj, ad_receiver=ad_receiver_obj, comment=comment)
+            if ad_owners[int(ad_sender_id)] != user.id:
+                return {'is_created': False,
+                        'message': f'Ad with ID "{ad_sender_id}" does not belong to you'}
+
+            def create():
+                # A duplicate pending pair fails the insert on exchange_pending_pair_uniq; the savepoint,
+                # taken only inside an outer transaction, keeps that transaction usable
+                using = router.db_for_write(ExchangeProposal)
+                with transaction.atomic(using=using):
+                    self.ExchangeProposal.create(ad_sender_id=ad_sender_id, ad_receiver_id=ad_receiver_id,
+                                                 comment=comment)
+                    update_proposal_counts(received={int(ad_receiver_id): 1}, pending={int(ad_receiver_id): 1})
+                    transaction.on_commit(lambda: barter_graph.add(int(ad_sender_id), int(ad_receiver_id)),
+                                          using=using)
+
+            try:
+                run_with_lock_retry(create, ExchangeProposal)
+            except IntegrityError as e:
+                if not is_unique_error(e):
+                    raise
+                return {'is_created': False,
+                        'message': f'A pending exchange from ad {ad_sender_id} to ad {ad_receiver_id} already exists'}
+            ads_listing.invalidate_popularity()
 
             return {'is_created': True, 'message': f'Ad created successfully ({ad_sender_id}, {ad_receiver_id}, {comment})'}
         except Exception as e:
             return {'is_created': False, 'message': str(e)}
 
-    def edit_exchange(self, username, data):
+    def edit_exchange(self, user, data):
         try:
             exchange_id = data.get('exchange_id')
             exchange_status = data.get('status')
@@ -45,46 +143,288 @@ class ExchangeService:
             if not all([exchange_id, exchange_status]):
                 return {'is_edited': False, 'message': 'Send all required fields (exchange_id, status)'}
 
-            if not self.ExchangeProposal.filter(id=exchange_id).exists():
-                return {'is_edited': False, 'message': f'Invalid exchange_id ({exchange_id})'}
+            if status_key(exchange_status) is None:
+                return {'is_edited': False, 'message': f'Invalid exchanges status ({exchange_id}, {exchange_status})'}
+            exchange_status = status_key(exchange_status)
+
+            editable = self.ExchangeProposal.filter(
+                Q(ad_sender__user_id=user.id) | Q(ad_receiver__user_id=user.id), id=exchange_id
+            )
+
+            def update():
+                # The old status decides the pending counter change, so the UPDATE only applies while the
+                # status is still the one read; after a concurrent change it is read again
+                using = router.db_for_write(ExchangeProposal)
+                with transaction.atomic(using=using):
+                    while True:
+                        exchange = editable.values_list('ad_sender_id', 'ad_receiver_id', 'status').first()
+                        if exchange is None:
+                            return False
+
+                        ad_sender_id, ad_receiver_id, old_status = exchange
+                        if old_status == exchange_status:
+                            return True
+                        if self.ExchangeProposal.filter(id=exchange_id, status=old_status) \
+                                .update(status=exchange_status):
+                            break
+
+                    update_proposal_counts(pending={ad_receiver_id: pending_delta(old_status, exchange_status)})
+                    transaction.on_commit(lambda: barter_graph.change_status(
+                        ad_sender_id, ad_receiver_id, old_status, exchange_status
+                    ), using=using)
+                    return True
 
-            if not (self.ExchangeProposal.filter(ad_sender__user__username=username).exists() or self.ExchangeProposal.filter(ad_receiver__user__username=username).exists()):
+            try:
+                edited = run_with_lock_retry(update, ExchangeProposal)
+            except IntegrityError as e:
+                if not is_unique_error(e):
+                    raise
+                return {'is_edited': False,
+                        'message': f'Exchange with ID "{exchange_id}" has a pending duplicate for the same ads'}
+            if not edited:
                 return {'is_edited': False,
                         'message': f'Exchange with ID "{exchange_id}" does not exist or does not belong to you'}
 
-            if exchange_status not in ['pending', 'accepted', 'declined', 'Ожидает', 'Принято', 'Отклонено']:
-                return {'is_edited': False, 'message': f'Invalid exchanges status ({exchange_id}, {exchange_status})'}
+            return {'is_edited': True, 'message': f'Exchange edited successfully ({exchange_status})'}
+        except Exception as e:
+            return {'is_edited': False, 'message': str(e)}
 
-            exchange_obj = self.ExchangeProposal.get(id=exchange_id)
-            exchange_obj.status = exchange_status
-            exchange_obj.save()
+    def edit_exchanges(self, user, data):
+        try:
+            exchange_ids = data.get('exchange_ids')
+            exchange_status = data.get('status')
 
-            return {'is_edited': True, 'message': f'Exchange edited successfully ({exchange_status})'}
+            if not all([exchange_ids, exchange_status]) or not isinstance(exchange_ids, list):
+                return {'is_edited': False, 'message': 'Send all required fields (exchange_ids, status)'}
+
+            if len(exchange_ids) > self.BULK_EDIT_LIMIT:
+                return {'is_edited': False,
+                        'message': f'Too many exchanges, send at most {self.BULK_EDIT_LIMIT} per request'}
+
+            if status_key(exchange_status) is None:
+                return {'is_edited': False, 'message': f'Invalid exchanges status ({exchange_status})'}
+            exchange_status = status_key(exchange_status)
+
+            exchange_ids = list(dict.fromkeys(int(exchange_id) for exchange_id in exchange_ids))
+            editable = self.ExchangeProposal.filter(
+                Q(ad_sender__user_id=user.id) | Q(ad_receiver__user_id=user.id), id__in=exchange_ids
+            ).exclude(status=exchange_status)
+
+            def update():
+                # Inside the transaction the read goes to the primary as well
+                using = router.db_for_write(ExchangeProposal)
+                with transaction.atomic(using=using):
+                    # Django has no UPDATE ... RETURNING, so the changed ids are read in the same transaction;
+                    # the UPDATE keeps the ownership and status conditions. The rows stay locked until the commit
+                    # so the old statuses behind the counter changes cannot move (SQLite locks the whole database)
+                    edited = list(editable.select_for_update(of=('self',))
+                                  .values_list('id', 'ad_sender_id', 'ad_receiver_id', 'status'))
+                    edited_ids = {exchange_id for exchange_id, _, _, _ in edited}
+                    if edited_ids:
+                        editable.filter(id__in=edited_ids).update(status=exchange_status)
+
+                        pending = {}
+                        for _, _, ad_receiver_id, old_status in edited:
+                            pending[ad_receiver_id] = (pending.get(ad_receiver_id, 0) +
+                                                       pending_delta(old_status, exchange_status))
+                        update_proposal_counts(pending=pending)
+
+                        def update_graph():
+                            for _, ad_sender_id, ad_receiver_id, old_status in edited:
+                                barter_graph.change_status(ad_sender_id, ad_receiver_id, old_status, exchange_status)
+
+                        transaction.on_commit(update_graph, using=using)
+                    return edited_ids
+
+            try:
+                edited_ids = run_with_lock_retry(update, ExchangeProposal)
+            except IntegrityError as e:
+                if not is_unique_error(e):
+                    raise
+                return {'is_edited': False,
+                        'message': 'Exchanges not edited, the change would leave two pending exchanges for the same ads',
+                        'edited_ids': [], 'not_edited_ids': exchange_ids}
+
+            return {'is_edited': bool(edited_ids),
+                    'message': f'Edited {len(edited_ids)} of {len(exchange_ids)} exchanges ({exchange_status})',
+                    'edited_ids': [exchange_id for exchange_id in exchange_ids if exchange_id in edited_ids],
+                    'not_edited_ids': [exchange_id for exchange_id in exchange_ids if exchange_id not in edited_ids]}
         except Exception as e:
             return {'is_edited': False, 'message': str(e)}
 
-    def all_exchanges(self, data):
+    def reconcile_counts(self, from_id, to_id):
+        # Recomputes the proposal counters of the ads with from_id <= id < to_id, returns how many were off
+        received = proposal_count('ad_receiver')
+        pending = proposal_count('ad_receiver', status=PENDING_STATUS)
+        stale = self.Ad.filter(id__gte=from_id, id__lt=to_id).alias(
+            actual_received=received, actual_pending=pending
+        ).filter(~Q(received_count=F('actual_received')) | ~Q(pending_count=F('actual_pending')))
+
+        def update():
+            with transaction.atomic(using=router.db_for_write(Ad), savepoint=False):
+                return stale.update(received_count=received, pending_count=pending)
+
+        return run_with_lock_retry(update, Ad)
+
+    def suggested_cycles(self, user, data):
+        # Trade cycles through the user's ad found in the barter graph, checked against the pending proposals
         try:
-            sender_username = data.get('sender_username')
-            receiver_username = data.get('receiver_username')
-            exchange_status = data.get('status', [])
+            ad_id = int(data.get('ad_id'))
+            length_limit = getattr(settings, 'BARTER_CYCLE_MAX_LENGTH', 5)
+            max_length = int(data.get('max_length') or length_limit)
+            if not MIN_CYCLE_LENGTH <= max_length <= length_limit:
+                return status.HTTP_400_BAD_REQUEST
+
+            if not self.Ad.filter(id=ad_id, user_id=user.id).exists():
+                return status.HTTP_404_NOT_FOUND
+
+            candidates = barter_graph.cycles(ad_id, max_length, getattr(settings, 'BARTER_CYCLE_LIMIT', 10))
+            ad_ids = {cycle_ad_id for cycle in candidates for cycle_ad_id in cycle}
+            proposals = self.ExchangeProposal.filter(
+                status=PENDING_STATUS, ad_sender_id__in=ad_ids, ad_receiver_id__in=ad_ids
+            ).values_list('id', 'ad_sender_id', 'ad_receiver_id', 'ad_sender__user_id',
+                          'ad_sender__user__username', 'ad_sender__title') if ad_ids else []
+
+            # Each edge has one pending proposal (exchange_pending_pair_uniq); every ad of a cycle sends one
+            edges, ads, owners = {}, {}, {}
+            for exchange_id, ad_sender_id, ad_receiver_id, user_id, username, title in proposals:
+                edges[(ad_sender_id, ad_receiver_id)] = exchange_id
+                ads[ad_sender_id] = {'id': ad_sender_id, 'user': username, 'title': title}
+                owners[ad_sender_id] = user_id
+
+            cycles, exchanges, cycle_ads = [], {}, {}
+            for cycle in candidates:
+                steps = list(zip(cycle, cycle[1:] + cycle[:1]))
+                missing = [step for step in steps if step not in edges]
+                for ad_sender_id, ad_receiver_id in missing:
+                    barter_graph.discard(ad_sender_id, ad_receiver_id)
+                # Everyone in the trade is a different user
+                if missing or len({owners[cycle_ad_id] for cycle_ad_id in cycle}) < len(cycle):
+                    continue
+
+                cycles.append({'length': len(cycle), 'exchanges': [edges[step] for step in steps]})
+                for ad_sender_id, ad_receiver_id in steps:
+                    exchange_id = edges[(ad_sender_id, ad_receiver_id)]
+                    exchanges[exchange_id] = {'id': exchange_id, 'ad_sender': ad_sender_id,
+                                              'ad_receiver': ad_receiver_id}
+                    cycle_ads[ad_sender_id] = ads[ad_sender_id]
+
+            return {'ad_id': ad_id, 'cycles': cycles, 'exchanges': exchanges, 'ads': cycle_ads}
+        except (TypeError, ValueError):
+            return status.HTTP_400_BAD_REQUEST
+
+    def _exchanges_queryset(self, data, sender_exists, receiver_exists):
+        # Shared by all_exchanges and aall_exchanges, which check the usernames beforehand
+        sender_username = data.get('sender_username')
+        receiver_username = data.get('receiver_username')
+        exchange_status = data.get('status', [])
+
+        result = self.ExchangeProposal.select_related(
+            'ad_sender__user', 'ad_sender__category', 'ad_sender__condition',
+            'ad_receiver__user', 'ad_receiver__category', 'ad_receiver__condition',
+        )
 
-            result = self.ExchangeProposal.all()
+        if sender_username:
+            if not sender_exists:
+                return status.HTTP_400_BAD_REQUEST
+            result = result.filter(ad_sender__user__username=sender_username)
 
-            if sender_username:
-                if not self.User.filter(username=sender_username).exists():
-                    return status.HTTP_400_BAD_REQUEST
-                result = result.filter(ad_sender__user__username=sender_username)
+        if receiver_username:
+            if not receiver_exists:
+                return status.HTTP_400_BAD_REQUEST
+            result = result.filter(ad_receiver__user__username=receiver_username)
 
-            if receiver_username:
-                if not self.User.filter(username=receiver_username).exists():
-                    return status.HTTP_400_BAD_REQUEST
-                result = result.filter(ad_receiver__user__username=receiver_username)
+        if exchange_status:
+            result = result.filter(status__in=[status_key(value) or value for value in exchange_status])
 
-            if exchange_status:
-                result = result.filter(status__in=exchange_status)
+        return result
 
-            return result
+    def all_exchanges(self, data, user=None):
+        # The requesting user is known to exist, so filtering by their own username needs no lookup
+        try:
+            own_username = getattr(user, 'username', None)
+            sender_username = data.get('sender_username')
+            receiver_username = data.get('receiver_username')
+            sender_exists = sender_username and (sender_username == own_username or
+                                                 self.User.filter(username=sender_username).exists())
+            receiver_exists = receiver_username and (receiver_username == own_username or
+                                                     self.User.filter(username=receiver_username).exists())
+
+            return self._exchanges_queryset(data, sender_exists, receiver_exists)
         except Exception as e:
             print(e)
             return status.HTTP_400_BAD_REQUEST
+
+    async def aall_exchanges(self, data, user=None):
+        try:
+            own_username = getattr(user, 'username', None)
+            sender_username = data.get('sender_username')
+            receiver_username = data.get('receiver_username')
+            sender_exists = sender_username and (sender_username == own_username or
+                                                 await self.User.filter(username=sender_username).aexists())
+            receiver_exists = receiver_username and (receiver_username == own_username or
+                                                     await self.User.filter(username=receiver_username).aexists())
+
+            return self._exchanges_queryset(data, sender_exists, receiver_exists)
+        except Exception as e:
+            print(e)
+            return status.HTTP_400_BAD_REQUEST
+
+    def compact_exchanges(self, exchanges):
+        # Also the rows of exchange_page
+        fields = ['id', 'created_at', 'status', 'comment']
+        for ad in ('ad_sender', 'ad_receiver'):
+            fields += [f'{ad}__{field}' for field in COMPACT_AD_FIELDS]
+        return exchanges.values(*fields)
+
+    def compact_page(self, rows):
+        # Proposals reference ads by id; ads, categories and conditions are listed once each
+        status_display = dict(ExchangeProposal.STATUS_CHOICES)
+        exchanges, ads, categories, conditions = [], {}, {}, {}
+
+        for row in rows:
+            for ad in ('ad_sender', 'ad_receiver'):
+                ad_id = row[f'{ad}__id']
+                if ad_id in ads:
+                    continue
+
+                category_id = row[f'{ad}__category_id']
+                condition_id = row[f'{ad}__condition_id']
+                ads[ad_id] = {
+                    'id': ad_id,
+                    'user': row[f'{ad}__user__username'],
+                    'created_at': row[f'{ad}__created_at'],
+                    'title': row[f'{ad}__title'],
+                    'description': row[f'{ad}__description'],
+                    'category': category_id,
+                    'condition': condition_id,
+                }
+                if category_id is not None:
+                    categories[category_id] = {'id': category_id, 'name': row[f'{ad}__category__name']}
+                if condition_id is not None:
+                    conditions[condition_id] = {'id': condition_id, 'name': row[f'{ad}__condition__name']}
+
+            exchanges.append({
+                'id': row['id'],
+                'ad_sender': row['ad_sender__id'],
+                'ad_receiver': row['ad_receiver__id'],
+                'status': row['status'],
+                'status_display': status_display.get(row['status'], row['status']),
+                'comment': row['comment'],
+            })
+
+        return {'results': exchanges, 'ads': ads, 'categories': categories, 'conditions': conditions}
+
+    def exchange_page(self, rows):
+        # ExchangeSerializer output built from compact_exchanges rows without model instances
+        status_display = dict(ExchangeProposal.STATUS_CHOICES)
+        format_datetime = datetime_formatter()
+        with timing('serialize'):
+            return [{
+                'id': row['id'],
+                'ad_sender': ad_from_row(row, format_datetime, 'ad_sender__'),
+                'ad_receiver': ad_from_row(row, format_datetime, 'ad_receiver__'),
+                'status': row['status'],
+                'status_display': status_display.get(row['status'], row['status']),
+                'comment': row['comment'],
+            } for row in rows]
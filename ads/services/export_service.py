@@ -0,0 +1,25 @@
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ExportService:
+    chunk_size = 2000
+
+    def ndjson(self, queryset, serializer_class):
+        # Rows are read with a server-side iterator and serialized one chunk at a time
+        chunk = []
+        for obj in queryset.order_by('id').iterator(chunk_size=self.chunk_size):
+            chunk.append(obj)
+            if len(chunk) == self.chunk_size:
+                yield self._render(chunk, serializer_class)
+                chunk = []
+
+        if chunk:
+            yield self._render(chunk, serializer_class)
+
+    def _render(self, chunk, serializer_class):
+        return ''.join(
+            json.dumps(item, cls=JSONEncoder, ensure_ascii=False) + '\n'
+            for item in serializer_class(chunk, many=True).data
+        )
@@ -1,4 +1,5 @@
 from ..models import *
+from .reference_cache import categories, conditions
 
 
 class HelperService:
@@ -9,7 +10,7 @@ class HelperService:
         self.User = User.objects
 
     def get_categories(self):
-        return self.Category.all()
+        return categories.all()
 
     def get_conditions(self):
-        return self.Condition.all()
+        return conditions.all()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, router, transaction
+from django.utils import timezone
+
+from ..models import IdempotencyKey
+from .database import collect_lock_errors, is_lock_error, run_with_lock_retry
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_ERRORS = {
+    400: f'{IDEMPOTENCY_HEADER} must be 1 to 255 characters long',
+    422: f'{IDEMPOTENCY_HEADER} was already used for a different request',
+}
+
+
+class IdempotencyService:
+    """
+    Runs a write once per (user, Idempotency-Key) and replays its response to retries.
+
+    The key row is inserted before the service runs and gets the response in the same
+    transaction, so nothing is stored for a request that raised and a retry arriving
+    while the first request is running waits for its commit: SQLite transactions take
+    the write lock up front under the production profile (SQLITE_PRODUCTION), otherwise
+    the second insert of the key blocks or fails and is retried. When the service gives
+    up on a locked database the whole attempt is rolled back and retried; if the lock
+    outlasts the retries the service's failure is returned without being stored.
+    Keys are kept for IDEMPOTENCY_KEY_TTL seconds and deleted by the
+    purge_idempotency_keys command.
+    """
+
+    def __init__(self):
+        self.IdempotencyKey = IdempotencyKey.objects
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)
+
+    def expired_before(self):
+        return timezone.now() - timedelta(seconds=self.ttl)
+
+    @staticmethod
+    def fingerprint(data):
+        payload = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def run(self, user, key, endpoint, data, handler):
+        """
+        The response of handler() and whether it was replayed, or an HTTP status
+        from IDEMPOTENCY_ERRORS.
+        """
+        if not isinstance(key, str) or not 0 < len(key) <= IdempotencyKey._meta.get_field('key').max_length:
+            return 400
+
+        fingerprint = self.fingerprint(data)
+        using = router.db_for_write(IdempotencyKey)
+        keys = self.IdempotencyKey.using(using).filter(user_id=user.id, key=key)
+
+        locked_responses = []
+
+        def attempt():
+            with transaction.atomic(using=using), collect_lock_errors() as lock_errors:
+                stored = keys.values('endpoint', 'fingerprint', 'response', 'created_at').first()
+                if stored is not None:
+                    if stored['created_at'] >= self.expired_before():
+                        if (stored['endpoint'], stored['fingerprint']) != (endpoint, fingerprint):
+                            return 422
+                        return stored['response'], True
+                    keys.delete()
+
+                self.IdempotencyKey.using(using).create(user_id=user.id, key=key, endpoint=endpoint,
+                                                        fingerprint=fingerprint)
+                response = handler()
+                if lock_errors:
+                    # The service could not retry inside this transaction, so the attempt is retried whole
+                    locked_responses.append(response)
+                    raise lock_errors[0]
+                keys.update(response=response)
+                return response, False
+
+        try:
+            try:
+                return run_with_lock_retry(attempt, IdempotencyKey)
+            except IntegrityError:
+                # A concurrent request with the same key committed first, its response is there now
+                return run_with_lock_retry(attempt, IdempotencyKey)
+        except OperationalError as e:
+            if not is_lock_error(e) or not locked_responses:
+                raise
+            return locked_responses[-1], False
+
+    def purge(self, chunk_size):
+        # Deletes up to chunk_size expired keys, returns how many
+        using = router.db_for_write(IdempotencyKey)
+        expired_ids = self.IdempotencyKey.using(using).filter(created_at__lt=self.expired_before()) \
+            .order_by('created_at').values_list('id', flat=True)[:chunk_size]
+        return run_with_lock_retry(
+            lambda: self.IdempotencyKey.using(using).filter(id__in=list(expired_ids)).delete()[0], IdempotencyKey
+        )
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+
+from ..models import Ad
+
+from .reference_cache import categories
+from .search_service import fold_search_text
+
+
+class ListingCache:
+    """
+    Cache of AdsView pages keyed by the normalized filters and the page URL.
+
+    Keys embed version counters stored next to the pages: a global one that every
+    page depends on, one for pages without a category filter and one per category.
+    Writes that know the categories they touch bump only those, the rest bump the
+    global counter. Pages sorted by received proposals also depend on a popularity
+    counter, bumped whenever a proposal is created. The cache alias is set by
+    ADS_LISTING_CACHE; its backend and MAX_ENTRIES decide where pages live and
+    how many are kept.
+    """
+
+    prefix = 'ads:listing'
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        alias = getattr(settings, 'ADS_LISTING_CACHE', None)
+        return caches[alias] if alias else None
+
+    def _parse(self, data):
+        # None for filters all_ads would reject, those responses are not cached
+        query = data.get('query') or ''
+        category_names = data.get('category') or []
+        condition_names = data.get('condition') or []
+        sort = data.get('sort') or ''
+        if not isinstance(query, str) or not isinstance(sort, str):
+            return None
+        for names in (category_names, condition_names):
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                return None
+        return query, category_names, condition_names, sort
+
+    def _normalized(self, query, category_objs, condition_names, sort):
+        if category_objs is None:
+            return None
+
+        return {
+            'query': ' '.join(fold_search_text(query).split()),
+            'category': sorted({category_obj.id for category_obj in category_objs}),
+            'condition': sorted(set(condition_names)),
+            'sort': sort,
+        }
+
+    def normalize(self, data):
+        parsed = self._parse(data)
+        if parsed is None:
+            return None
+
+        query, category_names, condition_names, sort = parsed
+        return self._normalized(query, categories.get_many(category_names), condition_names, sort)
+
+    async def anormalize(self, data):
+        parsed = self._parse(data)
+        if parsed is None:
+            return None
+
+        query, category_names, condition_names, sort = parsed
+        return self._normalized(query, await categories.aget_many(category_names), condition_names, sort)
+
+    def _category_version_keys(self, category_ids):
+        if not category_ids:
+            return [f'{self.prefix}:version:unfiltered']
+        return [f'{self.prefix}:version:category:{category_id}' for category_id in category_ids]
+
+    def _version_keys(self, filters):
+        keys = [f'{self.prefix}:version'] + self._category_version_keys(filters['category'])
+        if filters['sort'] == 'most_wanted':
+            keys.append(f'{self.prefix}:version:popularity')
+        return keys
+
+    def _versions(self, cache, keys):
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # Counters start from the clock, so an evicted counter never comes back with an old value
+                cache.add(key, time.time_ns(), timeout=None)
+                versions[key] = cache.get(key)
+        return [versions[key] for key in keys]
+
+    async def _aversions(self, cache, keys):
+        versions = await cache.aget_many(keys)
+        for key in keys:
+            if key not in versions:
+                await cache.aadd(key, time.time_ns(), timeout=None)
+                versions[key] = await cache.aget(key)
+        return [versions[key] for key in keys]
+
+    def _page_key(self, request, filters, versions):
+        payload = json.dumps([request.build_absolute_uri(), filters, versions], ensure_ascii=False)
+        return f'{self.prefix}:page:{hashlib.sha256(payload.encode()).hexdigest()}'
+
+    def key(self, request, data):
+        cache = self.cache
+        if cache is None:
+            return None
+
+        filters = self.normalize(data)
+        if filters is None:
+            return None
+
+        return self._page_key(request, filters, self._versions(cache, self._version_keys(filters)))
+
+    async def akey(self, request, data):
+        cache = self.cache
+        if cache is None:
+            return None
+
+        filters = await self.anormalize(data)
+        if filters is None:
+            return None
+
+        return self._page_key(request, filters, await self._aversions(cache, self._version_keys(filters)))
+
+    def source(self, queryset):
+        # Pages are stored under the versions read before the query, so they are read from the primary:
+        # a lagging replica would file old rows under a version bumped by a committed write
+        return queryset.using(router.db_for_write(queryset.model, read=True))
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get(self, key):
+        return self._count(self.cache.get(key))
+
+    async def aget(self, key):
+        return self._count(await self.cache.aget(key))
+
+    def set(self, key, value):
+        self.cache.set(key, value)
+
+    async def aset(self, key, value):
+        await self.cache.aset(key, value)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / total if total else 0.0}
+
+    def _bump(self, keys):
+        cache = self.cache
+        if cache is None:
+            return
+
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+
+    def invalidate(self, category_ids=None, using=None):
+        # Without category ids every page is dropped, otherwise the unfiltered pages and those categories
+        if category_ids is None:
+            keys = [f'{self.prefix}:version']
+        else:
+            category_ids = sorted(set(category_ids) - {None})
+            keys = self._category_version_keys(None) + (self._category_version_keys(category_ids)
+                                                         if category_ids else [])
+        self._bump_around_commit(keys, using)
+
+    def invalidate_popularity(self, using=None):
+        # Drops the pages sorted by received proposals
+        self._bump_around_commit([f'{self.prefix}:version:popularity'], using)
+
+    def _bump_around_commit(self, keys, using):
+        self._bump(keys)
+        # Readers may cache the old rows before the writing transaction commits, so bump again afterwards
+        transaction.on_commit(lambda: self._bump(keys), using=using or router.db_for_write(Ad))
+
+
+ads_listing = ListingCache()
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+
+from ..models import Category, Condition
+
+
+class ReferenceCache:
+    """
+    Process-local name -> object map for a small, rarely changing model.
+
+    Rows are loaded once and reused until a post_save/post_delete signal
+    invalidates them. The shared Django cache holds a version stamp so other
+    processes notice the change within REFERENCE_CACHE_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version_key = f'ads:reference:{model._meta.label_lower}:version'
+        self._lock = threading.Lock()
+        # (version, objects, objects by name, memoized values), swapped as a whole so readers never see a partial load
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'REFERENCE_CACHE_CHECK_INTERVAL', 5)
+
+    def source(self):
+        # Reloads follow a version bump, which a lagging replica may not have caught up with yet
+        return self.model.objects.using(router.db_for_write(self.model, read=True))
+
+    def _load(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            version = cache.get_or_set(self.version_key, 1, timeout=None)
+            snapshot = self._snapshot
+            if snapshot is None or snapshot[0] != version:
+                objects = list(self.source().order_by('id'))
+                snapshot = (version, objects, {obj.name: obj for obj in objects}, {})
+                self._snapshot = snapshot
+            self._checked_at = now
+            return snapshot
+
+    async def _aload(self):
+        # Async counterpart of _load for async views; a concurrent reload only repeats the same query
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        version = await cache.aget_or_set(self.version_key, 1, timeout=None)
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != version:
+            objects = [obj async for obj in self.source().order_by('id')]
+            snapshot = (version, objects, {obj.name: obj for obj in objects}, {})
+            self._snapshot = snapshot
+        self._checked_at = now
+        return snapshot
+
+    @property
+    def version(self):
+        return self._load()[0]
+
+    def all(self):
+        return list(self._load()[1])
+
+    def get(self, name):
+        return self._load()[2].get(name)
+
+    def get_many(self, names):
+        # None when at least one name is unknown
+        by_name = self._load()[2]
+        objects = [by_name.get(name) for name in names]
+        if None in objects:
+            return None
+        return objects
+
+    def memoize(self, key, build):
+        # Values derived from the current rows (e.g. rendered responses), rebuilt after the next reload
+        snapshot = self._load()
+        if key not in snapshot[3]:
+            snapshot[3][key] = build(snapshot[1])
+        return snapshot[3][key]
+
+    async def aall(self):
+        return list((await self._aload())[1])
+
+    async def aget(self, name):
+        return (await self._aload())[2].get(name)
+
+    async def aget_many(self, names):
+        by_name = (await self._aload())[2]
+        objects = [by_name.get(name) for name in names]
+        if None in objects:
+            return None
+        return objects
+
+    async def amemoize(self, key, build):
+        snapshot = await self._aload()
+        if key not in snapshot[3]:
+            snapshot[3][key] = build(snapshot[1])
+        return snapshot[3][key]
+
+    def _bump(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 2, timeout=None)
+        self._snapshot = None
+
+    def invalidate(self, using=None):
+        self._bump()
+        # Readers may reload the old rows before the writing transaction commits, so bump again afterwards
+        transaction.on_commit(self._bump, using=using or router.db_for_write(self.model))
+
+
+categories = ReferenceCache(Category)
+conditions = ReferenceCache(Condition)
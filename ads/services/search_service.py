@@ -0,0 +1,128 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.module_loading import import_string
+
+SEARCH_RANK = 'search_rank'
+
+DEFAULT_BACKENDS = {
+    'sqlite': 'ads.services.search_service.SQLiteFTSSearchBackend',
+}
+FALLBACK_BACKEND = 'ads.services.search_service.ContainsSearchBackend'
+
+
+def fold_search_text(text):
+    # unicode61 folds case for Cyrillic but keeps "ё" apart from "е"
+    return text.casefold().replace('ё', 'е')
+
+
+def get_search_backend():
+    backend_path = getattr(settings, 'ADS_SEARCH_BACKEND', None)
+    if not backend_path:
+        backend_path = DEFAULT_BACKENDS.get(connection.vendor, FALLBACK_BACKEND)
+    return import_string(backend_path)()
+
+
+class SearchBackend:
+    """
+    Filters an Ad queryset by a free-text query.
+
+    Ranked backends annotate the queryset with SEARCH_RANK (lower is more
+    relevant), which AdsCursorPagination then orders by.
+    """
+
+    def install(self, schema_editor):
+        pass
+
+    def uninstall(self, schema_editor):
+        pass
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+
+class ContainsSearchBackend(SearchBackend):
+    def search(self, queryset, query):
+        return queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    """
+    Contentless FTS5 index over Ad.title and Ad.description kept in sync by triggers
+    and queried through the unmanaged AdSearchDocument model.
+    """
+
+    table = 'ads_ad_fts'
+    source_table = 'ads_ad'
+    columns = ('title', 'description')
+    column_weights = (2.0, 1.0)
+    document = 'search_document'
+
+    def _fold_sql(self, column):
+        return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+    def _values_sql(self, row):
+        return ', '.join(self._fold_sql(f'{row}.{column}') for column in self.columns)
+
+    def trigger_statements(self):
+        columns = ', '.join(self.columns)
+        insert = (f'INSERT INTO {self.table}(rowid, {columns}) '
+                  f'VALUES (new.id, {self._values_sql("new")});')
+        delete = (f"INSERT INTO {self.table}({self.table}, rowid, {columns}) "
+                  f"VALUES ('delete', old.id, {self._values_sql('old')});")
+        return [
+            f'CREATE TRIGGER IF NOT EXISTS {self.table}_ai AFTER INSERT ON {self.source_table} '
+            f'BEGIN {insert} END',
+            f'CREATE TRIGGER IF NOT EXISTS {self.table}_ad AFTER DELETE ON {self.source_table} '
+            f'BEGIN {delete} END',
+            f'CREATE TRIGGER IF NOT EXISTS {self.table}_au AFTER UPDATE OF {columns} ON {self.source_table} '
+            f'BEGIN {delete} {insert} END',
+        ]
+
+    def install(self, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+
+        columns = ', '.join(self.columns)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5({columns}, content='', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        weights = ', '.join(str(weight) for weight in self.column_weights)
+        schema_editor.execute(f"INSERT INTO {self.table}({self.table}, rank) VALUES ('rank', 'bm25({weights})')")
+        schema_editor.execute(
+            f'INSERT INTO {self.table}(rowid, {columns}) '
+            f'SELECT id, {self._values_sql(self.source_table)} FROM {self.source_table}'
+        )
+        self.install_triggers(schema_editor)
+
+    def install_triggers(self, schema_editor):
+        # Table rebuilds in later SQLite migrations drop triggers, so they can be re-created separately
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+
+        for statement in self.trigger_statements():
+            schema_editor.execute(statement)
+
+    def uninstall(self, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {self.table}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def build_match(self, query):
+        terms = re.findall(r'[^\W_]+', fold_search_text(query))
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, query):
+        match = self.build_match(query)
+        if not match:
+            return queryset.none()
+
+        return queryset.filter(**{f'{self.document}__document__match': match}).annotate(**{
+            SEARCH_RANK: F(f'{self.document}__rank')
+        })
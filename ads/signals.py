@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Ad, Category, Condition
+from .services.auth_cache import token_versions, users
+from .services.database import configure_sqlite_connection
+from .services.listing_cache import ads_listing
+from .services.reference_cache import categories, conditions
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categories(sender, using, **kwargs):
+    categories.invalidate(using=using)
+    ads_listing.invalidate(using=using)
+
+
+@receiver([post_save, post_delete], sender=Condition)
+def invalidate_conditions(sender, using, **kwargs):
+    conditions.invalidate(using=using)
+    ads_listing.invalidate(using=using)
+
+
+# Writes through save()/delete(); service paths using update() or bulk_create() invalidate themselves
+@receiver(post_save, sender=Ad)
+def invalidate_ads_listing_on_save(sender, instance, created, using, **kwargs):
+    # A changed ad may have left its previous category
+    ads_listing.invalidate([instance.category_id] if created else None, using=using)
+
+
+@receiver(post_delete, sender=Ad)
+def invalidate_ads_listing_on_delete(sender, instance, using, **kwargs):
+    ads_listing.invalidate([instance.category_id], using=using)
+
+
+@receiver(pre_save, sender=User)
+def detect_credentials_change(sender, instance, using, update_fields=None, **kwargs):
+    # A new password or a deactivation revokes the user's tokens once saved
+    if instance.pk is None or (update_fields is not None and not {'password', 'is_active'} & set(update_fields)):
+        return
+
+    previous = sender.objects.using(using).filter(pk=instance.pk).values('password', 'is_active').first()
+    instance._revoke_tokens = previous is not None and (
+        previous['password'] != instance.password or (previous['is_active'] and not instance.is_active)
+    )
+
+
+@receiver(post_save, sender=User)
+def refresh_token_user(sender, instance, using, **kwargs):
+    users.forget(instance.pk)
+    if getattr(instance, '_revoke_tokens', False):
+        instance._revoke_tokens = False
+        token_versions.revoke(instance.pk, using=using)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    users.forget(instance.pk)
+    token_versions.revoke_deleted(instance.pk)
+
+
+connection_created.connect(configure_sqlite_connection, dispatch_uid='ads_configure_sqlite_connection')
@@ -1,8 +1,12 @@
+import json
+from unittest import mock
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from ..models import Category, Condition, Ad
+from ..models import Category, Condition, Ad, ExchangeProposal
+from ..serializers import AdSerializer
+from ..services.export_service import ExportService
 
 User = get_user_model()
 
@@ -71,6 +75,86 @@ class CreateAdViewTest(APITestCase):
         self.assertEqual(response.data['is_created'], False)
 
 
+class CreateAdsViewTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        Category.objects.create(name="Техника")
+        Condition.objects.create(name="Б/у")
+
+    def ad(self, title, category="Техника", condition="Б/у"):
+        return {"title": title, "description": "Хороший телефон", "category": category, "condition": condition}
+
+    def test_correct_data(self):
+        data = {"ads": [self.ad(f"Телефон {i}") for i in range(3)]}
+
+        response = self.client.post(reverse('create-ads'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['is_created'], True)
+        ids = [result['id'] for result in response.data['results']]
+        self.assertEqual(list(Ad.objects.filter(id__in=ids, user=self.user).order_by('id')
+                              .values_list('title', flat=True)), ["Телефон 0", "Телефон 1", "Телефон 2"])
+
+    # Ошибки в отдельных объявлениях не мешают создать остальные
+    def test_partial_failure(self):
+        data = {"ads": [self.ad("Телефон"), self.ad("Часы", category="OGREMAGI"),
+                        {"title": "Без описания"}, "не объект", self.ad("Плеер", condition="MULTICAST")]}
+
+        response = self.client.post(reverse('create-ads'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['is_created'] for result in response.data['results']],
+                         [True, False, False, False, False])
+        self.assertEqual([result['index'] for result in response.data['results']], [0, 1, 2, 3, 4])
+        self.assertEqual(response.data['results'][1]['message'], 'Invalid category: OGREMAGI')
+        self.assertEqual(list(Ad.objects.values_list('title', flat=True)), ["Телефон"])
+
+    # Объявление с полями не того типа или длины отклоняется отдельно, а не всем запросом
+    def test_malformed_items(self):
+        data = {"ads": [dict(self.ad("Часы"), category=["Техника"]), dict(self.ad("Плеер"), condition=1),
+                        dict(self.ad("Телефон"), description={"text": "Хороший"}), self.ad("Т" * 101),
+                        dict(self.ad("Фотоаппарат"), description="Х" * 351), self.ad("Т" * 100)]}
+
+        response = self.client.post(reverse('create-ads'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['is_created'] for result in response.data['results']],
+                         [False, False, False, False, False, True])
+        self.assertEqual(response.data['results'][3]['message'], 'Title must be at most 100 characters')
+        self.assertEqual(response.data['results'][4]['message'], 'Description must be at most 350 characters')
+        self.assertEqual(list(Ad.objects.values_list('title', flat=True)), ["Т" * 100])
+
+    def test_all_invalid(self):
+        response = self.client.post(reverse('create-ads'), {"ads": [self.ad("Часы", category="OGREMAGI")]},
+                                    format='json')
+        self.assertEqual(response.data['is_created'], False)
+        self.assertFalse(Ad.objects.exists())
+
+    def test_incorrect_fields(self):
+        for data in ({}, {"ads": []}, {"ads": "Телефон"}):
+            with self.subTest(data=data):
+                response = self.client.post(reverse('create-ads'), data, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data['is_created'], False)
+                self.assertNotIn('results', response.data)
+
+    def test_limit(self):
+        data = {"ads": [self.ad("Телефон")] * 501}
+
+        response = self.client.post(reverse('create-ads'), data, format='json')
+        self.assertEqual(response.data['is_created'], False)
+        self.assertFalse(Ad.objects.exists())
+
+    # Новые объявления находятся поиском
+    def test_searchable(self):
+        self.client.post(reverse('create-ads'), {"ads": [self.ad("Фотоаппарат")]}, format='json')
+
+        response = self.client.post(reverse('ads'), {"query": "фотоаппарат"}, format='json')
+        self.assertEqual(len(response.data['results']), 1)
+
+
 class DeleteAdViewTest(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -112,6 +196,32 @@ class DeleteAdViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['is_deleted'], False)
 
+    # Объявление другого пользователя
+    def test_foreign_ad(self):
+        other_user = User.objects.create_user(username='otheruser', password='otherpass123')
+        other_ad_obj = Ad.objects.create(user=other_user, title="Плеер", description="Хороший плеер",
+                                         category=self.category_obj, condition=self.condition_obj)
+        ExchangeProposal.objects.create(ad_sender=other_ad_obj, ad_receiver=self.test_ad_obj)
+
+        response = self.client.post(reverse('delete-ad'), {"ad_id": other_ad_obj.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['is_deleted'], False)
+        self.assertTrue(Ad.objects.filter(id=other_ad_obj.id).exists())
+        self.assertEqual(ExchangeProposal.objects.count(), 1)
+
+    # Предложения обмена удаляются вместе с объявлением
+    def test_with_exchanges(self):
+        other_user = User.objects.create_user(username='otheruser', password='otherpass123')
+        other_ad_obj = Ad.objects.create(user=other_user, title="Плеер", description="Хороший плеер",
+                                         category=self.category_obj, condition=self.condition_obj)
+        ExchangeProposal.objects.create(ad_sender=self.test_ad_obj, ad_receiver=other_ad_obj)
+        ExchangeProposal.objects.create(ad_sender=other_ad_obj, ad_receiver=self.test_ad_obj)
+
+        response = self.client.post(reverse('delete-ad'), {"ad_id": self.test_ad_obj.id}, format='json')
+        self.assertEqual(response.data['is_deleted'], True)
+        self.assertFalse(Ad.objects.filter(id=self.test_ad_obj.id).exists())
+        self.assertEqual(ExchangeProposal.objects.count(), 0)
+
 
 class EditAdViewTest(APITestCase):
     def setUp(self):
@@ -156,6 +266,25 @@ class EditAdViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['is_edited'], False)
 
+    # Объявление другого пользователя
+    def test_foreign_ad(self):
+        other_user = User.objects.create_user(username='otheruser', password='otherpass123')
+        other_ad_obj = Ad.objects.create(user=other_user, title="Плеер", description="Хороший плеер",
+                                         category=self.category_obj, condition=self.condition_obj)
+        data = {
+            "ad_id": other_ad_obj.id,
+            "title": "Часы Casio Vintage",
+            "description": "Крутые часы",
+            "category": "Часы",
+            "condition": "Новое"
+        }
+
+        response = self.client.post(reverse('edit-ad'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['is_edited'], False)
+        other_ad_obj.refresh_from_db()
+        self.assertEqual(other_ad_obj.title, "Плеер")
+
     # Не все поля переданы
     def test_incorrect_fields(self):
         data = {
@@ -271,3 +400,187 @@ class AdsViewTest(APITestCase):
 
         response = self.client.post(reverse('ads'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_case_insensitive(self):
+        data = {
+            "query": "ТЕЛЕФОН"
+        }
+
+        response = self.client.post(reverse('ads'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class MyAdsViewTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.user_second = User.objects.create_user(
+            username='seconduser',
+            password='secondpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        self.test_ad_obj1 = Ad.objects.create(user=self.user, title="Телефон", description="Хороший телефон",
+                                              category=self.category_obj, condition=self.condition_obj)
+        self.test_ad_obj2 = Ad.objects.create(user=self.user, title="MP3 плеер", description="Хороший плеер",
+                                              category=self.category_obj, condition=self.condition_obj)
+        self.test_ad_obj3 = Ad.objects.create(user=self.user_second, title="Часы", description="Часы Casio",
+                                              category=self.category_obj, condition=self.condition_obj)
+
+    def proposals(self, response):
+        return {ad['id']: ad['proposals'] for ad in response.data['results']}
+
+    def test_own_ads_only(self):
+        response = self.client.post(reverse('my-ads'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([ad['id'] for ad in response.data['results']], [self.test_ad_obj2.id, self.test_ad_obj1.id])
+
+    def test_counts(self):
+        ExchangeProposal.objects.create(ad_sender=self.test_ad_obj3, ad_receiver=self.test_ad_obj1)
+        ExchangeProposal.objects.create(ad_sender=self.test_ad_obj2, ad_receiver=self.test_ad_obj1, status='declined')
+        ExchangeProposal.objects.create(ad_sender=self.test_ad_obj1, ad_receiver=self.test_ad_obj3, status='accepted')
+
+        response = self.client.post(reverse('my-ads'), {}, format='json')
+        self.assertEqual(self.proposals(response), {
+            self.test_ad_obj1.id: {'received': {'pending': 1, 'accepted': 0, 'declined': 1},
+                                   'sent': {'pending': 0, 'accepted': 1, 'declined': 0}},
+            self.test_ad_obj2.id: {'received': {'pending': 0, 'accepted': 0, 'declined': 0},
+                                   'sent': {'pending': 0, 'accepted': 0, 'declined': 1}},
+        })
+
+    def test_pages(self):
+        response = self.client.post(f"{reverse('my-ads')}?page_size=1", {}, format='json')
+        self.assertEqual([ad['id'] for ad in response.data['results']], [self.test_ad_obj2.id])
+
+        response = self.client.post(response.data['next'], {}, format='json')
+        self.assertEqual([ad['id'] for ad in response.data['results']], [self.test_ad_obj1.id])
+        self.assertIsNone(response.data['next'])
+
+
+class AdSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        self.tree_ad_obj = Ad.objects.create(user=self.user, title="Ёлка искусственная", description="Почти новая",
+                                             category=self.category_obj, condition=self.condition_obj)
+        self.phone_ad_obj = Ad.objects.create(user=self.user, title="Чехол", description="Подходит на телефон",
+                                              category=self.category_obj, condition=self.condition_obj)
+        self.title_ad_obj = Ad.objects.create(user=self.user, title="Телефон Nokia", description="Телефон на запчасти",
+                                              category=self.category_obj, condition=self.condition_obj)
+
+    def search(self, query):
+        response = self.client.post(reverse('ads'), {"query": query}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [ad['id'] for ad in response.data['results']]
+
+    # "ё" и "е" не различаются
+    def test_yo_folding(self):
+        self.assertEqual(self.search("елка"), [self.tree_ad_obj.id])
+        self.assertEqual(self.search("ЁЛКА"), [self.tree_ad_obj.id])
+
+    # Совпадение в заголовке важнее совпадения в описании
+    def test_ranking(self):
+        self.assertEqual(self.search("телефон"), [self.title_ad_obj.id, self.phone_ad_obj.id])
+
+    def test_all_terms_required(self):
+        self.assertEqual(self.search("телефон nokia"), [self.title_ad_obj.id])
+
+    def test_punctuation_only(self):
+        self.assertEqual(self.search("!!!"), [])
+
+    # Индекс обновляется при редактировании и удалении
+    def test_index_follows_edit_and_delete(self):
+        self.tree_ad_obj.title = "Гирлянда"
+        self.tree_ad_obj.save()
+        self.assertEqual(self.search("елка"), [])
+        self.assertEqual(self.search("гирлянда"), [self.tree_ad_obj.id])
+
+        self.title_ad_obj.delete()
+        self.assertEqual(self.search("nokia"), [])
+
+    def test_pagination(self):
+        for i in range(15):
+            Ad.objects.create(user=self.user, title=f"Телефон {i}", description="Новый",
+                              category=self.category_obj, condition=self.condition_obj)
+
+        response = self.client.post(reverse('ads'), {"query": "телефон"}, format='json')
+        ids = [ad['id'] for ad in response.data['results']]
+        response = self.client.post(response.data['next'], {"query": "телефон"}, format='json')
+        ids += [ad['id'] for ad in response.data['results']]
+
+        self.assertEqual(len(ids), 17)
+        self.assertEqual(len(set(ids)), 17)
+
+    # Больше 1000 объявлений с одинаковым рангом проходятся курсором до конца
+    def test_pagination_tied_ranks(self):
+        ads = Ad.objects.bulk_create([Ad(user=self.user, title="Телефон", description=f"Хороший телефон. Модель {i}",
+                                         category=self.category_obj, condition=self.condition_obj)
+                                      for i in range(1000, 2100)])
+        expected = {self.phone_ad_obj.id, self.title_ad_obj.id, *(ad.id for ad in ads)}
+
+        for url_name in ('ads', 'async-ads'):
+            with self.subTest(url_name=url_name):
+                ids, url = [], reverse(url_name)
+                while url and len(ids) <= len(expected):
+                    response = self.client.post(url, {"query": "телефон"}, format='json')
+                    ids += [ad['id'] for ad in response.data['results']]
+                    url = response.data['next']
+                self.assertEqual(len(ids), len(expected))
+                self.assertEqual(set(ids), expected)
+
+
+class ExportAdsViewTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        self.ads = [Ad.objects.create(user=self.user, title=f"Телефон {i}", description="Хороший телефон",
+                                      category=self.category_obj, condition=self.condition_obj) for i in range(5)]
+        self.ads.append(Ad.objects.create(user=self.user, title="Часы", description="Наручные часы"))
+
+    def export(self, data):
+        response = self.client.post(reverse('export-ads'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    # Каждая строка совпадает с AdSerializer, выгрузка идет частями
+    @mock.patch.object(ExportService, 'chunk_size', 2)
+    def test_no_filters(self):
+        rows = self.export({})
+        expected = json.loads(json.dumps(AdSerializer(self.ads, many=True).data))
+        self.assertEqual(rows, expected)
+
+    def test_filters(self):
+        rows = self.export({"query": "телефон", "category": ["Техника"]})
+        self.assertEqual([row['id'] for row in rows], [ad.id for ad in self.ads[:5]])
+
+    def test_incorrect_filters(self):
+        response = self.client.post(reverse('export-ads'), {"category": ["Неизвестно"]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Все строки читаются одним запросом
+    @mock.patch.object(ExportService, 'chunk_size', 2)
+    def test_single_query(self):
+        response = self.client.post(reverse('export-ads'), {}, format='json')
+        with self.assertNumQueries(1):
+            content = b''.join(response.streaming_content)
+        self.assertEqual(len(content.splitlines()), 6)
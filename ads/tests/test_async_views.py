@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from ..models import Category, Condition, Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+@override_settings(ADS_LISTING_CACHE=None)
+class AsyncViewsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.user_second = User.objects.create_user(
+            username='seconduser',
+            password='secondpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.category_obj = Category.objects.create(name="Техника")
+        Category.objects.create(name="Часы")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        ads = [Ad.objects.create(user=self.user if i % 2 else self.user_second, title=f"Телефон {i}",
+                                 description="Хороший телефон", category=self.category_obj,
+                                 condition=self.condition_obj) for i in range(25)]
+        for i in range(24):
+            ExchangeProposal.objects.create(ad_sender=ads[i], ad_receiver=ads[i + 1], comment="Давай меняться?",
+                                            status='accepted' if i % 3 else 'pending')
+
+    # Асинхронный эндпоинт отвечает так же, как синхронный, включая следующие страницы
+    def assertSameAsSync(self, url_name, data=None, method='post'):
+        sync_url, async_url = reverse(url_name), reverse(f'async-{url_name}')
+        while sync_url:
+            sync_response = getattr(self.client, method)(sync_url, data, format='json')
+            async_response = getattr(self.client, method)(async_url, data, format='json')
+            self.assertEqual(async_response.status_code, sync_response.status_code)
+            sync_json, async_json = sync_response.json(), async_response.json()
+            if not isinstance(sync_json, dict) or 'next' not in sync_json:
+                self.assertEqual(async_json, sync_json)
+                return
+            self.assertEqual(async_json['results'], sync_json['results'])
+            self.assertEqual(bool(async_json['next']), bool(sync_json['next']))
+            sync_url, async_url = sync_json['next'], async_json['next']
+
+    def test_ads(self):
+        for data in ({}, {"query": "телефон"}, {"category": ["Техника"], "condition": ["Б/у"]}, {"category": ["Часы"]}):
+            with self.subTest(data=data):
+                self.assertSameAsSync('ads', data)
+
+    def test_ads_incorrect_filters(self):
+        response = self.client.post(reverse('async-ads'), {"category": ["fakecategory"]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_exchanges(self):
+        for data in ({}, {"sender_username": "testuser"}, {"receiver_username": "seconduser", "status": ["pending"]},
+                     {"compact": True}):
+            with self.subTest(data=data):
+                self.assertSameAsSync('exchanges', data)
+
+    def test_exchanges_incorrect_filters(self):
+        response = self.client.post(reverse('async-exchanges'), {"sender_username": "nobody"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reference_data(self):
+        for url_name in ('categories', 'conditions', 'user-info'):
+            with self.subTest(url_name=url_name):
+                self.assertSameAsSync(url_name, method='get')
+
+    def test_reference_data_not_modified(self):
+        etag = self.client.get(reverse('categories'))['ETag']
+        response = self.client.get(reverse('async-categories'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unauthenticated(self):
+        response = APIClient().post(reverse('async-ads'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_method_not_allowed(self):
+        response = self.client.get(reverse('async-ads'))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    # Запрос через ASGI-обработчик с JWT
+    async def test_asgi_request(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await self.async_client.post(reverse('async-ads'), {"category": ["Техника"]},
+                                                content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 10)
+
+        response = await self.async_client.get(reverse('async-user-info'), headers=headers)
+        self.assertEqual(response.json(), {"account": "testuser"})
+
+    async def test_asgi_listing_cache(self):
+        caches['ads_listing'].clear()
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        with self.settings(ADS_LISTING_CACHE='ads_listing'):
+            first = await self.async_client.post(reverse('async-ads'), {}, content_type='application/json',
+                                                 headers=headers)
+            second = await self.async_client.post(reverse('async-ads'), {}, content_type='application/json',
+                                                  headers=headers)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
@@ -0,0 +1,166 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from ..authentication import ClaimsUser
+from ..models import Category, Condition, Ad
+from ..services.auth_cache import users
+
+User = get_user_model()
+
+
+class ClaimsAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        users.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        Category.objects.create(name="Техника")
+        Condition.objects.create(name="Б/у")
+
+    def login(self, password='testpass123'):
+        response = self.client.post(reverse('login'), {'username': 'testuser', 'password': password}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def client_for(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return client
+
+    def test_claims(self):
+        tokens = self.login()
+        for token in (AccessToken(tokens['access']), RefreshToken(tokens['refresh'])):
+            self.assertEqual(token['username'], 'testuser')
+            self.assertEqual(token['is_active'], True)
+            self.assertEqual(token['token_version'], 0)
+
+    # Чтение не запрашивает пользователя из базы
+    def test_no_user_query(self):
+        client = self.client_for(self.login()['access'])
+        client.get(reverse('user-info'))
+
+        with self.assertNumQueries(0):
+            response = client.get(reverse('user-info'))
+        self.assertEqual(response.data, {"account": "testuser"})
+
+        with self.assertNumQueries(1), self.settings(ADS_LISTING_CACHE=None):
+            response = client.post(reverse('ads'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_writes(self):
+        client = self.client_for(self.login()['access'])
+        response = client.post(reverse('create-ad'), {"title": "Телефон", "description": "Хороший телефон",
+                                                      "category": "Техника", "condition": "Б/у"}, format='json')
+
+        self.assertEqual(response.data['is_created'], True)
+        self.assertEqual(Ad.objects.get().user, self.user)
+
+    # Токены без новых claims продолжают работать
+    def test_token_without_claims(self):
+        client = self.client_for(AccessToken.for_user(self.user))
+
+        response = client.get(reverse('user-info'))
+        self.assertEqual(response.data, {"account": "testuser"})
+
+    def test_inactive_user_token_without_claims(self):
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        client = self.client_for(AccessToken.for_user(self.user))
+
+        self.assertEqual(client.get(reverse('user-info')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_tokens(self):
+        tokens = self.login()
+        client = self.client_for(tokens['access'])
+
+        response = client.post(reverse('revoke-tokens'))
+        self.assertEqual(response.data, {"is_revoked": True})
+
+        self.assertEqual(client.get(reverse('user-info')).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        new_tokens = self.login()
+        self.assertEqual(AccessToken(new_tokens['access'])['token_version'], 1)
+        self.assertEqual(self.client_for(new_tokens['access']).get(reverse('user-info')).status_code,
+                         status.HTTP_200_OK)
+
+    def test_password_change_revokes(self):
+        client = self.client_for(self.login()['access'])
+
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        self.assertEqual(client.get(reverse('user-info')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.login('newpass123')
+
+    def test_deactivation_revokes(self):
+        client = self.client_for(self.login()['access'])
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(client.get(reverse('user-info')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_changes_keep_tokens(self):
+        client = self.client_for(self.login()['access'])
+
+        self.user.email = 'new@example.com'
+        self.user.save()
+        self.login()
+
+        self.assertEqual(client.get(reverse('user-info')).status_code, status.HTTP_200_OK)
+
+    def test_deleted_user(self):
+        client = self.client_for(self.login()['access'])
+
+        self.user.delete()
+
+        self.assertEqual(client.get(reverse('user-info')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh(self):
+        tokens = self.login()
+
+        response = self.client.post(reverse('refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AccessToken(response.data['access'])['username'], 'testuser')
+
+
+class UserCacheTest(APITestCase):
+    def setUp(self):
+        users.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', email='test@example.com')
+        self.user_second = User.objects.create_user(username='seconduser', password='secondpass123')
+
+    # Полные данные пользователя загружаются один раз
+    def test_full_user_fallback(self):
+        claims_user = ClaimsUser(AccessToken.for_user(self.user))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(claims_user.email, 'test@example.com')
+            self.assertEqual(ClaimsUser(AccessToken.for_user(self.user)).email, 'test@example.com')
+
+    def test_bounded(self):
+        with self.settings(AUTH_USER_CACHE_SIZE=1):
+            users.get(self.user.id)
+            users.get(self.user_second.id)
+
+            with self.assertNumQueries(1):
+                users.get(self.user.id)
+
+    @override_settings(AUTH_USER_CACHE_TTL=0)
+    def test_ttl(self):
+        users.get(self.user.id)
+
+        with self.assertNumQueries(1):
+            users.get(self.user.id)
+
+    def test_forgotten_on_save(self):
+        users.get(self.user.id)
+
+        self.user.email = 'new@example.com'
+        self.user.save()
+
+        self.assertEqual(users.get(self.user.id).email, 'new@example.com')
@@ -0,0 +1,146 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from ..models import Category, Condition, Ad, ExchangeProposal
+from ..services.barter_graph import BarterGraph, barter_graph
+
+User = get_user_model()
+
+
+class BarterGraphTest(SimpleTestCase):
+    def graph(self, edges):
+        graph = BarterGraph()
+        graph.load(edges, ttl=3600)
+        return graph
+
+    def test_shortest_first(self):
+        graph = self.graph([(1, 2), (2, 3), (3, 4), (4, 1), (3, 1), (2, 1), (5, 1)])
+
+        self.assertEqual(graph.cycles(1, 5, 10), [[1, 2, 3], [1, 2, 3, 4]])
+        self.assertEqual(graph.cycles(1, 3, 10), [[1, 2, 3]])
+        self.assertEqual(graph.cycles(1, 5, 1), [[1, 2, 3]])
+
+    def test_simple_cycles(self):
+        # Цикл 2 → 3 → 2 не проходит через объявление и не повторяется внутри цепочки
+        graph = self.graph([(1, 2), (2, 3), (3, 2), (3, 4), (4, 1)])
+
+        self.assertEqual(graph.cycles(1, 5, 10), [[1, 2, 3, 4]])
+
+    def test_incremental(self):
+        graph = self.graph([(1, 2), (2, 3)])
+        self.assertEqual(graph.cycles(1, 5, 10), [])
+
+        graph.add(3, 1)
+        graph.add(3, 1)
+        self.assertEqual(graph.cycles(1, 5, 10), [[1, 2, 3]])
+
+        graph.change_status(3, 1, 'pending', 'accepted')
+        self.assertEqual(graph.cycles(1, 5, 10), [[1, 2, 3]])
+        graph.change_status(3, 1, 'pending', 'declined')
+        self.assertEqual(graph.cycles(1, 5, 10), [])
+
+        graph.change_status(3, 1, 'declined', 'pending')
+        graph.remove_ad(2)
+        self.assertEqual(graph.cycles(1, 5, 10), [])
+        self.assertEqual(graph.edge_count, 1)
+
+    @override_settings(BARTER_CYCLE_SEARCH_NODES=2)
+    def test_search_bound(self):
+        graph = self.graph([(1, 2), (2, 3), (3, 1)])
+
+        self.assertEqual(graph.cycles(1, 5, 10), [])
+
+
+class SuggestedCyclesViewTest(APITestCase):
+    def setUp(self):
+        barter_graph.clear()
+        self.addCleanup(barter_graph.clear)
+
+        self.users = [User.objects.create_user(username=f'user{i}', password='testpass123') for i in range(4)]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.users[0])
+
+        category = Category.objects.create(name="Техника")
+        condition = Condition.objects.create(name="Б/у")
+        self.ads = [Ad.objects.create(user=user, title=f"Телефон {i}", description="Хороший телефон",
+                                      category=category, condition=condition)
+                    for i, user in enumerate(self.users)]
+
+    def propose(self, *ads):
+        return [ExchangeProposal.objects.create(ad_sender=ad_sender, ad_receiver=ad_receiver)
+                for ad_sender, ad_receiver in zip(ads, ads[1:])]
+
+    def suggest(self, data=None):
+        response = self.client.post(reverse('suggested-cycles'), {"ad_id": self.ads[0].id, **(data or {})},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_cycle(self):
+        exchanges = self.propose(self.ads[0], self.ads[1], self.ads[2], self.ads[0])
+
+        data = self.suggest()
+        self.assertEqual(data['cycles'], [{'length': 3, 'exchanges': [obj.id for obj in exchanges]}])
+        self.assertEqual(data['exchanges'][exchanges[1].id],
+                         {'id': exchanges[1].id, 'ad_sender': self.ads[1].id, 'ad_receiver': self.ads[2].id})
+        self.assertEqual(data['ads'][self.ads[2].id], {'id': self.ads[2].id, 'user': 'user2', 'title': 'Телефон 2'})
+
+    def test_max_length(self):
+        self.propose(self.ads[0], self.ads[1], self.ads[2], self.ads[3], self.ads[0])
+
+        self.assertEqual(len(self.suggest()['cycles']), 1)
+        self.assertEqual(self.suggest({"max_length": 3})['cycles'], [])
+
+    def test_only_pending(self):
+        exchanges = self.propose(self.ads[0], self.ads[1], self.ads[2], self.ads[0])
+        self.suggest()
+
+        # Изменение в обход сервисов отсеивается проверкой по базе
+        ExchangeProposal.objects.filter(id=exchanges[1].id).update(status='accepted')
+        self.assertEqual(self.suggest()['cycles'], [])
+        self.assertEqual(barter_graph.edge_count, 2)
+
+    def test_index_follows_writes(self):
+        self.propose(self.ads[0], self.ads[1], self.ads[2])
+        self.suggest()
+
+        self.client.force_authenticate(user=self.users[2])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('create-exchange'), {"ad_sender_id": self.ads[2].id,
+                                                                     "ad_receiver_id": self.ads[0].id}, format='json')
+        self.assertEqual(response.data['is_created'], True)
+        self.assertEqual(barter_graph.edge_count, 3)
+
+        self.client.force_authenticate(user=self.users[0])
+        self.assertEqual(len(self.suggest()['cycles']), 1)
+
+        exchange_obj = ExchangeProposal.objects.latest('id')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('edit-exchange'), {"exchange_id": exchange_obj.id, "status": "declined"},
+                             format='json')
+        self.assertEqual(barter_graph.edge_count, 2)
+
+    def test_distinct_users(self):
+        same_user_ad = Ad.objects.create(user=self.users[1], title="Часы", description="Часы Casio")
+        self.propose(self.ads[0], self.ads[1], same_user_ad, self.ads[0])
+
+        self.assertEqual(self.suggest()['cycles'], [])
+
+    def test_query_budget(self):
+        self.propose(self.ads[0], self.ads[1], self.ads[2], self.ads[0])
+        self.suggest()
+
+        with self.assertNumQueries(2):
+            self.suggest()
+
+    def test_not_own_ad(self):
+        response = self.client.post(reverse('suggested-cycles'), {"ad_id": self.ads[1].id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid(self):
+        for data in ({}, {"ad_id": "abc"}, {"ad_id": self.ads[0].id, "max_length": 2},
+                     {"ad_id": self.ads[0].id, "max_length": 50}):
+            response = self.client.post(reverse('suggested-cycles'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,81 @@
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from ..models import Ad
+from ..services.database import run_with_lock_retry
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Pragmas are SQLite specific')
+class SQLitePragmasTest(SimpleTestCase):
+    databases = {'default'}
+
+    # Прагмы применяются при открытии соединения, поэтому проверяются на новом
+    def pragma(self, name):
+        new_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        self.addCleanup(new_connection.close)
+        with new_connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={'synchronous': 'NORMAL', 'busy_timeout': 5000, 'cache_size': -20000,
+                                       'temp_store': 'MEMORY'})
+    def test_applied(self):
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -20000)
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+    # Без профиля production настройки SQLite не меняются
+    def test_opt_in(self):
+        self.assertFalse(settings.SQLITE_PRODUCTION)
+        self.assertEqual(settings.SQLITE_PRAGMAS, {})
+        self.assertNotIn('transaction_mode', settings.DATABASES['default'].get('OPTIONS', {}))
+        self.assertEqual(self.pragma('synchronous'), 2)
+
+
+@mock.patch('ads.services.database.time.sleep')
+class LockRetryTest(SimpleTestCase):
+    def operation(self, *errors):
+        return mock.Mock(side_effect=[*errors, 'done'])
+
+    def test_retried(self, sleep):
+        operation = self.operation(OperationalError('database is locked'), OperationalError('database is locked'))
+
+        self.assertEqual(run_with_lock_retry(operation, Ad), 'done')
+        self.assertEqual(operation.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    # Ожидание растет экспоненциально и ограничено
+    def test_backoff(self, sleep):
+        operation = self.operation(*[OperationalError('database is locked')] * 3)
+
+        with self.settings(SQLITE_LOCK_BACKOFF=0.1), mock.patch('ads.services.database.random.uniform',
+                                                                 side_effect=lambda low, high: high):
+            run_with_lock_retry(operation, Ad)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.1, 0.2, 0.4])
+
+    def test_retries_exhausted(self, sleep):
+        operation = self.operation(*[OperationalError('database is locked')] * 3)
+
+        with self.settings(SQLITE_LOCK_RETRIES=2), self.assertRaises(OperationalError):
+            run_with_lock_retry(operation, Ad)
+        self.assertEqual(operation.call_count, 3)
+
+    def test_other_errors_not_retried(self, sleep):
+        operation = self.operation(OperationalError('no such table: ads_ad'))
+
+        with self.assertRaises(OperationalError):
+            run_with_lock_retry(operation, Ad)
+        self.assertEqual(operation.call_count, 1)
+
+
+class LockRetryInTransactionTest(TestCase):
+    # Внутри внешней транзакции повторять можно только ее целиком
+    def test_not_retried(self):
+        operation = mock.Mock(side_effect=[OperationalError('database is locked'), 'done'])
+
+        with self.assertRaises(OperationalError):
+            run_with_lock_retry(operation, Ad)
+        self.assertEqual(operation.call_count, 1)
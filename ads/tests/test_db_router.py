@@ -0,0 +1,209 @@
+import copy
+import os
+import sqlite3
+import tempfile
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connections, router, transaction
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from barterapp.db_router import ReplicaPinningMiddleware, ReplicaRouter, get_replica_router, pin_key
+from ..models import Category, Condition, Ad
+from ..services.auth_cache import token_versions
+from ..services.reference_cache import categories, conditions
+
+User = get_user_model()
+
+PRIMARY = 'router_primary'
+REPLICA = 'router_replica'
+
+
+@override_settings(DATABASE_PRIMARY=PRIMARY, DATABASE_REPLICAS=[REPLICA], ADS_LISTING_CACHE=None)
+class ReplicaRouterTest(SimpleTestCase):
+    # Основная база и реплика — два отдельных файла SQLite, подключаемые только на время теста
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.databases = cls.databases | {PRIMARY, REPLICA}
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        for alias in (PRIMARY, REPLICA):
+            settings_dict = copy.deepcopy(connections.settings['default'])
+            settings_dict['NAME'] = os.path.join(cls.tmpdir.name, f'{alias}.sqlite3')
+            connections.settings[alias] = settings_dict
+        with override_settings(DATABASE_REPLICAS=[]):
+            call_command('migrate', database=PRIMARY, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in (PRIMARY, REPLICA):
+            connections[alias].close()
+            delattr(connections._connections, alias)
+            del connections.settings[alias]
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.db_manager(PRIMARY).create_user(username='testuser', password='testpass123')
+        self.user_second = User.objects.db_manager(PRIMARY).create_user(username='seconduser',
+                                                                        password='secondpass123')
+        self.category_obj = Category.objects.db_manager(PRIMARY).create(name="Техника")
+        self.condition_obj = Condition.objects.db_manager(PRIMARY).create(name="Б/у")
+        self.replicate()
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.client_second = APIClient()
+        self.client_second.force_authenticate(user=self.user_second)
+
+    def tearDown(self):
+        for model in (Ad, Category, Condition, User):
+            model.objects.db_manager(PRIMARY).all().delete()
+        for user_id in (self.user.pk, self.user_second.pk):
+            cache.delete(pin_key(user_id))
+        # Справочники не должны остаться загруженными из временной базы
+        categories.invalidate()
+        conditions.invalidate()
+
+    def replicate(self):
+        connections[REPLICA].close()
+        source = sqlite3.connect(connections.settings[PRIMARY]['NAME'])
+        target = sqlite3.connect(connections.settings[REPLICA]['NAME'])
+        source.backup(target)
+        source.close()
+        target.close()
+        categories.invalidate()
+        conditions.invalidate()
+
+    def create_ad(self, title):
+        return Ad.objects.db_manager(PRIMARY).create(user=self.user, title=title, description="Хороший телефон",
+                                                     category=self.category_obj, condition=self.condition_obj)
+
+    def ad_titles(self, client):
+        response = client.post(reverse('ads'), {}, format='json')
+        return [ad['title'] for ad in response.data['results']]
+
+    def test_reads_from_replica(self):
+        self.create_ad("Телефон")
+        self.assertEqual(self.ad_titles(self.client), [])
+
+        self.replicate()
+        self.assertEqual(self.ad_titles(self.client), ["Телефон"])
+
+    def test_writes_go_to_primary(self):
+        response = self.client.post(reverse('create-ad'), {"title": "Телефон", "description": "Хороший телефон",
+                                                           "category": "Техника", "condition": "Б/у"}, format='json')
+        self.assertEqual(response.data['is_created'], True)
+        self.assertTrue(Ad.objects.using(PRIMARY).filter(title="Телефон").exists())
+        self.assertFalse(Ad.objects.using(REPLICA).filter(title="Телефон").exists())
+
+    # Автор изменения читает из основной базы, остальные пользователи — из реплики
+    def test_read_your_writes(self):
+        self.client.post(reverse('create-ad'), {"title": "Телефон", "description": "Хороший телефон",
+                                                "category": "Техника", "condition": "Б/у"}, format='json')
+
+        self.assertEqual(self.ad_titles(self.client), ["Телефон"])
+        self.assertEqual(self.ad_titles(self.client_second), [])
+
+        # Окно закрепления истекло
+        cache.delete(pin_key(self.user.pk))
+        self.assertEqual(self.ad_titles(self.client), [])
+
+    def test_pin_seconds(self):
+        with self.settings(DATABASE_PIN_SECONDS=0):
+            self.client.post(reverse('create-ad'), {"title": "Телефон", "description": "Хороший телефон",
+                                                    "category": "Техника", "condition": "Б/у"}, format='json')
+        self.assertIsNone(cache.get(pin_key(self.user.pk)))
+
+    def test_failed_read_request_not_pinned(self):
+        self.client.post(reverse('ads'), {}, format='json')
+        self.assertIsNone(cache.get(pin_key(self.user.pk)))
+
+    def test_atomic_reads_from_primary(self):
+        self.assertEqual(router.db_for_read(Ad), REPLICA)
+        with transaction.atomic(using=PRIMARY):
+            self.assertEqual(router.db_for_read(Ad), PRIMARY)
+        self.assertEqual(router.db_for_write(Ad), PRIMARY)
+
+    # Версия токена после отзыва читается из основной базы, даже если реплика отстает
+    def test_token_version_from_primary(self):
+        self.addCleanup(cache.delete, token_versions.key(self.user.pk))
+        token_versions.revoke(self.user.pk)
+
+        self.assertEqual(token_versions.get(self.user.pk), 1)
+
+    # Проверка версии токена не закрепляет пользователя за основной базой
+    def test_token_version_not_pinned(self):
+        self.addCleanup(cache.delete, token_versions.key(self.user.pk))
+        self.create_ad("Телефон")
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.ad_titles(client), [])
+        self.assertIsNone(cache.get(pin_key(self.user.pk)))
+
+    # Перезагрузка кэшей после записи идет в основную базу, пока реплика отстает
+    def test_reference_reload_from_primary(self):
+        categories.all()
+        Category.objects.db_manager(PRIMARY).create(name="Часы")
+
+        self.assertIsNotNone(categories.get("Часы"))
+
+    def test_listing_fill_from_primary(self):
+        self.addCleanup(caches['ads_listing'].clear)
+        with self.settings(ADS_LISTING_CACHE='ads_listing'):
+            caches['ads_listing'].clear()
+            self.assertEqual(self.ad_titles(self.client_second), [])
+
+            self.create_ad("Телефон")
+            self.assertEqual(self.ad_titles(self.client_second), ["Телефон"])
+        # Заполнение кэша — чтение, пользователь не закрепляется за основной базой
+        self.assertIsNone(cache.get(pin_key(self.user_second.pk)))
+
+    def test_replica_not_migrated(self):
+        self.assertFalse(router.allow_migrate(REPLICA, 'ads'))
+        self.assertTrue(router.allow_migrate(PRIMARY, 'ads'))
+
+    def test_in_flight_released(self):
+        self.ad_titles(self.client)
+        self.assertEqual(get_replica_router().in_flight.get(REPLICA, 0), 0)
+
+    # Асинхронная цепочка не переходит в поток ради middleware и тоже читает реплику
+    async def test_async_request(self):
+        async def get_response(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(ReplicaPinningMiddleware(get_response)))
+
+        await sync_to_async(self.create_ad)("Телефон")
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await self.async_client.post(reverse('async-ads'), {}, content_type='application/json',
+                                                headers=headers)
+        self.assertEqual(response.json()['results'], [])
+        self.assertEqual(get_replica_router().in_flight.get(REPLICA, 0), 0)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaSelectionTest(SimpleTestCase):
+    def test_round_robin(self):
+        replica_router = ReplicaRouter()
+        self.assertEqual([replica_router.choose_replica() for _ in range(3)], ['replica1', 'replica2', 'replica1'])
+
+    def test_least_loaded(self):
+        replica_router = ReplicaRouter()
+        with self.settings(DATABASE_REPLICA_SELECTION='least_loaded'):
+            replica_router.acquire('replica1')
+            self.assertEqual(replica_router.choose_replica(), 'replica2')
+
+            replica_router.acquire('replica2')
+            replica_router.acquire('replica2')
+            replica_router.release('replica1')
+            self.assertEqual(replica_router.choose_replica(), 'replica1')
+
+    def test_no_replicas(self):
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(ReplicaRouter().db_for_read(Ad), 'default')
@@ -1,8 +1,12 @@
+import json
+from unittest import mock
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from ..models import Category, Condition, Ad, ExchangeProposal
+from ..serializers import ExchangeSerializer
+from ..services.export_service import ExportService
 
 User = get_user_model()
 
@@ -66,6 +70,21 @@ class CreateExchangeViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['is_created'], False)
 
+    # Предлагать можно только своё объявление
+    def test_foreign_sender(self):
+        other_user = User.objects.create_user(username='otheruser', password='otherpass123')
+        other_ad_obj = Ad.objects.create(user=other_user, title="Часы", description="Хорошие часы",
+                                         category=self.category_obj, condition=self.condition_obj)
+        data = {
+            "ad_sender_id": other_ad_obj.id,
+            "ad_receiver_id": self.test_ad_obj1.id
+        }
+
+        response = self.client.post(reverse('create-exchange'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['is_created'], False)
+        self.assertFalse(ExchangeProposal.objects.exists())
+
     def test_equal_ids(self):
         data = {
             "ad_sender_id": self.test_ad_obj1.id,
@@ -77,6 +96,25 @@ class CreateExchangeViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['is_created'], False)
 
+    # Повторное предложение для той же пары возможно только после ответа на первое
+    def test_duplicate_pending(self):
+        data = {
+            "ad_sender_id": self.test_ad_obj1.id,
+            "ad_receiver_id": self.test_ad_obj2.id
+        }
+        self.client.post(reverse('create-exchange'), data, format='json')
+
+        response = self.client.post(reverse('create-exchange'), data, format='json')
+        self.assertEqual(response.data['is_created'], False)
+        self.assertIn('already exists', response.data['message'])
+        self.test_ad_obj2.refresh_from_db()
+        self.assertEqual((self.test_ad_obj2.received_count, self.test_ad_obj2.pending_count), (1, 1))
+
+        ExchangeProposal.objects.update(status='declined')
+        response = self.client.post(reverse('create-exchange'), data, format='json')
+        self.assertEqual(response.data['is_created'], True)
+        self.assertEqual(ExchangeProposal.objects.count(), 2)
+
 
 class EditExchangeViewText(APITestCase):
     def setUp(self):
@@ -144,6 +182,152 @@ class EditExchangeViewText(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['is_edited'], False)
 
+    # Пользователь с собственными обменами не может менять чужие
+    def test_incorrect_user_with_own_exchanges(self):
+        own_ad_obj1 = Ad.objects.create(user=self.user_second, title="Часы", description="Хорошие часы",
+                                        category=self.category_obj, condition=self.condition_obj)
+        own_ad_obj2 = Ad.objects.create(user=self.user_second, title="Книга", description="Хорошая книга",
+                                        category=self.category_obj, condition=self.condition_obj)
+        ExchangeProposal.objects.create(ad_sender=own_ad_obj1, ad_receiver=own_ad_obj2)
+        data = {
+            "exchange_id": self.test_exchange_obj.id,
+            "status": "accepted"
+        }
+
+        response = self.client_second.post(reverse('edit-exchange'), data, format='json')
+        self.assertEqual(response.data['is_edited'], False)
+        self.test_exchange_obj.refresh_from_db()
+        self.assertEqual(self.test_exchange_obj.status, 'pending')
+
+    # Русские названия статусов сохраняются как ключи и участвуют в проверке дубликатов
+    def test_status_labels(self):
+        for label, key in (("Отклонено", "declined"), ("Ожидает", "pending")):
+            response = self.client.post(reverse('edit-exchange'), {"exchange_id": self.test_exchange_obj.id,
+                                                                   "status": label}, format='json')
+            self.assertEqual(response.data['is_edited'], True)
+            self.test_exchange_obj.refresh_from_db()
+            self.assertEqual(self.test_exchange_obj.status, key)
+
+        self.test_ad_obj2.refresh_from_db()
+        self.assertEqual(self.test_ad_obj2.pending_count, 1)
+        response = self.client.post(reverse('create-exchange'), {"ad_sender_id": self.test_ad_obj1.id,
+                                                                 "ad_receiver_id": self.test_ad_obj2.id}, format='json')
+        self.assertEqual(response.data['is_created'], False)
+
+        response = self.client.post(reverse('exchanges'), {"status": ["Ожидает"]}, format='json')
+        self.assertEqual([exchange['id'] for exchange in response.data['results']], [self.test_exchange_obj.id])
+
+    def test_duplicate_pending(self):
+        declined_obj = ExchangeProposal.objects.create(ad_sender=self.test_ad_obj1, ad_receiver=self.test_ad_obj2,
+                                                       status='declined')
+        data = {
+            "exchange_id": declined_obj.id,
+            "status": "pending"
+        }
+
+        response = self.client.post(reverse('edit-exchange'), data, format='json')
+        self.assertEqual(response.data['is_edited'], False)
+        self.assertIn('pending duplicate', response.data['message'])
+        declined_obj.refresh_from_db()
+        self.assertEqual(declined_obj.status, 'declined')
+
+    def test_incorrect_status(self):
+        data = {
+            "exchange_id": self.test_exchange_obj.id,
+            "status": "fakestatus"
+        }
+
+        response = self.client.post(reverse('edit-exchange'), data, format='json')
+        self.assertEqual(response.data['is_edited'], False)
+
+
+class EditExchangesViewTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.user_second = User.objects.create_user(
+            username='seconduser',
+            password='secondpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        own_ads = [Ad.objects.create(user=self.user, title=f"Телефон {i}", description="Хороший телефон",
+                                     category=self.category_obj, condition=self.condition_obj) for i in range(2)]
+        foreign_ads = [Ad.objects.create(user=self.user_second, title=f"Часы {i}", description="Хорошие часы",
+                                         category=self.category_obj, condition=self.condition_obj) for i in range(2)]
+        self.sent = ExchangeProposal.objects.create(ad_sender=own_ads[0], ad_receiver=foreign_ads[0])
+        self.received = ExchangeProposal.objects.create(ad_sender=foreign_ads[1], ad_receiver=own_ads[1])
+        self.foreign = ExchangeProposal.objects.create(ad_sender=foreign_ads[0], ad_receiver=foreign_ads[1])
+        self.declined = ExchangeProposal.objects.create(ad_sender=foreign_ads[0], ad_receiver=own_ads[0],
+                                                        status='declined')
+
+    def statuses(self):
+        return dict(ExchangeProposal.objects.values_list('id', 'status'))
+
+    def test_correct_data(self):
+        data = {"exchange_ids": [self.sent.id, self.received.id], "status": "declined"}
+
+        response = self.client.post(reverse('edit-exchanges'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['is_edited'], True)
+        self.assertEqual(response.data['edited_ids'], [self.sent.id, self.received.id])
+        self.assertEqual(response.data['not_edited_ids'], [])
+        self.assertEqual(self.statuses()[self.received.id], 'declined')
+
+    # Чужие, несуществующие и уже имеющие этот статус предложения не изменяются
+    def test_partial(self):
+        data = {"exchange_ids": [self.foreign.id, self.sent.id, 5252, self.declined.id, self.sent.id],
+                "status": "declined"}
+
+        response = self.client.post(reverse('edit-exchanges'), data, format='json')
+        self.assertEqual(response.data['edited_ids'], [self.sent.id])
+        self.assertEqual(response.data['not_edited_ids'], [self.foreign.id, 5252, self.declined.id])
+        self.assertEqual(self.statuses(), {self.sent.id: 'declined', self.received.id: 'pending',
+                                           self.foreign.id: 'pending', self.declined.id: 'declined'})
+
+    # Изменение не применяется целиком, если оставит два ожидающих предложения для одной пары
+    def test_duplicate_pending(self):
+        ExchangeProposal.objects.filter(id=self.sent.id).update(status='accepted')
+        duplicate = ExchangeProposal.objects.create(ad_sender=self.sent.ad_sender, ad_receiver=self.sent.ad_receiver)
+        data = {"exchange_ids": [self.sent.id, self.declined.id], "status": "pending"}
+
+        response = self.client.post(reverse('edit-exchanges'), data, format='json')
+        self.assertEqual(response.data['is_edited'], False)
+        self.assertEqual(response.data['not_edited_ids'], [self.sent.id, self.declined.id])
+        self.assertEqual(self.statuses()[self.declined.id], 'declined')
+        self.assertEqual(self.statuses()[duplicate.id], 'pending')
+
+    def test_status_labels(self):
+        data = {"exchange_ids": [self.sent.id, self.received.id], "status": "Принято"}
+
+        response = self.client.post(reverse('edit-exchanges'), data, format='json')
+        self.assertEqual(response.data['edited_ids'], [self.sent.id, self.received.id])
+        self.assertEqual(self.statuses()[self.sent.id], 'accepted')
+
+    def test_nothing_edited(self):
+        data = {"exchange_ids": [self.foreign.id], "status": "accepted"}
+
+        response = self.client.post(reverse('edit-exchanges'), data, format='json')
+        self.assertEqual(response.data['is_edited'], False)
+        self.assertEqual(self.statuses()[self.foreign.id], 'pending')
+
+    def test_incorrect_fields(self):
+        for data in ({"status": "accepted"}, {"exchange_ids": [], "status": "accepted"},
+                     {"exchange_ids": self.sent.id, "status": "accepted"},
+                     {"exchange_ids": [self.sent.id], "status": "fakestatus"},
+                     {"exchange_ids": ["abc"], "status": "accepted"},
+                     {"exchange_ids": [self.sent.id] * 501, "status": "accepted"}):
+            with self.subTest(data=data):
+                response = self.client.post(reverse('edit-exchanges'), data, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data['is_edited'], False)
+        self.assertEqual(self.statuses()[self.sent.id], 'pending')
+
 
 class ExchangesViewTest(APITestCase):
     def setUp(self):
@@ -169,7 +353,7 @@ class ExchangesViewTest(APITestCase):
 
         response = self.client.post(reverse('exchanges'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_by_sender(self):
         data = {
@@ -178,7 +362,7 @@ class ExchangesViewTest(APITestCase):
 
         response = self.client.post(reverse('exchanges'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_by_incorrect_sender(self):
         data = {
@@ -195,7 +379,7 @@ class ExchangesViewTest(APITestCase):
 
         response = self.client.post(reverse('exchanges'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_by_incorrect_receiver(self):
         data = {
@@ -212,7 +396,7 @@ class ExchangesViewTest(APITestCase):
 
         response = self.client.post(reverse('exchanges'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
     def test_by_status_pending(self):
         data = {
@@ -221,7 +405,7 @@ class ExchangesViewTest(APITestCase):
 
         response = self.client.post(reverse('exchanges'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_by_status_declined(self):
         data = {
@@ -230,7 +414,7 @@ class ExchangesViewTest(APITestCase):
 
         response = self.client.post(reverse('exchanges'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
 
     def test_by_incorrect_status(self):
         data = {
@@ -239,4 +423,126 @@ class ExchangesViewTest(APITestCase):
 
         response = self.client.post(reverse('exchanges'), data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_pagination(self):
+        # Принятые, так как ожидающее предложение у пары объявлений может быть только одно
+        for i in range(25):
+            ExchangeProposal.objects.create(ad_sender=self.test_ad_obj2, ad_receiver=self.test_ad_obj1,
+                                            status='accepted')
+
+        response = self.client.post(reverse('exchanges'), {}, format='json')
+        self.assertEqual(len(response.data['results']), 20)
+        ids = [exchange['id'] for exchange in response.data['results']]
+
+        response = self.client.post(response.data['next'], {}, format='json')
+        self.assertIsNone(response.data['next'])
+        ids += [exchange['id'] for exchange in response.data['results']]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(len(ids), 26)
+
+    def test_page_size(self):
+        for i in range(5):
+            ExchangeProposal.objects.create(ad_sender=self.test_ad_obj2, ad_receiver=self.test_ad_obj1,
+                                            status='accepted')
+
+        response = self.client.post(reverse('exchanges') + '?page_size=2', {}, format='json')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_page_size_cap(self):
+        ExchangeProposal.objects.bulk_create([
+            ExchangeProposal(ad_sender=self.test_ad_obj2, ad_receiver=self.test_ad_obj1, status='accepted')
+            for i in range(150)
+        ])
+
+        response = self.client.post(reverse('exchanges') + '?page_size=1000', {}, format='json')
+        self.assertEqual(len(response.data['results']), 100)
+
+
+class CompactExchangesViewTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        ads = [Ad.objects.create(user=self.user, title=f"Телефон {i}", description="Хороший телефон",
+                                 category=self.category_obj, condition=self.condition_obj) for i in range(3)]
+        ads.append(Ad.objects.create(user=self.user, title="Без категории", description="Хороший телефон"))
+        for ad_sender, ad_receiver in [(0, 1), (1, 2), (2, 0), (3, 0)]:
+            ExchangeProposal.objects.create(ad_sender=ads[ad_sender], ad_receiver=ads[ad_receiver],
+                                            comment="Давай меняться?")
+
+    def test_same_data_as_full(self):
+        full = self.client.post(reverse('exchanges'), {}, format='json').json()
+        compact = self.client.post(reverse('exchanges'), {"compact": True}, format='json').json()
+
+        expanded = []
+        for exchange in compact['results']:
+            exchange = dict(exchange)
+            for field in ('ad_sender', 'ad_receiver'):
+                ad = dict(compact['ads'][str(exchange[field])])
+                ad['category'] = compact['categories'].get(str(ad['category']))
+                ad['condition'] = compact['conditions'].get(str(ad['condition']))
+                exchange[field] = ad
+            expanded.append(exchange)
+
+        self.assertEqual(expanded, full['results'])
+        self.assertEqual(compact['next'], full['next'])
+
+    # Объявления и справочники не повторяются
+    def test_deduplicated(self):
+        response = self.client.post(reverse('exchanges'), {"compact": True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(len(response.data['ads']), 4)
+        self.assertEqual(len(response.data['categories']), 1)
+        self.assertEqual(len(response.data['conditions']), 1)
+
+    def test_filters(self):
+        response = self.client.post(reverse('exchanges'), {"compact": True, "status": ["accepted"]}, format='json')
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['ads'], {})
+
+
+class ExportExchangesViewTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        ads = [Ad.objects.create(user=self.user, title=f"Телефон {i}", description="Хороший телефон",
+                                 category=self.category_obj, condition=self.condition_obj) for i in range(3)]
+        self.exchanges = [ExchangeProposal.objects.create(ad_sender=ads[ad_sender], ad_receiver=ads[ad_receiver],
+                                                          comment="Давай меняться?")
+                          for ad_sender, ad_receiver in [(0, 1), (1, 2), (2, 0)]]
+        self.exchanges[1].status = 'accepted'
+        self.exchanges[1].save()
+
+    def export(self, data):
+        response = self.client.post(reverse('export-exchanges'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    # Каждая строка совпадает с ExchangeSerializer, выгрузка идет частями
+    @mock.patch.object(ExportService, 'chunk_size', 2)
+    def test_no_filters(self):
+        rows = self.export({})
+        expected = json.loads(json.dumps(ExchangeSerializer(self.exchanges, many=True).data))
+        self.assertEqual(rows, expected)
+
+    def test_by_status(self):
+        rows = self.export({"status": ["accepted"]})
+        self.assertEqual([row['id'] for row in rows], [self.exchanges[1].id])
+
+    def test_by_incorrect_sender(self):
+        response = self.client.post(reverse('export-exchanges'), {"sender_username": "nobody"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,110 @@
+import datetime
+import decimal
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APIClient
+from ..models import Category, Condition, Ad, ExchangeProposal
+from ..renderers import FastJSONRenderer
+from ..serializers import AdSerializer, ExchangeSerializer
+from ..services.ads_service import AdsService
+from ..services.exchanges_service import ExchangeService
+
+User = get_user_model()
+
+
+def dumps(data):
+    return json.dumps(data).encode()
+
+
+@override_settings(ADS_LISTING_CACHE=None)
+class FastPathTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.user_second = User.objects.create_user(username='seconduser', password='secondpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name="Техника")
+        condition = Condition.objects.create(name="Б/у")
+        self.ads = [
+            Ad.objects.create(user=self.user, title="Телефон", description="Хороший телефон\u2028",
+                              category=category, condition=condition),
+            Ad.objects.create(user=self.user, title="Телефон старый", description="Телефон без категории"),
+            Ad.objects.create(user=self.user_second, title="Часы", description="Часы \"Casio\"",
+                              category=category),
+        ]
+        Ad.objects.filter(id=self.ads[0].id).update(created_at=datetime.datetime(2024, 5, 1, 12, 0, 0, 123456,
+                                                                                 tzinfo=datetime.timezone.utc))
+        for index, ad_status in enumerate(['pending', 'accepted', 'declined']):
+            ExchangeProposal.objects.create(ad_sender=self.ads[index], ad_receiver=self.ads[(index + 1) % 3],
+                                            status=ad_status, comment=None if index else "Давай меняться?")
+
+    def assertSameJSON(self, fast, expected):
+        self.assertEqual(FastJSONRenderer().render(fast), JSONRenderer().render(expected))
+
+    # Строки values() дают тот же ответ, что и сериализаторы
+    def test_ads_golden(self):
+        for data in ({}, {'query': 'телефон'}, {'category': ['Техника']}):
+            queryset = AdsService().all_ads(data).order_by('created_at', 'id')
+            fast = AdsService().ad_page(AdsService().ad_values(queryset))
+
+            self.assertSameJSON(fast, AdSerializer(queryset, many=True).data)
+
+    def test_exchanges_golden(self):
+        queryset = ExchangeService().all_exchanges({}).order_by('created_at', 'id')
+        fast = ExchangeService().exchange_page(ExchangeService().compact_exchanges(queryset))
+
+        self.assertSameJSON(fast, ExchangeSerializer(queryset, many=True).data)
+
+    def test_views_pages(self):
+        response = self.client.post(reverse('ads'), {'query': 'телефон'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({ad['id'] for ad in response.json()['results']}, {self.ads[0].id, self.ads[1].id})
+        self.assertIn(b'\\u2028', response.content)
+
+        pages = []
+        url = reverse('exchanges') + '?page_size=2'
+        while url:
+            response = self.client.post(url, {}, format='json')
+            pages += response.json()['results']
+            url = response.json()['next']
+
+        expected = ExchangeSerializer(ExchangeProposal.objects.order_by('created_at', 'id'), many=True).data
+        self.assertEqual(pages, json.loads(JSONRenderer().render(expected)))
+
+    def test_async_views(self):
+        for name in ('ads', 'exchanges'):
+            response = self.client.post(reverse(name), {}, format='json')
+            async_response = self.client.post(reverse(f'async-{name}'), {}, format='json')
+
+            self.assertEqual(async_response.json()['results'], response.json()['results'])
+
+
+class FastJSONRendererTest(APITestCase):
+    def test_same_bytes(self):
+        data = {
+            'text': 'Объявление "новое"\u2028\u2029\\',
+            'created_at': datetime.datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=datetime.timezone.utc),
+            'date': datetime.date(2024, 5, 1),
+            'price': decimal.Decimal('10.50'),
+            'ids': {1: [1, 2.5, None, True]},
+        }
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back(self):
+        data = {'id': 1}
+
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=4'),
+                         JSONRenderer().render(data, 'application/json; indent=4'))
+
+    @override_settings(ADS_JSON_ENCODER='ads.tests.test_fast_path.dumps')
+    def test_custom_encoder(self):
+        self.assertEqual(FastJSONRenderer().render({'id': 1}), b'{"id": 1}')
@@ -0,0 +1,82 @@
+from collections import Counter
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase
+from ..models import Ad, ExchangeProposal
+from ..services.ads_service import AdsService
+
+User = get_user_model()
+
+
+class GenerateDataTest(TestCase):
+    def tearDown(self):
+        # Удаленные пользователи оставляют в кэше отозванные версии токенов, а их id переиспользуются
+        cache.clear()
+
+    def generate(self, **options):
+        call_command('generate_data', stdout=StringIO(), **{'users': 20, 'ads': 300, 'proposals': 200,
+                                                            'chunk_size': 64, **options})
+
+    def snapshot(self):
+        ads = list(Ad.objects.order_by('id').values_list('user__username', 'title', 'description',
+                                                         'category__name', 'condition__name'))
+        proposals = list(ExchangeProposal.objects.order_by('id').values_list('status', 'comment'))
+        return ads, proposals
+
+    def test_counts(self):
+        self.generate()
+
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Ad.objects.count(), 300)
+        self.assertEqual(ExchangeProposal.objects.count(), 200)
+        self.assertFalse(ExchangeProposal.objects.filter(ad_sender=F('ad_receiver')).exists())
+
+    # Повторный запуск добавляет данные к существующим
+    def test_adds_to_existing(self):
+        self.generate()
+        self.generate(seed=1)
+
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Ad.objects.count(), 600)
+        self.assertEqual(ExchangeProposal.objects.count(), 400)
+
+    # В итоге указано, сколько предложений вставлено, без пропущенных повторов ожидающих пар
+    def test_summary_counts_inserted(self):
+        out = StringIO()
+        call_command('generate_data', stdout=out, users=1, ads=2, proposals=5, status_mix='pending=1')
+
+        self.assertEqual(ExchangeProposal.objects.count(), 2)
+        self.assertIn('Generated 1 users, 2 ads and 2 proposals', out.getvalue())
+
+    def test_deterministic(self):
+        self.generate()
+        first = self.snapshot()
+        User.objects.all().delete()
+
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+
+    def test_skew(self):
+        self.generate(skew=2)
+
+        by_category = Counter(Ad.objects.values_list('category__name', flat=True))
+        self.assertEqual(by_category.most_common(1)[0][0], 'Техника')
+        by_user = Counter(Ad.objects.values_list('user_id', flat=True))
+        self.assertGreater(by_user.most_common(1)[0][1], 300 / 20 * 3)
+
+    def test_status_mix(self):
+        self.generate(status_mix='pending=0,accepted=1,declined=0')
+        self.assertEqual(set(ExchangeProposal.objects.values_list('status', flat=True)), {'accepted'})
+
+        for status_mix in ('pending', 'pending=1,archived=1'):
+            with self.subTest(status_mix=status_mix), self.assertRaises(CommandError):
+                self.generate(status_mix=status_mix)
+
+    # Сгенерированные объявления находятся поиском
+    def test_searchable(self):
+        self.generate()
+        self.assertTrue(AdsService().all_ads({'query': 'телефон'}).exists())
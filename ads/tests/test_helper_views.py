@@ -1,8 +1,11 @@
+from unittest import mock
+
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from ..models import Category, Condition, Ad, ExchangeProposal
+from ..serializers import CategorySerializer
 
 User = get_user_model()
 
@@ -58,3 +61,45 @@ class ConditionsViewTest(APITestCase):
         response = self.client.get(reverse('conditions'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)
+
+
+class ReferenceDataCachingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        Category.objects.create(name='Техника')
+        Condition.objects.create(name='Б/у')
+
+    def test_headers(self):
+        for url_name in ['categories', 'conditions']:
+            response = self.client.get(reverse(url_name))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertTrue(response['ETag'].startswith('"'))
+            self.assertIn('max-age', response['Cache-Control'])
+            self.assertEqual(response.json(), response.data)
+
+    # Повторный запрос с тем же ETag не трогает базу и сериализаторы
+    def test_not_modified(self):
+        etag = self.client.get(reverse('categories'))['ETag']
+
+        with self.assertNumQueries(0), mock.patch.object(CategorySerializer, 'to_representation') as to_representation:
+            response = self.client.get(reverse('categories'), HTTP_IF_NONE_MATCH=etag)
+        to_representation.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_changed_data(self):
+        etag = self.client.get(reverse('categories'))['ETag']
+        Category.objects.create(name='Часы')
+
+        response = self.client.get(reverse('categories'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data), 2)
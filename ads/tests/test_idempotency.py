@@ -0,0 +1,188 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase, APIClient
+from ..models import Category, Condition, Ad, ExchangeProposal, IdempotencyKey
+
+User = get_user_model()
+
+
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.user_second = User.objects.create_user(username='seconduser', password='secondpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        self.ad_obj = Ad.objects.create(user=self.user, title="Телефон", description="Хороший телефон",
+                                        category=self.category_obj, condition=self.condition_obj)
+        self.other_ad = Ad.objects.create(user=self.user_second, title="Часы", description="Часы Casio",
+                                          category=self.category_obj, condition=self.condition_obj)
+        self.ad_data = {"title": "iPhone 13", "description": "Хорошее состояние", "category": "Техника",
+                        "condition": "Б/у"}
+
+    def post(self, name, data, key='key-1'):
+        return self.client.post(reverse(name), data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_create_ad_replay(self):
+        response = self.post('create-ad', self.ad_data)
+        self.assertEqual(response.data['is_created'], True)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+        # Одно чтение ключа, остальное - точка сохранения транзакции
+        with self.assertNumQueries(3):
+            replay = self.post('create-ad', self.ad_data)
+        self.assertEqual(replay.status_code, status.HTTP_200_OK)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(Ad.objects.filter(title="iPhone 13").count(), 1)
+
+    def test_create_exchange_replay(self):
+        data = {"ad_sender_id": self.ad_obj.id, "ad_receiver_id": self.other_ad.id}
+        for _ in range(3):
+            response = self.post('create-exchange', data)
+            self.assertEqual(response.data['is_created'], True)
+
+        self.assertEqual(ExchangeProposal.objects.count(), 1)
+        self.other_ad.refresh_from_db()
+        self.assertEqual(self.other_ad.received_count, 1)
+
+    # Повтор возвращает первый ответ, даже если с тех пор статус изменили другим запросом
+    def test_edit_exchange_replay(self):
+        exchange_obj = ExchangeProposal.objects.create(ad_sender=self.other_ad, ad_receiver=self.ad_obj)
+        data = {"exchange_id": exchange_obj.id, "status": "accepted"}
+
+        response = self.post('edit-exchange', data)
+        self.client.post(reverse('edit-exchange'), {"exchange_id": exchange_obj.id, "status": "declined"},
+                         format='json')
+        replay = self.post('edit-exchange', data)
+
+        self.assertEqual(replay.data, response.data)
+        exchange_obj.refresh_from_db()
+        self.assertEqual(exchange_obj.status, 'declined')
+
+    def test_failed_response_replay(self):
+        data = dict(self.ad_data, category="Неизвестно")
+        response = self.post('create-ad', data)
+        self.assertEqual(response.data['is_created'], False)
+
+        Category.objects.create(name="Неизвестно")
+        self.assertEqual(self.post('create-ad', data).data, response.data)
+
+    # Отказ из-за дубликата сохраняется, транзакция ключа остается рабочей
+    def test_duplicate_exchange(self):
+        data = {"ad_sender_id": self.ad_obj.id, "ad_receiver_id": self.other_ad.id}
+        self.post('create-exchange', data)
+
+        response = self.post('create-exchange', data, key='key-2')
+        self.assertEqual(response.data['is_created'], False)
+        self.assertEqual(IdempotencyKey.objects.get(key='key-2').response, response.data)
+
+    def test_key_reused(self):
+        self.post('create-ad', self.ad_data)
+
+        for name, data in (('create-ad', dict(self.ad_data, title="iPhone 14")),
+                           ('create-exchange', {"ad_sender_id": self.ad_obj.id, "ad_receiver_id": self.other_ad.id})):
+            response = self.post(name, data)
+            self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(ExchangeProposal.objects.count(), 0)
+
+    def test_keys_per_user(self):
+        self.post('create-ad', self.ad_data)
+        self.client.force_authenticate(user=self.user_second)
+
+        response = self.post('create-ad', self.ad_data)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Ad.objects.filter(title="iPhone 13").count(), 2)
+
+    def test_expired_key(self):
+        self.post('create-ad', self.ad_data)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        response = self.post('create-ad', self.ad_data)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Ad.objects.filter(title="iPhone 13").count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_without_key(self):
+        for _ in range(2):
+            self.client.post(reverse('create-ad'), self.ad_data, format='json')
+
+        self.assertEqual(Ad.objects.filter(title="iPhone 13").count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 0)
+
+    def test_invalid_key(self):
+        for key in ('', 'k' * 256):
+            response = self.post('create-ad', self.ad_data, key=key)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Ad.objects.filter(title="iPhone 13").count(), 0)
+
+    def test_purge(self):
+        self.post('create-ad', self.ad_data, key='old-1')
+        self.post('create-ad', dict(self.ad_data, title="iPhone 14"), key='old-2')
+        self.post('create-ad', dict(self.ad_data, title="iPhone 15"), key='new')
+        IdempotencyKey.objects.exclude(key='new').update(created_at=timezone.now() - timedelta(days=2))
+
+        out = StringIO()
+        call_command('purge_idempotency_keys', chunk_size=1, stdout=out)
+
+        self.assertIn('Deleted 2 expired idempotency keys', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+# Повтор при блокировке возможен только вне транзакции теста
+@mock.patch('ads.services.database.time.sleep')
+class IdempotencyLockTest(APITransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        Category.objects.create(name="Техника")
+        Condition.objects.create(name="Б/у")
+        self.ad_data = {"title": "iPhone 13", "description": "Хорошее состояние", "category": "Техника",
+                        "condition": "Б/у"}
+
+    def post(self):
+        return self.client.post(reverse('create-ad'), self.ad_data, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+    # Блокировка внутри сервиса повторяет попытку целиком, а не сохраняет ошибку под ключом
+    def test_lock_error_retried(self, sleep):
+        save = Ad.save
+        calls = []
+
+        def locked_once(ad_obj, *args, **kwargs):
+            calls.append(ad_obj)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return save(ad_obj, *args, **kwargs)
+
+        with mock.patch.object(Ad, 'save', locked_once):
+            response = self.post()
+        self.assertEqual(response.data['is_created'], True)
+        self.assertEqual(len(calls), 2)
+
+        replay = self.post()
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.data, response.data)
+        self.assertEqual(Ad.objects.count(), 1)
+
+    # Если блокировка не проходит, ошибка возвращается, но ключ не сохраняется
+    def test_lock_error_not_stored(self, sleep):
+        with mock.patch.object(Ad, 'save', side_effect=OperationalError('database is locked')):
+            response = self.post()
+        self.assertEqual(response.data['is_created'], False)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        response = self.post()
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(response.data['is_created'], True)
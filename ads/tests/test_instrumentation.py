@@ -0,0 +1,80 @@
+import json
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from ..models import Category, Condition, Ad
+
+User = get_user_model()
+
+
+def parse_server_timing(header):
+    metrics = {}
+    for metric in header.split(', '):
+        name, *params = metric.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+@override_settings(REQUEST_TIMING=True, ADS_LISTING_CACHE=None)
+class RequestTimingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        category = Category.objects.create(name="Техника")
+        condition = Condition.objects.create(name="Б/у")
+        for i in range(3):
+            Ad.objects.create(user=self.user, title=f"Телефон {i}", description="Хороший телефон",
+                              category=category, condition=condition)
+
+    def test_server_timing(self):
+        with self.assertLogs('ads.instrumentation'), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('ads'), {}, format='json')
+
+        metrics = parse_server_timing(response['Server-Timing'])
+        self.assertEqual(list(metrics), ['db', 'serialize', 'render', 'total'])
+        self.assertEqual(metrics['db']['desc'], f'"{len(queries)} queries"')
+        self.assertGreater(float(metrics['serialize']['dur']), 0)
+        self.assertGreater(float(metrics['render']['dur']), 0)
+        self.assertGreaterEqual(float(metrics['total']['dur']), float(metrics['db']['dur']))
+
+    def test_log_line(self):
+        with self.assertLogs('ads.instrumentation', level='INFO') as logs:
+            response = self.client.get(reverse('user-info'))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].timing, record)
+        self.assertEqual(record['method'], 'GET')
+        self.assertEqual(record['path'], reverse('user-info'))
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(set(record), {'method', 'path', 'status', 'total_ms', 'sql_count', 'db_ms',
+                                       'serialize_ms', 'render_ms'})
+        self.assertIn(f'total;dur={record["total_ms"]:.2f}', response['Server-Timing'])
+
+    # Запросы асинхронных эндпоинтов тоже учитываются
+    async def test_async_view(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        with self.assertLogs('ads.instrumentation'):
+            response = await self.async_client.post(reverse('async-ads'), {}, content_type='application/json',
+                                                    headers=headers)
+
+        metrics = parse_server_timing(response['Server-Timing'])
+        self.assertGreater(int(re.search(r'\d+', metrics['db']['desc']).group()), 0)
+        self.assertGreater(float(metrics['serialize']['dur']), 0)
+
+
+class RequestTimingDisabledTest(APITestCase):
+    def test_no_header(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='testuser', password='testpass123'))
+
+        with self.assertNoLogs('ads.instrumentation'):
+            response = client.get(reverse('user-info'))
+        self.assertNotIn('Server-Timing', response)
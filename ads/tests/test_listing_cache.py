@@ -0,0 +1,139 @@
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from ..models import Category, Condition, Ad
+from ..services.listing_cache import ads_listing
+
+User = get_user_model()
+
+
+class ListingCacheTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.category_obj = Category.objects.create(name="Техника")
+        self.category_second = Category.objects.create(name="Часы")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        self.test_ad_obj = Ad.objects.create(user=self.user, title="Телефон", description="Хороший телефон",
+                                             category=self.category_obj, condition=self.condition_obj)
+        Ad.objects.create(user=self.user, title="Часы Casio", description="Хорошие часы",
+                          category=self.category_second, condition=self.condition_obj)
+
+        caches['ads_listing'].clear()
+        ads_listing.hits = ads_listing.misses = 0
+
+    def ads(self, data=None, url=None):
+        response = self.client.post(url or reverse('ads'), data or {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def assertCached(self, data=None, url=None):
+        with self.assertNumQueries(0):
+            response = self.ads(data, url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        return response
+
+    def assertNotCached(self, data=None, url=None):
+        response = self.ads(data, url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        return response
+
+    def test_hit(self):
+        first = self.assertNotCached()
+        second = self.assertCached()
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(ads_listing.stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    # Порядок и повторы категорий, регистр и пробелы в запросе не влияют на ключ
+    def test_normalized_filters(self):
+        self.assertNotCached({"query": "Телефон", "category": ["Техника", "Часы"]})
+        self.assertCached({"query": "  телефон ", "category": ["Часы", "Техника", "Часы"]})
+
+    def test_pages_cached_separately(self):
+        for i in range(12):
+            Ad.objects.create(user=self.user, title=f"Плеер {i}", description="Хороший плеер",
+                              category=self.category_obj, condition=self.condition_obj)
+        first_page = self.assertNotCached()
+        next_url = first_page.data['next']
+        second_page = self.assertNotCached(url=next_url)
+        self.assertNotEqual(first_page.data['results'], second_page.data['results'])
+        self.assertEqual(self.assertCached(url=next_url).json(), second_page.json())
+
+    def test_invalid_filters_not_cached(self):
+        response = self.client.post(reverse('ads'), {"category": ["fakecategory"]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('X-Cache', response)
+
+    def test_malformed_filters(self):
+        for data in ({"category": [["Техника"]]}, {"category": [1]}, {"condition": [{"name": "Б/у"}]}):
+            for url in (reverse('ads'), reverse('async-ads')):
+                with self.subTest(data=data, url=url):
+                    response = self.client.post(url, data, format='json')
+                    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                    self.assertNotIn('X-Cache', response)
+
+    # Новое объявление сбрасывает только свою категорию и страницы без фильтра по категории
+    def test_create_invalidates_category(self):
+        self.ads()
+        self.ads({"category": ["Техника"]})
+        self.ads({"category": ["Часы"]})
+        self.ads({"condition": ["Б/у"]})
+
+        self.client.post(reverse('create-ad'), {"title": "Ноутбук", "description": "Хороший ноутбук",
+                                                "category": "Техника", "condition": "Б/у"}, format='json')
+
+        self.assertEqual(len(self.assertNotCached().data['results']), 3)
+        self.assertEqual(len(self.assertNotCached({"category": ["Техника"]}).data['results']), 2)
+        self.assertEqual(len(self.assertNotCached({"condition": ["Б/у"]}).data['results']), 3)
+        self.assertCached({"category": ["Часы"]})
+
+    def test_bulk_create_invalidates_category(self):
+        self.ads({"category": ["Техника"]})
+        self.ads({"category": ["Часы"]})
+
+        self.client.post(reverse('create-ads'), {"ads": [{"title": "Ноутбук", "description": "Хороший ноутбук",
+                                                          "category": "Часы", "condition": "Б/у"}]}, format='json')
+
+        self.assertCached({"category": ["Техника"]})
+        self.assertEqual(len(self.assertNotCached({"category": ["Часы"]}).data['results']), 2)
+
+    def test_edit_invalidates_all(self):
+        self.ads({"category": ["Часы"]})
+
+        self.client.post(reverse('edit-ad'), {"ad_id": self.test_ad_obj.id, "title": "Часы Casio Vintage",
+                                              "description": "Крутые часы", "category": "Часы",
+                                              "condition": "Б/у"}, format='json')
+
+        self.assertEqual(len(self.assertNotCached({"category": ["Часы"]}).data['results']), 2)
+
+    def test_delete_invalidates_all(self):
+        self.ads({"category": ["Техника"]})
+
+        self.client.post(reverse('delete-ad'), {"ad_id": self.test_ad_obj.id}, format='json')
+
+        self.assertEqual(self.assertNotCached({"category": ["Техника"]}).data['results'], [])
+
+    # Названия справочников входят в ответ
+    def test_reference_change_invalidates_all(self):
+        self.ads()
+        self.condition_obj.name = "Новое"
+        self.condition_obj.save()
+
+        response = self.assertNotCached()
+        self.assertEqual(response.data['results'][0]['condition']['name'], "Новое")
+
+    def test_failed_write_keeps_cache(self):
+        self.ads()
+        self.client.post(reverse('delete-ad'), {"ad_id": 5252}, format='json')
+        self.assertCached()
+
+    def test_disabled(self):
+        with self.settings(ADS_LISTING_CACHE=None):
+            self.assertNotIn('X-Cache', self.ads())
+            self.assertNotIn('X-Cache', self.ads())
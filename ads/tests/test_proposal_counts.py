@@ -0,0 +1,156 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from ..models import Category, Condition, Ad, ExchangeProposal
+
+User = get_user_model()
+
+
+class ProposalCountsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.user_second = User.objects.create_user(username='seconduser', password='secondpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        self.own_ads = [Ad.objects.create(user=self.user, title=f"Телефон {i}", description="Хороший телефон",
+                                          category=self.category_obj, condition=self.condition_obj)
+                        for i in range(3)]
+        self.other_ad = Ad.objects.create(user=self.user_second, title="Часы", description="Часы Casio",
+                                          category=self.category_obj, condition=self.condition_obj)
+
+    def counts(self, ad):
+        ad.refresh_from_db()
+        return ad.received_count, ad.pending_count
+
+    def propose(self, ad_sender, ad_receiver):
+        response = self.client.post(reverse('create-exchange'), {"ad_sender_id": ad_sender.id,
+                                                                 "ad_receiver_id": ad_receiver.id}, format='json')
+        self.assertEqual(response.data['is_created'], True)
+        return ExchangeProposal.objects.latest('id')
+
+    def test_create(self):
+        self.propose(self.own_ads[0], self.other_ad)
+        self.propose(self.own_ads[1], self.other_ad)
+
+        self.assertEqual(self.counts(self.other_ad), (2, 2))
+        self.assertEqual(self.counts(self.own_ads[0]), (0, 0))
+
+    def test_edit(self):
+        exchange_obj = self.propose(self.own_ads[0], self.other_ad)
+
+        for exchange_status, expected in (('accepted', (1, 0)), ('declined', (1, 0)), ('pending', (1, 1))):
+            response = self.client.post(reverse('edit-exchange'), {"exchange_id": exchange_obj.id,
+                                                                   "status": exchange_status}, format='json')
+            self.assertEqual(response.data['is_edited'], True)
+            self.assertEqual(self.counts(self.other_ad), expected)
+
+    def test_edit_many(self):
+        exchanges = [self.propose(ad, self.other_ad) for ad in self.own_ads]
+        ExchangeProposal.objects.filter(id=exchanges[0].id).update(status='declined')
+
+        response = self.client.post(reverse('edit-exchanges'), {"exchange_ids": [obj.id for obj in exchanges],
+                                                                "status": "accepted"}, format='json')
+        self.assertEqual(len(response.data['edited_ids']), 3)
+        # Отклоненное предложение уже не учитывалось как ожидающее
+        self.assertEqual(self.counts(self.other_ad), (3, 1))
+
+    # Статус изменили параллельно между чтением и записью: изменение счетчика считается от нового статуса
+    def test_edit_concurrent_change(self):
+        exchange_obj = self.propose(self.own_ads[0], self.other_ad)
+        ExchangeProposal.objects.filter(id=exchange_obj.id).update(status='declined')
+        Ad.objects.filter(id=self.other_ad.id).update(pending_count=0)
+
+        def concurrent_edit(execute, sql, params, many, context):
+            if sql.startswith('UPDATE "ads_exchangeproposal"') and not changed:
+                changed.append(True)
+                ExchangeProposal.objects.filter(id=exchange_obj.id).update(status='pending')
+                Ad.objects.filter(id=self.other_ad.id).update(pending_count=F('pending_count') + 1)
+            return execute(sql, params, many, context)
+
+        changed = []
+        with connection.execute_wrapper(concurrent_edit):
+            response = self.client.post(reverse('edit-exchange'), {"exchange_id": exchange_obj.id,
+                                                                   "status": "pending"}, format='json')
+        self.assertEqual(response.data['is_edited'], True)
+        self.assertEqual(self.counts(self.other_ad), (1, 1))
+
+    def test_delete_sender(self):
+        self.propose(self.own_ads[0], self.other_ad)
+        self.propose(self.own_ads[1], self.other_ad)
+
+        response = self.client.post(reverse('delete-ad'), {"ad_id": self.own_ads[0].id}, format='json')
+        self.assertEqual(response.data['is_deleted'], True)
+        self.assertEqual(self.counts(self.other_ad), (1, 1))
+
+    # Предложения, созданные в обход сервисов, не уводят счетчики ниже нуля
+    def test_untracked_proposal(self):
+        exchange_obj = ExchangeProposal.objects.create(ad_sender=self.own_ads[0], ad_receiver=self.other_ad)
+
+        self.client.post(reverse('edit-exchange'), {"exchange_id": exchange_obj.id, "status": "accepted"},
+                         format='json')
+        self.assertEqual(self.counts(self.other_ad), (0, 0))
+
+    def test_reconcile(self):
+        ExchangeProposal.objects.create(ad_sender=self.own_ads[0], ad_receiver=self.other_ad)
+        ExchangeProposal.objects.create(ad_sender=self.own_ads[1], ad_receiver=self.other_ad, status='accepted')
+        Ad.objects.filter(id=self.own_ads[2].id).update(received_count=5, pending_count=5)
+
+        out = StringIO()
+        call_command('reconcile_proposal_counts', chunk_size=2, stdout=out)
+
+        self.assertIn('Fixed the proposal counts of 2 ads', out.getvalue())
+        self.assertEqual(self.counts(self.other_ad), (2, 1))
+        self.assertEqual(self.counts(self.own_ads[2]), (0, 0))
+
+    def test_most_wanted(self):
+        self.propose(self.own_ads[0], self.own_ads[2])
+        self.propose(self.own_ads[1], self.own_ads[2])
+        self.propose(self.own_ads[0], self.other_ad)
+
+        response = self.client.post(reverse('ads'), {"sort": "most_wanted"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([ad['id'] for ad in response.data['results']],
+                         [self.own_ads[2].id, self.other_ad.id, self.own_ads[1].id, self.own_ads[0].id])
+
+        async_response = self.client.post(reverse('async-ads'), {"sort": "most_wanted"}, format='json')
+        self.assertEqual(async_response.json()['results'], response.json()['results'])
+
+    # Больше 1000 объявлений без предложений: курсор не упирается в предел смещения DRF
+    def test_most_wanted_ties(self):
+        Ad.objects.bulk_create([Ad(user=self.user, title=f"Телефон {i}", description="Хороший телефон",
+                                   category=self.category_obj, condition=self.condition_obj) for i in range(1100)])
+        expected = set(Ad.objects.values_list('id', flat=True))
+
+        for url_name in ('ads', 'async-ads'):
+            with self.subTest(url_name=url_name):
+                ids, url = [], reverse(url_name)
+                while url and len(ids) <= len(expected):
+                    response = self.client.post(url, {"sort": "most_wanted"}, format='json')
+                    ids += [ad['id'] for ad in response.data['results']]
+                    url = response.data['next']
+                self.assertEqual(len(ids), len(expected))
+                self.assertEqual(set(ids), expected)
+
+    # Кэш страниц по популярности сбрасывается при новом предложении
+    def test_most_wanted_cache(self):
+        self.client.post(reverse('ads'), {"sort": "most_wanted"}, format='json')
+        self.propose(self.own_ads[0], self.other_ad)
+
+        response = self.client.post(reverse('ads'), {"sort": "most_wanted"}, format='json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['id'], self.other_ad.id)
+
+    def test_invalid_sort(self):
+        response = self.client.post(reverse('ads'), {"sort": "price"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,186 @@
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from ..models import Category, Condition, Ad, ExchangeProposal
+from ..services.reference_cache import categories, conditions
+
+User = get_user_model()
+
+
+class QueryBudgetTestCase(APITestCase):
+    # Количество строк, при которых проверяется бюджет запросов
+    sizes = (1, 25)
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+
+        # Бюджеты считаются для прогретого кэша справочников
+        categories.all()
+        conditions.all()
+
+    def create_ads(self, count):
+        return [Ad.objects.create(user=self.user, title=f"Телефон {i}", description="Хороший телефон",
+                                  category=self.category_obj, condition=self.condition_obj)
+                for i in range(count)]
+
+    def create_exchanges(self, count):
+        ads = self.create_ads(count * 2)
+        return [ExchangeProposal.objects.create(ad_sender=ads[i * 2], ad_receiver=ads[i * 2 + 1])
+                for i in range(count)]
+
+    def assertQueryBudget(self, budget, url_name, data=None):
+        with self.assertNumQueries(budget):
+            response = self.client.post(reverse(url_name), data or {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+
+class AdsViewQueryBudgetTest(QueryBudgetTestCase):
+    def assertBudgetForSizes(self, budget, data=None):
+        created = 0
+        for size in self.sizes:
+            self.create_ads(size - created)
+            created = size
+            with self.subTest(ads=size):
+                self.assertQueryBudget(budget, 'ads', data)
+
+    def test_no_filters(self):
+        self.assertBudgetForSizes(1)
+
+    def test_query(self):
+        self.assertBudgetForSizes(1, {"query": "тел"})
+
+    def test_by_category(self):
+        self.assertBudgetForSizes(1, {"category": ["Техника"]})
+
+    def test_by_condition(self):
+        self.assertBudgetForSizes(1, {"condition": ["Б/у"]})
+
+
+class ExchangesViewQueryBudgetTest(QueryBudgetTestCase):
+    def assertBudgetForSizes(self, budget, data=None):
+        created = 0
+        for size in self.sizes:
+            self.create_exchanges(size - created)
+            created = size
+            with self.subTest(exchanges=size):
+                response = self.assertQueryBudget(budget, 'exchanges', data)
+                self.assertEqual(len(response.data['results']), min(size, 20))
+
+    def test_no_filters(self):
+        self.assertBudgetForSizes(1)
+
+    # Существование собственного имени пользователя не проверяется запросом
+    def test_by_sender(self):
+        self.assertBudgetForSizes(1, {"sender_username": "testuser"})
+
+    def test_by_receiver(self):
+        self.assertBudgetForSizes(1, {"receiver_username": "testuser"})
+
+    def test_by_other_user(self):
+        User.objects.create_user(username='seconduser', password='secondpass123')
+        self.create_exchanges(1)
+
+        self.assertQueryBudget(2, 'exchanges', {"sender_username": "seconduser"})
+        self.assertQueryBudget(2, 'exchanges', {"receiver_username": "seconduser"})
+
+    def test_by_status(self):
+        self.assertBudgetForSizes(1, {"status": ["pending"]})
+
+    def test_compact(self):
+        self.assertBudgetForSizes(1, {"compact": True})
+
+
+class MyAdsViewQueryBudgetTest(QueryBudgetTestCase):
+    # Счетчики предложений считаются в том же запросе, что и страница
+    def test_page_sizes(self):
+        ads = self.create_ads(60)
+        for i in range(30):
+            ExchangeProposal.objects.create(ad_sender=ads[i], ad_receiver=ads[i + 30])
+
+        for page_size in (1, 20, 100):
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(1):
+                    response = self.client.post(f"{reverse('my-ads')}?page_size={page_size}", {}, format='json')
+                self.assertEqual(len(response.data['results']), min(page_size, 60))
+
+
+class WriteQueryBudgetTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.test_ad_obj1, self.test_ad_obj2 = self.create_ads(2)
+
+    def test_create_ad(self):
+        data = {
+            "title": "Телефон",
+            "description": "Хороший телефон",
+            "category": "Техника",
+            "condition": "Б/у"
+        }
+
+        response = self.assertQueryBudget(1, 'create-ad', data)
+        self.assertEqual(response.data['is_created'], True)
+
+    def test_create_ads(self):
+        data = {"ads": [{
+            "title": f"Телефон {i}",
+            "description": "Хороший телефон",
+            "category": "Техника",
+            "condition": "Б/у"
+        } for i in range(50)]}
+
+        response = self.assertQueryBudget(1, 'create-ads', data)
+        self.assertEqual(response.data['is_created'], True)
+
+    def test_edit_ad(self):
+        data = {
+            "ad_id": self.test_ad_obj1.id,
+            "title": "Часы Casio Vintage",
+            "description": "Крутые часы",
+            "category": "Техника",
+            "condition": "Б/у"
+        }
+
+        response = self.assertQueryBudget(1, 'edit-ad', data)
+        self.assertEqual(response.data['is_edited'], True)
+
+    # Счетчики получателей, выборка объявления сборщиком удаления, удаление предложений и объявления
+    def test_delete_ad(self):
+        ExchangeProposal.objects.create(ad_sender=self.test_ad_obj1, ad_receiver=self.test_ad_obj2)
+
+        response = self.assertQueryBudget(4, 'delete-ad', {"ad_id": self.test_ad_obj1.id})
+        self.assertEqual(response.data['is_deleted'], True)
+
+    # Счетчики предложений объявления обновляются одним UPDATE в той же транзакции.
+    # Еще два запроса - точка сохранения, которая создается только внутри внешней транзакции теста
+    def test_create_exchange(self):
+        data = {
+            "ad_sender_id": self.test_ad_obj1.id,
+            "ad_receiver_id": self.test_ad_obj2.id
+        }
+
+        response = self.assertQueryBudget(5, 'create-exchange', data)
+        self.assertEqual(response.data['is_created'], True)
+
+    def test_edit_exchange(self):
+        exchange_obj = ExchangeProposal.objects.create(ad_sender=self.test_ad_obj1, ad_receiver=self.test_ad_obj2)
+
+        response = self.assertQueryBudget(5, 'edit-exchange', {"exchange_id": exchange_obj.id, "status": "accepted"})
+        self.assertEqual(response.data['is_edited'], True)
+
+    def test_edit_exchanges(self):
+        ads = self.create_ads(20)
+        exchanges = [ExchangeProposal.objects.create(ad_sender=ads[i], ad_receiver=ads[i + 1]) for i in range(19)]
+
+        response = self.assertQueryBudget(5, 'edit-exchanges', {"exchange_ids": [obj.id for obj in exchanges],
+                                                                "status": "declined"})
+        self.assertEqual(len(response.data['edited_ids']), 19)
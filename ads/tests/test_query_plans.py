@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from unittest import skipUnless
+from ..models import Category, Condition, Ad, ExchangeProposal
+from ..services.ads_service import AdsService
+from ..services.exchanges_service import ExchangeService
+from ..views import AdsCursorPagination, ExchangesCursorPagination, MostWantedCursorPagination, \
+    MyAdsCursorPagination
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class QueryPlanTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.category_obj = Category.objects.create(name="Техника")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+        self.test_ad_obj1 = Ad.objects.create(user=self.user, title="Телефон", description="Хороший телефон",
+                                              category=self.category_obj, condition=self.condition_obj)
+        self.test_ad_obj2 = Ad.objects.create(user=self.user, title="MP3 плеер", description="Хороший плеер",
+                                              category=self.category_obj, condition=self.condition_obj)
+        ExchangeProposal.objects.create(ad_sender=self.test_ad_obj1, ad_receiver=self.test_ad_obj2)
+
+    # План запроса первой страницы так, как его строит эндпоинт
+    def page_plan(self, queryset, pagination_class):
+        self.assertNotIsInstance(queryset, int)
+        ordering = pagination_class().get_ordering(None, queryset, None)
+        return queryset.order_by(*ordering)[:pagination_class.page_size + 1].explain()
+
+    def assertUsesIndex(self, plan, index_name):
+        self.assertIn(index_name, plan)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+
+class AdsQueryPlanTest(QueryPlanTestCase):
+    def plan(self, data):
+        return self.page_plan(AdsService().all_ads(data), AdsCursorPagination)
+
+    def test_no_filters(self):
+        self.assertUsesIndex(self.plan({}), 'ad_created_idx')
+
+    def test_by_category(self):
+        self.assertUsesIndex(self.plan({"category": ["Техника"]}), 'ad_category_created_idx')
+
+    def test_by_condition(self):
+        self.assertUsesIndex(self.plan({"condition": ["Б/у"]}), 'ad_condition_created_idx')
+
+    def test_by_category_next_page(self):
+        pagination = AdsCursorPagination()
+        queryset = AdsService().all_ads({"category": ["Техника"]})
+        pagination.ordering = pagination.get_ordering(None, queryset, None)
+        position = pagination._get_position_from_instance(self.test_ad_obj2, pagination.ordering)
+        page = pagination.filter_position(queryset.order_by(*pagination.ordering), position, False)
+        self.assertUsesIndex(page[:pagination.page_size + 1].explain(), 'ad_category_created_idx')
+
+    def test_most_wanted(self):
+        plan = self.page_plan(AdsService().all_ads({"sort": "most_wanted"}), MostWantedCursorPagination)
+        self.assertUsesIndex(plan, 'ad_received_created_idx')
+
+    # Следующая страница — диапазон по тому же индексу от позиции курсора
+    def test_most_wanted_next_page(self):
+        pagination = MostWantedCursorPagination()
+        queryset = AdsService().all_ads({"sort": "most_wanted"})
+        pagination.ordering = pagination.get_ordering(None, queryset, None)
+        position = pagination._get_position_from_instance(self.test_ad_obj2, pagination.ordering)
+        page = pagination.filter_position(queryset.order_by(*pagination.ordering), position, False)
+        self.assertUsesIndex(page[:pagination.page_size + 1].explain(), 'ad_received_created_idx')
+
+
+class ExchangesQueryPlanTest(QueryPlanTestCase):
+    def plan(self, data):
+        return self.page_plan(ExchangeService().all_exchanges(data), ExchangesCursorPagination)
+
+    def test_no_filters(self):
+        self.assertUsesIndex(self.plan({}), 'exchange_created_idx')
+
+    def test_by_status(self):
+        self.assertIn('exchange_status_created_idx', self.plan({"status": ["pending"]}))
+
+    def test_by_sender(self):
+        plan = self.plan({"sender_username": "testuser"})
+        self.assertIn('ad_user_created_idx', plan)
+        self.assertIn('exchange_sender_status_idx', plan)
+
+    def test_by_receiver(self):
+        plan = self.plan({"receiver_username": "testuser"})
+        self.assertIn('ad_user_created_idx', plan)
+        self.assertIn('exchange_receiver_status_idx', plan)
+
+
+class MyAdsQueryPlanTest(QueryPlanTestCase):
+    def test_own_ads(self):
+        plan = self.page_plan(AdsService().my_ads(self.user), MyAdsCursorPagination)
+        self.assertUsesIndex(plan, 'ad_user_created_idx')
+        self.assertIn('exchange_receiver_status_idx', plan)
+        self.assertIn('exchange_sender_status_idx', plan)
+
+
+class PendingPairQueryPlanTest(QueryPlanTestCase):
+    # Частичный уникальный индекс служит и для поиска ожидающих предложений по паре объявлений
+    def test_pending_pair(self):
+        plan = ExchangeProposal.objects.filter(status='pending', ad_sender=self.test_ad_obj1,
+                                               ad_receiver=self.test_ad_obj2).explain()
+        self.assertIn('exchange_pending_pair_uniq', plan)
+
+    def test_cycle_edges(self):
+        ad_ids = [self.test_ad_obj1.id, self.test_ad_obj2.id]
+        plan = ExchangeProposal.objects.filter(status='pending', ad_sender_id__in=ad_ids,
+                                               ad_receiver_id__in=ad_ids).explain()
+        self.assertIn('exchange_pending_pair_uniq', plan)
@@ -0,0 +1,54 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from ..models import Category, Condition
+from ..services.reference_cache import categories, conditions
+
+
+class ReferenceCacheTest(TestCase):
+    def setUp(self):
+        self.category_obj = Category.objects.create(name="Техника")
+        Category.objects.create(name="Часы")
+        self.condition_obj = Condition.objects.create(name="Б/у")
+
+    def test_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(categories.get("Техника"), self.category_obj)
+            self.assertEqual([obj.name for obj in categories.all()], ["Техника", "Часы"])
+            self.assertIsNone(categories.get("fakecategory"))
+
+    def test_get_many(self):
+        self.assertEqual(categories.get_many(["Часы", "Техника"])[1], self.category_obj)
+        self.assertIsNone(categories.get_many(["Часы", "fakecategory"]))
+
+    def test_invalidated_on_save(self):
+        categories.all()
+        Category.objects.create(name="Одежда")
+        self.assertIsNotNone(categories.get("Одежда"))
+
+        self.category_obj.name = "Электроника"
+        self.category_obj.save()
+        self.assertIsNone(categories.get("Техника"))
+        self.assertEqual(categories.get("Электроника"), self.category_obj)
+
+    def test_invalidated_on_delete(self):
+        conditions.all()
+        self.condition_obj.delete()
+        self.assertIsNone(conditions.get("Б/у"))
+
+    # Изменение в другом процессе видно по версии в общем кэше
+    def test_shared_version(self):
+        categories.all()
+        Category.objects.bulk_create([Category(name="Одежда")])
+        self.assertIsNone(categories.get("Одежда"))
+
+        cache.incr(categories.version_key)
+        with self.settings(REFERENCE_CACHE_CHECK_INTERVAL=0):
+            self.assertIsNotNone(categories.get("Одежда"))
+
+    def test_version_checked_once_per_interval(self):
+        categories.all()
+        with mock.patch.object(cache, 'get_or_set') as get_or_set:
+            categories.get("Техника")
+            get_or_set.assert_not_called()
@@ -4,18 +4,34 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from .views import *
+from .async_views import AsyncAdsView, AsyncExchangesView, AsyncUserInfoView, AsyncCategoriesView, \
+    AsyncConditionsView
 
 urlpatterns = [
     path('login/', TokenObtainPairView.as_view(), name='login'),
     path('refresh/', TokenRefreshView.as_view(), name='refresh'),
     path('user-info/', UserInfoView.as_view(), name='user-info'),
+    path('revoke-tokens/', RevokeTokensView.as_view(), name='revoke-tokens'),
     path('categories/', CategoriesView.as_view(), name='categories'),
     path('conditions/', ConditionsView.as_view(), name='conditions'),
     path('create-ad/', CreateAdView.as_view(), name='create-ad'),
+    path('create-ads/', CreateAdsView.as_view(), name='create-ads'),
     path('delete-ad/', DeleteAdView.as_view(), name='delete-ad'),
     path('edit-ad/', EditAdView.as_view(), name='edit-ad'),
     path('ads/', AdsView.as_view(), name='ads'),
+    path('my-ads/', MyAdsView.as_view(), name='my-ads'),
     path('create-exchange/', CreateExchangeView.as_view(), name='create-exchange'),
     path('edit-exchange/', EditExchangeView.as_view(), name='edit-exchange'),
-    path('exchanges/', ExchangesView.as_view(), name='exchanges')
+    path('edit-exchanges/', EditExchangesView.as_view(), name='edit-exchanges'),
+    path('exchanges/', ExchangesView.as_view(), name='exchanges'),
+    path('suggested-cycles/', SuggestedCyclesView.as_view(), name='suggested-cycles'),
+    path('export-ads/', ExportAdsView.as_view(), name='export-ads'),
+    path('export-exchanges/', ExportExchangesView.as_view(), name='export-exchanges'),
+
+    # Async read endpoints for ASGI deployments
+    path('async/user-info/', AsyncUserInfoView.as_view(), name='async-user-info'),
+    path('async/categories/', AsyncCategoriesView.as_view(), name='async-categories'),
+    path('async/conditions/', AsyncConditionsView.as_view(), name='async-conditions'),
+    path('async/ads/', AsyncAdsView.as_view(), name='async-ads'),
+    path('async/exchanges/', AsyncExchangesView.as_view(), name='async-exchanges'),
 ]
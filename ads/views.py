@@ -1,14 +1,53 @@
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiParameter
 from rest_framework.decorators import permission_classes
-from rest_framework.pagination import CursorPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
 from .services.ads_service import *
+from .services.auth_cache import token_versions
 from .serializers import AdSerializer, ExchangeSerializer, CategorySerializer, ConditionSerializer
 from .services.exchanges_service import *
+from .services.export_service import ExportService
 from .services.helper_service import *
+from .services.idempotency_service import IdempotencyService, IDEMPOTENCY_ERRORS, IDEMPOTENCY_HEADER
+from .services.listing_cache import ads_listing
+from .services.reference_cache import categories, conditions
+from .services.search_service import SEARCH_RANK
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    IDEMPOTENCY_HEADER, str, OpenApiParameter.HEADER,
+    description="Уникальный ключ запроса. Повтор с тем же ключом и телом не выполняет действие снова, "
+                "а возвращает сохраненный ответ с заголовком Idempotent-Replayed"
+)
+
+
+def idempotent_response(request, endpoint, handler):
+    # Runs handler once per Idempotency-Key of the user, retries get the stored response
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return Response(handler())
+
+    result = IdempotencyService().run(request.user, key, endpoint, request.data, handler)
+    if isinstance(result, int):
+        return Response({'error': IDEMPOTENCY_ERRORS[result]}, status=result)
+
+    body, replayed = result
+    response = Response(body)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
 
 
 # Create your views here.
@@ -16,6 +55,7 @@ from .services.helper_service import *
     tags=["Объявления"],
     summary="Создание объявления",
     description="Создает новое объявление от имени авторизованного пользователя.",
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
     request={
         "application/json": {
             "type": "object",
@@ -60,10 +100,79 @@ from .services.helper_service import *
 @permission_classes([IsAuthenticated])
 class CreateAdView(APIView):
     def post(self, request):
-        username = request.user.username
         data = request.data
 
-        create_result = AdsService().create_ad(username, data)
+        return idempotent_response(request, 'create-ad', lambda: AdsService().create_ad(request.user, data))
+
+
+@extend_schema(
+    tags=["Объявления"],
+    summary="Массовое создание объявлений",
+    description="Создает до 500 объявлений за один запрос в одной транзакции. "
+                "Ошибка в одном объявлении не прерывает создание остальных, результат возвращается по каждому элементу.",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "ads": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "title": {"type": "string", "example": "iPhone 13"},
+                            "description": {"type": "string", "example": "Хорошее состояние"},
+                            "category": {"type": "string", "example": "Техника"},
+                            "condition": {"type": "string", "example": "Б/у"}
+                        },
+                        "required": ["title", "description", "category", "condition"]
+                    }
+                }
+            },
+            "required": ["ads"]
+        }
+    },
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "is_created": {"type": "boolean"},
+                "message": {"type": "string"},
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer"},
+                            "is_created": {"type": "boolean"},
+                            "id": {"type": "integer"},
+                            "message": {"type": "string"}
+                        }
+                    }
+                }
+            }
+        }
+    },
+    examples=[
+        OpenApiExample(
+            "Частичный успех",
+            value={
+                "is_created": True,
+                "message": "Created 1 of 2 ads",
+                "results": [
+                    {"index": 0, "is_created": True, "id": 124},
+                    {"index": 1, "is_created": False, "message": "Invalid category: Неизвестно"}
+                ]
+            },
+            response_only=True
+        )
+    ]
+)
+@permission_classes([IsAuthenticated])
+class CreateAdsView(APIView):
+    def post(self, request):
+        data = request.data
+
+        create_result = AdsService().create_ads(request.user, data)
         return Response(create_result)
 
 
@@ -106,10 +215,9 @@ class CreateAdView(APIView):
 @permission_classes([IsAuthenticated])
 class DeleteAdView(APIView):
     def post(self, request):
-        username = request.user.username
         data = request.data
 
-        delete_result = AdsService().delete_ad(username, data)
+        delete_result = AdsService().delete_ad(request.user, data)
         return Response(delete_result)
 
 
@@ -156,16 +264,108 @@ class DeleteAdView(APIView):
 @permission_classes([IsAuthenticated])
 class EditAdView(APIView):
     def post(self, request):
-        username = request.user.username
         data = request.data
 
-        edit_result = AdsService().edit_ad(username, data)
+        edit_result = AdsService().edit_ad(request.user, data)
         return Response(edit_result)
 
 
-class AdsCursorPagination(CursorPagination):
+class KeysetCursorPagination(CursorPagination):
+    """
+    CursorPagination positioned on every ordering field.
+
+    DRF keeps the value of the first field only and skips its ties with an offset
+    capped at offset_cutoff, so a run of more than 1000 equal values is never paged
+    through. Here the cursor holds the values of the whole ordering, which has to
+    end in a unique field, and a page starts strictly after that tuple.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    def page_queryset(self, queryset, request, view=None):
+        # One page and the row after it, which tells whether another page follows
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is not None:
+            self.cursor = self.cursor._replace(offset=0)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if self.cursor is not None and self.cursor.position is not None:
+            queryset = self.filter_position(queryset, self.cursor.position, reverse)
+        return queryset[:self.page_size + 1]
+
+    def filter_position(self, queryset, position, reverse):
+        # (a, b, c) > (x, y, z) spelled out as a > x OR (a = x AND (b > y OR ...)); the extra a >= x
+        # gives the database a range on the leading index column
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError(position)
+
+            after = None
+            for order, value in reversed(list(zip(self.ordering, values))):
+                field = order.lstrip('-')
+                lookup = 'lt' if reverse != order.startswith('-') else 'gt'
+                condition = Q(**{f'{field}__{lookup}': value})
+                if after is not None:
+                    condition |= Q(**{field: value}) & after
+                after = condition
+
+            first = self.ordering[0]
+            lookup = 'lte' if reverse != first.startswith('-') else 'gte'
+            return queryset.filter(Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}), after)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def set_page(self, results):
+        # The rest of CursorPagination.paginate_queryset without offsets
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor.position if self.cursor is not None else None
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            current_position, following_position = following_position, current_position
+        self.has_previous = current_position is not None
+        self.previous_position = current_position
+        self.has_next = following_position is not None
+        self.next_position = following_position
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [order.lstrip('-') for order in ordering]
+        if isinstance(instance, dict):
+            values = [instance[field] for field in fields]
+        else:
+            values = [getattr(instance, field) for field in fields]
+        return json.dumps([str(value) for value in values])
+
+
+class AdsCursorPagination(KeysetCursorPagination):
+    page_size = 10
+    ordering = ('created_at', 'id')
+    cursor_query_param = 'cursor'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Search results go by relevance first, equal ranks by the rest of the key
+        if SEARCH_RANK in queryset.query.annotations:
+            return (SEARCH_RANK,) + ordering
+        return ordering
+
+
+class MostWantedCursorPagination(KeysetCursorPagination):
+    # "sort": "most_wanted", walked backwards over ad_received_created_idx
     page_size = 10
-    ordering = 'created_at'
+    ordering = ('-received_count', '-created_at', '-id')
     cursor_query_param = 'cursor'
 
 
@@ -193,6 +393,12 @@ class AdsCursorPagination(CursorPagination):
                     "items": {"type": "string"},
                     "description": "Список состояний товара для фильтрации",
                     "example": ["Новое", "Б/у"]
+                },
+                "sort": {
+                    "type": "string",
+                    "enum": ["created_at", "most_wanted"],
+                    "description": "Порядок: по дате создания (по умолчанию) или по числу полученных предложений",
+                    "example": "most_wanted"
                 }
             },
             "required": {}
@@ -246,26 +452,132 @@ class AdsCursorPagination(CursorPagination):
 @permission_classes([IsAuthenticated])
 class AdsView(APIView):
     pagination_class = AdsCursorPagination
+    sort_pagination_classes = {'most_wanted': MostWantedCursorPagination}
 
     def post(self, request):
-        username = request.user.username
         data = request.data
-        ads_result = AdsService().all_ads(data)
+
+        cache_key = ads_listing.key(request, data)
+        if cache_key is not None:
+            cached = ads_listing.get(cache_key)
+            if cached is not None:
+                return Response(cached, headers={'X-Cache': 'HIT'})
+
+        ads_service = AdsService()
+        ads_result = ads_service.all_ads(data)
 
         if isinstance(ads_result, int):
             return Response({'error': 'Invalid filters'}, status=ads_result)
 
+        ads_values = ads_service.ad_values(ads_result)
+        if cache_key is not None:
+            ads_values = ads_listing.source(ads_values)
+
+        paginator = self.sort_pagination_classes.get(data.get('sort'), self.pagination_class)()
+        rows = paginator.paginate_queryset(ads_values, request, view=self)
+        serialized_data = ads_service.ad_page(rows)
+
+        response = paginator.get_paginated_response(serialized_data)
+        if cache_key is not None:
+            ads_listing.set(cache_key, response.data)
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+class MyAdsCursorPagination(CursorPagination):
+    # Newest first, walked backwards over ad_user_created_idx
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    cursor_query_param = 'cursor'
+
+
+@extend_schema(
+    tags=["Объявления"],
+    summary="Мои объявления",
+    description="Возвращает объявления текущего пользователя (новые первыми) с количеством полученных "
+                "и отправленных предложений обмена по статусам.",
+    request=None,
+    parameters=[
+        OpenApiParameter("page_size", int, description="Размер страницы (по умолчанию 20, не больше 100)"),
+        OpenApiParameter("cursor", str, description="Курсор следующей или предыдущей страницы"),
+    ],
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "number"},
+                            "user": {"type": "string"},
+                            "created_at": {"type": "string"},
+                            "title": {"type": "string"},
+                            "description": {"type": "string"},
+                            "category": {"type": "object", "properties": {"name": {"type": "string"}}},
+                            "condition": {"type": "object", "properties": {"name": {"type": "string"}}},
+                            "proposals": {
+                                "type": "object",
+                                "properties": {
+                                    "received": {"type": "object", "properties": {"pending": {"type": "number"}, "accepted": {"type": "number"}, "declined": {"type": "number"}}},
+                                    "sent": {"type": "object", "properties": {"pending": {"type": "number"}, "accepted": {"type": "number"}, "declined": {"type": "number"}}}
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+        }
+    },
+    examples=[
+        OpenApiExample(
+            "Пример успешного ответа",
+            value={
+                "next": None,
+                "previous": None,
+                "results": [
+                    {
+                        "id": 1,
+                        "user": "admin",
+                        "created_at": "2025-05-01T12:00:00.123456Z",
+                        "title": "iPhone 13",
+                        "description": "Отличное состояние",
+                        "category": {"id": 1, "name": "Техника"},
+                        "condition": {"id": 1, "name": "Б/у"},
+                        "proposals": {
+                            "received": {"pending": 2, "accepted": 0, "declined": 1},
+                            "sent": {"pending": 0, "accepted": 1, "declined": 0}
+                        }
+                    }
+                ]
+            },
+            response_only=True
+        )
+    ]
+)
+@permission_classes([IsAuthenticated])
+class MyAdsView(APIView):
+    pagination_class = MyAdsCursorPagination
+
+    def post(self, request):
+        ads_service = AdsService()
+
         paginator = self.pagination_class()
-        result_page = paginator.paginate_queryset(ads_result, request, view=self)
-        serialized_data = AdSerializer(result_page, many=True).data
+        rows = paginator.paginate_queryset(ads_service.my_ads(request.user), request, view=self)
 
-        return paginator.get_paginated_response(serialized_data)
+        return paginator.get_paginated_response(ads_service.my_ads_page(rows))
 
 
 @extend_schema(
     tags=["Обмены"],
     summary="Создание предложения обмена",
     description="Создает новое предложение обмена между двумя объявлениями.",
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
     request={
         "application/json": {
             "type": "object",
@@ -307,14 +619,14 @@ class CreateExchangeView(APIView):
     def post(self, request):
         data = request.data
 
-        create_result = ExchangeService().create_exchange(data)
-        return Response(create_result)
+        return idempotent_response(request, 'create-exchange', lambda: ExchangeService().create_exchange(request.user, data))
 
 
 @extend_schema(
     tags=["Обмены"],
     summary="Редактирование статуса предложения обмена",
     description="Изменяет статус предложения обмена (например, принимает или отклоняет обмен).",
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
     request={
         "application/json": {
             "type": "object",
@@ -353,10 +665,61 @@ class CreateExchangeView(APIView):
 @permission_classes([IsAuthenticated])
 class EditExchangeView(APIView):
     def post(self, request):
-        username = request.user.username
         data = request.data
 
-        edit_result = ExchangeService().edit_exchange(username, data)
+        return idempotent_response(request, 'edit-exchange', lambda: ExchangeService().edit_exchange(request.user, data))
+
+
+class ExchangesCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('created_at', 'id')
+    cursor_query_param = 'cursor'
+
+
+@extend_schema(
+    tags=["Обмены"],
+    summary="Массовое изменение статуса предложений обмена",
+    description="Изменяет статус до 500 предложений обмена одним запросом. Изменяются только предложения, "
+                "в которых участвует объявление пользователя и статус которых отличается от нового. "
+                "Возвращает ID измененных и неизмененных предложений.",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "exchange_ids": {"type": "array", "items": {"type": "integer"}, "example": [789, 790]},
+                "status": {"type": "string", "enum": ["pending", "accepted", "declined", "Ожидает", "Принято", "Отклонено"], "example": "declined"}
+            },
+            "required": ["exchange_ids", "status"]
+        }
+    },
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "is_edited": {"type": "boolean"},
+                "message": {"type": "string"},
+                "edited_ids": {"type": "array", "items": {"type": "integer"}},
+                "not_edited_ids": {"type": "array", "items": {"type": "integer"}}
+            }
+        }
+    },
+    examples=[
+        OpenApiExample(
+            "Частичный успех",
+            value={"is_edited": True, "message": "Edited 1 of 2 exchanges (declined)",
+                   "edited_ids": [789], "not_edited_ids": [790]},
+            response_only=True
+        )
+    ]
+)
+@permission_classes([IsAuthenticated])
+class EditExchangesView(APIView):
+    def post(self, request):
+        data = request.data
+
+        edit_result = ExchangeService().edit_exchanges(request.user, data)
         return Response(edit_result)
 
 
@@ -374,24 +737,214 @@ class EditExchangeView(APIView):
                     "type": "array",
                     "items": {"type": "string", "enum": ["pending", "accepted", "declined", "Ожидает", "Принято", "Отклонено"]},
                     "example": ["accepted", "declined"]
+                },
+                "compact": {
+                    "type": "boolean",
+                    "description": "Вместо вложенных объявлений вернуть их id и отдельные таблицы ads, categories и conditions",
+                    "example": False
                 }
             }
         }
     },
+    parameters=[
+        OpenApiParameter("page_size", int, description="Размер страницы (по умолчанию 20, не больше 100)")
+    ],
 )
 @permission_classes([IsAuthenticated])
 class ExchangesView(APIView):
+    pagination_class = ExchangesCursorPagination
 
     def post(self, request):
         data = request.data
-        exchanges_result = ExchangeService().all_exchanges(data)
+        exchange_service = ExchangeService()
+        exchanges_result = exchange_service.all_exchanges(data, request.user)
 
         if isinstance(exchanges_result, int):
             return Response({'error': 'Invalid filters'}, status=exchanges_result)
 
-        serialized_data = ExchangeSerializer(exchanges_result, many=True).data
+        paginator = self.pagination_class()
+        rows = paginator.paginate_queryset(exchange_service.compact_exchanges(exchanges_result), request, view=self)
+
+        if data.get('compact'):
+            return Response({
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                **exchange_service.compact_page(rows),
+            })
 
-        return Response(serialized_data)
+        serialized_data = exchange_service.exchange_page(rows)
+
+        return paginator.get_paginated_response(serialized_data)
+
+
+@extend_schema(
+    tags=["Обмены"],
+    summary="Предлагаемые цепочки обмена",
+    description="Ищет циклы из ожидающих предложений обмена (A → B → C → A), проходящие через объявление "
+                "текущего пользователя, начиная с самых коротких. Каждый участник цепочки отдает свое объявление "
+                "владельцу объявления, которому он сделал предложение.",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "ad_id": {"type": "integer", "example": 1},
+                "max_length": {
+                    "type": "integer",
+                    "description": "Наибольшее число объявлений в цепочке",
+                    "example": 4
+                }
+            },
+            "required": ["ad_id"]
+        }
+    },
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "ad_id": {"type": "integer"},
+                "cycles": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "length": {"type": "integer"},
+                            "exchanges": {"type": "array", "items": {"type": "integer"}}
+                        }
+                    }
+                },
+                "exchanges": {"type": "object"},
+                "ads": {"type": "object"}
+            }
+        },
+        400: {"description": "Неверные параметры"},
+        404: {"description": "Объявление не существует или не принадлежит пользователю"}
+    },
+    examples=[
+        OpenApiExample(
+            "Пример успешного ответа",
+            value={
+                "ad_id": 1,
+                "cycles": [{"length": 3, "exchanges": [10, 11, 12]}],
+                "exchanges": {
+                    "10": {"id": 10, "ad_sender": 1, "ad_receiver": 2},
+                    "11": {"id": 11, "ad_sender": 2, "ad_receiver": 3},
+                    "12": {"id": 12, "ad_sender": 3, "ad_receiver": 1}
+                },
+                "ads": {
+                    "1": {"id": 1, "user": "admin", "title": "iPhone 13"},
+                    "2": {"id": 2, "user": "user1", "title": "Часы Casio"},
+                    "3": {"id": 3, "user": "user2", "title": "Велосипед"}
+                }
+            },
+            response_only=True
+        )
+    ]
+)
+@permission_classes([IsAuthenticated])
+class SuggestedCyclesView(APIView):
+    def post(self, request):
+        cycles_result = ExchangeService().suggested_cycles(request.user, request.data)
+
+        if isinstance(cycles_result, int):
+            return Response({'error': 'Invalid ad_id or max_length'}, status=cycles_result)
+
+        return Response(cycles_result)
+
+
+@extend_schema(
+    tags=["Выгрузка"],
+    summary="Потоковая выгрузка объявлений",
+    description="Возвращает все объявления в формате NDJSON (по одному объекту AdSerializer на строку). "
+                "Принимает те же фильтры, что и получение объявлений.",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "example": "телефон"},
+                "category": {"type": "array", "items": {"type": "string"}, "example": ["Техника"]},
+                "condition": {"type": "array", "items": {"type": "string"}, "example": ["Б/у"]}
+            }
+        }
+    },
+    responses={
+        (200, "application/x-ndjson"): {"type": "string"},
+        400: {"description": "Ошибка фильтрации или неверные параметры"}
+    },
+)
+@permission_classes([IsAuthenticated])
+class ExportAdsView(APIView):
+    def post(self, request):
+        data = request.data
+        ads_result = AdsService().all_ads(data)
+
+        if isinstance(ads_result, int):
+            return Response({'error': 'Invalid filters'}, status=ads_result)
+
+        stream = ExportService().ndjson(ads_result, AdSerializer)
+        return StreamingHttpResponse(stream, content_type='application/x-ndjson')
+
+
+@extend_schema(
+    tags=["Выгрузка"],
+    summary="Потоковая выгрузка предложений обмена",
+    description="Возвращает все предложения обмена в формате NDJSON (по одному объекту ExchangeSerializer на строку). "
+                "Принимает те же фильтры, что и получение предложений обмена.",
+    request={
+        "application/json": {
+            "type": "object",
+            "properties": {
+                "sender_username": {"type": "string", "example": "user1"},
+                "receiver_username": {"type": "string", "example": "user2"},
+                "status": {"type": "array", "items": {"type": "string"}, "example": ["pending"]}
+            }
+        }
+    },
+    responses={
+        (200, "application/x-ndjson"): {"type": "string"},
+        400: {"description": "Ошибка фильтрации или неверные параметры"}
+    },
+)
+@permission_classes([IsAuthenticated])
+class ExportExchangesView(APIView):
+    def post(self, request):
+        data = request.data
+        exchanges_result = ExchangeService().all_exchanges(data, request.user)
+
+        if isinstance(exchanges_result, int):
+            return Response({'error': 'Invalid filters'}, status=exchanges_result)
+
+        stream = ExportService().ndjson(exchanges_result, ExchangeSerializer)
+        return StreamingHttpResponse(stream, content_type='application/x-ndjson')
+
+
+class ReferenceDataView(APIView):
+    # Serves the list pre-rendered from the reference cache and answers If-None-Match with 304
+    reference = None
+    serializer_class = None
+    max_age = 60
+
+    def render_reference(self, objects):
+        data = self.serializer_class(objects, many=True).data
+        body = JSONRenderer().render(data)
+        etag = quote_etag(f'{self.reference.model._meta.model_name}-{hashlib.sha256(body).hexdigest()[:32]}')
+        return data, body, etag
+
+    def get(self, request):
+        return self.reference_response(request, self.reference.memoize(self.serializer_class, self.render_reference))
+
+    def reference_response(self, request, rendered):
+        data, body, etag = rendered
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(data)
+            # Setting the content marks the response as rendered, so DRF does not serialize it again
+            response.content = body
+            response.headers['Content-Type'] = 'application/json'
+
+        response.headers['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=self.max_age)
+        return response
 
 
 # Planned to expand the data provided about the user
@@ -423,6 +976,27 @@ class UserInfoView(APIView):
         return Response({"account": username})
 
 
+@extend_schema(
+    tags=["Пользователь"],
+    summary="Отзыв всех токенов пользователя",
+    description="Делает недействительными все выданные пользователю access и refresh токены, включая текущий.",
+    request=None,
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "is_revoked": {"type": "boolean", "example": True}
+            }
+        }
+    },
+)
+@permission_classes([IsAuthenticated])
+class RevokeTokensView(APIView):
+    def post(self, request):
+        token_versions.revoke(request.user.id)
+        return Response({"is_revoked": True})
+
+
 @extend_schema(
     tags=["Справочники"],
     summary="Получение всех категорий",
@@ -438,11 +1012,9 @@ class UserInfoView(APIView):
     ]
 )
 @permission_classes([IsAuthenticated])
-class CategoriesView(APIView):
-    def get(self, request):
-        categories = HelperService().get_categories()
-        serialized_data = CategorySerializer(categories, many=True).data
-        return Response(serialized_data)
+class CategoriesView(ReferenceDataView):
+    reference = categories
+    serializer_class = CategorySerializer
 
 
 @extend_schema(
@@ -460,8 +1032,6 @@ class CategoriesView(APIView):
     ]
 )
 @permission_classes([IsAuthenticated])
-class ConditionsView(APIView):
-    def get(self, request):
-        conditions = HelperService().get_conditions()
-        serialized_data = CategorySerializer(conditions, many=True).data
-        return Response(serialized_data)
+class ConditionsView(ReferenceDataView):
+    reference = conditions
+    serializer_class = ConditionSerializer
@@ -0,0 +1,187 @@
+import itertools
+import threading
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import LazyObject
+
+# State of the request being handled, set by ReplicaPinningMiddleware
+_request_state = ContextVar('db_router_request_state', default=None)
+
+
+class RequestState:
+    def __init__(self, request):
+        self.request = request
+        self.pinned = False
+        self.wrote = False
+        self.replica = None
+        self.user_checked = False
+
+
+def pin_key(user_id):
+    return f'db_router:pinned:{user_id}'
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the aliases in DATABASE_REPLICAS and writes to DATABASE_PRIMARY.
+
+    A request keeps the replica it got first. After a write the rest of the request
+    and the user's requests for the next DATABASE_PIN_SECONDS read from the primary,
+    so users see their own changes before replication catches up. Reads inside a
+    transaction on the primary stay there.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cycle = None
+        self._cycle_replicas = None
+        self.in_flight = {}
+
+    @property
+    def primary(self):
+        return getattr(settings, 'DATABASE_PRIMARY', DEFAULT_DB_ALIAS)
+
+    @property
+    def replicas(self):
+        return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+    @property
+    def selection(self):
+        return getattr(settings, 'DATABASE_REPLICA_SELECTION', 'round_robin')
+
+    def _round_robin(self, replicas):
+        with self._lock:
+            if self._cycle_replicas != replicas:
+                self._cycle = itertools.cycle(replicas)
+                self._cycle_replicas = replicas
+            return next(self._cycle)
+
+    def _least_loaded(self, replicas):
+        with self._lock:
+            return min(replicas, key=lambda alias: self.in_flight.get(alias, 0))
+
+    def choose_replica(self):
+        replicas = self.replicas
+        if self.selection == 'least_loaded':
+            return self._least_loaded(replicas)
+        return self._round_robin(replicas)
+
+    def acquire(self, alias):
+        with self._lock:
+            self.in_flight[alias] = self.in_flight.get(alias, 0) + 1
+
+    def release(self, alias):
+        with self._lock:
+            self.in_flight[alias] = max(self.in_flight.get(alias, 0) - 1, 0)
+
+    def _is_pinned(self, state):
+        if state.pinned:
+            return True
+
+        if not state.user_checked:
+            # The user is known once authentication replaced the lazy request.user, e.g. in DRF views
+            user = vars(state.request).get('user')
+            if user is not None and not isinstance(user, LazyObject):
+                state.user_checked = True
+                state.pinned = bool(user.is_authenticated and cache.get(pin_key(user.pk)))
+        return state.pinned
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or connections[self.primary].in_atomic_block:
+            return self.primary
+
+        state = _request_state.get()
+        if state is None:
+            return self.choose_replica()
+
+        if self._is_pinned(state):
+            return self.primary
+
+        if state.replica is None:
+            state.replica = self.choose_replica()
+            self.acquire(state.replica)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        # read=True asks for the primary for a read that must not lag, it does not pin the request
+        if state is not None and not hints.get('read'):
+            state.pinned = True
+            state.wrote = True
+        return self.primary
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {self.primary, *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        if db in self.replicas:
+            return False
+        return None
+
+
+def get_replica_router():
+    from django.db import router
+
+    for candidate in router.routers:
+        if isinstance(candidate, ReplicaRouter):
+            return candidate
+    return None
+
+
+class ReplicaPinningMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = RequestState(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.finish(state, token)
+
+        if state.wrote:
+            self.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        state = RequestState(request)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.finish(state, token)
+
+        # request.user may still be lazy and need the database, read requests skip the thread hop
+        if state.wrote:
+            await sync_to_async(self.pin)(request)
+        return response
+
+    @staticmethod
+    def finish(state, token):
+        _request_state.reset(token)
+        replica_router = get_replica_router()
+        if state.replica is not None and replica_router is not None:
+            replica_router.release(state.replica)
+
+    @staticmethod
+    def pin(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            cache.set(pin_key(user.pk), True, timeout=getattr(settings, 'DATABASE_PIN_SECONDS', 5))
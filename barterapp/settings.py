@@ -13,6 +13,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -28,6 +30,8 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 
 # Application definition
@@ -47,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ads.instrumentation.RequestTimingMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     'django.middleware.security.SecurityMiddleware',
@@ -56,18 +61,26 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'barterapp.db_router.ReplicaPinningMiddleware',
 ]
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
-    ]
+        'ads.authentication.ClaimsJWTAuthentication'
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'ads.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=7),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
+    'TOKEN_OBTAIN_SERIALIZER': 'ads.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'ads.authentication.ClaimsTokenRefreshSerializer',
+    'TOKEN_USER_CLASS': 'ads.authentication.ClaimsUser',
 }
 
 ROOT_URLCONF = 'barterapp.urls'
@@ -145,3 +158,138 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Ads search
+# Dotted path to a SearchBackend from ads/services/search_service.py, picked by database vendor when empty
+
+ADS_SEARCH_BACKEND = None
+
+
+# Reference data cache
+# Seconds between checks of the category/condition version stamp kept in the default cache,
+# which has to be shared (e.g. file-based or Redis) for changes to reach other processes
+
+REFERENCE_CACHE_CHECK_INTERVAL = 5
+
+
+# Ads listing cache
+# AdsView pages are cached in the ADS_LISTING_CACHE alias (None disables it). Use FileBasedCache or a shared
+# backend to reuse pages and invalidations across processes; MAX_ENTRIES bounds the number of stored pages,
+# LocMemCache evicts the least recently used ones first
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ads_listing': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ads-listing',
+        'TIMEOUT': 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+ADS_LISTING_CACHE = 'ads_listing'
+
+
+# Read replicas
+# Aliases from DATABASES that serve reads ('round_robin' or 'least_loaded' selection); writes go to DATABASE_PRIMARY.
+# After a write the user's reads stay on the primary for DATABASE_PIN_SECONDS (tracked in the default cache).
+# Reads that refill the reference and listing caches always go to the primary
+
+DATABASE_ROUTERS = ['barterapp.db_router.ReplicaRouter']
+
+DATABASE_PRIMARY = 'default'
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_SELECTION = 'round_robin'
+DATABASE_PIN_SECONDS = 5
+
+
+# SQLite production profile
+# Opt-in with SQLITE_PRODUCTION=1 in the environment: WAL is persistent in the database file, so it is not switched
+# on by every manage.py command. SQLITE_PRAGMAS are applied to every new SQLite connection (ads/services/database.py).
+# WAL lets readers work alongside the writer, busy_timeout makes writers wait for the lock, optimize keeps planner
+# statistics fresh. IMMEDIATE transactions take the write lock up front, so busy_timeout applies instead of failing
+# when a read inside the transaction is followed by a write
+
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION') == '1'
+
+SQLITE_PRAGMAS = {}
+if SQLITE_PRODUCTION:
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -20000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'optimize': '0x10002',
+    }
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+
+# Retries of writes failing with "database is locked", waiting up to SQLITE_LOCK_BACKOFF * 2 ** attempt seconds
+SQLITE_LOCK_RETRIES = 5
+SQLITE_LOCK_BACKOFF = 0.05
+
+
+# JWT claims authentication
+# Requests are authenticated from the token claims without a User query (ads/authentication.py). The token version
+# is read from the default cache for AUTH_TOKEN_VERSION_TTL seconds, which has to be shared for revocations to reach
+# other processes; full User rows are kept per process for AUTH_USER_CACHE_TTL seconds, at most AUTH_USER_CACHE_SIZE
+
+AUTH_TOKEN_VERSION_TTL = 300
+AUTH_USER_CACHE_TTL = 60
+AUTH_USER_CACHE_SIZE = 10000
+
+
+# Barter cycles
+# Trade cycles of up to BARTER_CYCLE_MAX_LENGTH ads are searched in a per-process index of pending proposals
+# (ads/services/barter_graph.py), rebuilt every BARTER_GRAPH_TTL seconds to pick up other processes' writes.
+# A search visits at most BARTER_CYCLE_SEARCH_NODES ads and returns up to BARTER_CYCLE_LIMIT cycles
+
+BARTER_CYCLE_MAX_LENGTH = 5
+BARTER_CYCLE_LIMIT = 10
+BARTER_CYCLE_SEARCH_NODES = 100000
+BARTER_GRAPH_TTL = 300
+
+
+# Idempotency keys
+# create-ad, create-exchange and edit-exchange requests with an Idempotency-Key header run once per user and key;
+# the response is stored in the database (ads/services/idempotency_service.py) and replayed to retries for
+# IDEMPOTENCY_KEY_TTL seconds. Expired keys are deleted by the purge_idempotency_keys command
+
+IDEMPOTENCY_KEY_TTL = 86400
+
+
+# JSON rendering
+# FastJSONRenderer (ads/renderers.py) writes the same bytes as DRF's JSONRenderer through a faster encoder.
+# ADS_JSON_ENCODER is the dotted path of a callable returning JSON bytes; None uses orjson when it is installed
+
+ADS_JSON_ENCODER = None
+
+
+# Request instrumentation
+# Adds a Server-Timing header (SQL count and time, serialization, rendering, total) to every response and logs
+# the same numbers as a JSON line on the ads.instrumentation logger
+
+REQUEST_TIMING = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'ads.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
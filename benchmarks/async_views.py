@@ -0,0 +1,82 @@
+"""
+Sync vs async listing views under concurrent clients.
+
+    python -m benchmarks.async_views --ads 100000 --concurrency 64 --requests 2000
+
+"wsgi" drives the sync /ads/ view from a thread pool through the WSGI handler,
+"asgi-sync" sends the same requests to /ads/ through the ASGI handler (Django
+runs the view in its sync thread) and "asgi-async" to /async/ads/. The listing
+cache is disabled so every request reaches the database.
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import setup, seed_ads, analyze, summarize, CATEGORIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=100_000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    setup(args.db)
+    seed_ads(args.ads)
+    analyze()
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import AsyncClient, Client, override_settings
+    from ads.authentication import ClaimsRefreshToken
+
+    user = User.objects.order_by('id').first()
+    headers = {'Authorization': f'Bearer {ClaimsRefreshToken.for_user(user).access_token}'}
+    payloads = [{}, {'query': 'телефон'}] + [{'category': [name]} for name in CATEGORIES]
+
+    def sync_run(url):
+        def request(i):
+            started = time.perf_counter()
+            response = Client().post(url, payloads[i % len(payloads)], content_type='application/json',
+                                     headers=headers)
+            assert response.status_code == 200, response.content
+            connection.close()
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            return list(pool.map(request, range(args.requests)))
+
+    def async_run(url):
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def request(i):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post(url, payloads[i % len(payloads)], content_type='application/json',
+                                                 headers=headers)
+                    assert response.status_code == 200, response.content
+                    return time.perf_counter() - started
+
+            return await asyncio.gather(*(request(i) for i in range(args.requests)))
+
+        return asyncio.run(run())
+
+    modes = [('wsgi', sync_run, '/ads/'), ('asgi-sync', async_run, '/ads/'), ('asgi-async', async_run, '/async/ads/')]
+
+    print(f'{"mode":<11} {"req/s":>8} {"p50 ms":>10} {"p99 ms":>10}')
+    with override_settings(ADS_LISTING_CACHE=None):
+        for mode, run, url in modes:
+            started = time.perf_counter()
+            samples = run(url)
+            elapsed = time.perf_counter() - started
+            stats = summarize(samples)
+            print(f'{mode:<11} {round(len(samples) / elapsed, 1):>8} {stats["p50_ms"]:>10} {stats["p99_ms"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Barter cycle search over a synthetic proposal graph held in the in-memory index.
+
+    python -m benchmarks.barter_cycles --ads 500000 --edges 2000000 --max-length 5
+
+Receivers follow a Zipf-like distribution, so a few "hot" ads collect most of
+the proposals as on a real marketplace. The graph is loaded straight into
+BarterGraph without the database; the numbers cover the index build, its
+memory and BarterGraph.cycles for random ads and for the most proposed ones.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from benchmarks.utils import setup, measure, summarize
+
+
+def synthetic_edges(ads, edges, exponent, seed):
+    rng = random.Random(seed)
+    # Ranks drawn from a Pareto tail give a Zipf-like receiver popularity
+    for _ in range(edges):
+        sender = rng.randrange(ads)
+        receiver = min(int(rng.paretovariate(exponent)) - 1, ads - 1)
+        receiver = (receiver * 7919) % ads
+        if sender != receiver:
+            yield sender, receiver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=500_000)
+    parser.add_argument('--edges', type=int, default=2_000_000)
+    parser.add_argument('--exponent', type=float, default=0.6)
+    parser.add_argument('--max-length', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    setup(args.db)
+
+    from ads.services.barter_graph import BarterGraph
+
+    graph = BarterGraph()
+    tracemalloc.start()
+    started = time.perf_counter()
+    graph.load(synthetic_edges(args.ads, args.edges, args.exponent, args.seed), ttl=3600)
+    build_s = time.perf_counter() - started
+    memory_mb = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    print(f'build: {graph.edge_count} edges in {build_s:.2f} s, {memory_mb:.0f} MiB')
+
+    # Only ads that both send and receive proposals can be on a cycle
+    candidates = sorted(graph._in.keys() & graph._out.keys())
+    groups = {
+        'random': random.Random(args.seed).sample(candidates, min(args.repeat, len(candidates))),
+        'hot': sorted(candidates, key=lambda node: len(graph._in[node]), reverse=True)[:args.repeat],
+    }
+
+    print(f'{"ads":<8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"cycles/ad":>10}')
+    for name, ad_ids in groups.items():
+        queue = iter(ad_ids)
+        found = []
+        stats = summarize(measure(lambda: found.append(len(graph.cycles(next(queue), args.max_length,
+                                                                          args.limit))), len(ad_ids)))
+        print(f'{name:<8} {stats["p50_ms"]:>8} {stats["p95_ms"]:>8} {stats["p99_ms"]:>8} '
+              f'{sum(found) / len(found):>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Latency, queries and peak memory for every endpoint on seeded datasets.
+
+    python -m benchmarks.endpoints --sizes 10000,100000,1000000 --output results.json
+    python -m benchmarks.endpoints --sizes 10000 --compare results.json
+
+For each size the database is grown to that many ads and proposals, then each
+scenario is sent through the test client (sync views) or the in-process ASGI
+client (async views) with a JWT header. Results are written as JSON together
+with the commit they were measured on; --compare prints p50/p99 changes against
+an earlier results file.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.utils import setup, seed_ads, seed_proposals, analyze, summarize, CATEGORIES, CONDITIONS
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def build_scenarios(user, rng_seed=42):
+    import random
+
+    from ads.models import Ad, ExchangeProposal
+
+    rng = random.Random(rng_seed)
+    own_ad_ids = list(Ad.objects.filter(user=user).values_list('id', flat=True))
+    other_ad_ids = list(Ad.objects.exclude(user=user).order_by('?').values_list('id', flat=True)[:1000])
+    received_ids = list(ExchangeProposal.objects.filter(ad_receiver__user=user).values_list('id', flat=True))
+    deletable = []
+
+    def new_ad():
+        return {'title': 'Телефон', 'description': 'Хороший телефон', 'category': rng.choice(CATEGORIES),
+                'condition': rng.choice(CONDITIONS)}
+
+    def delete_payload():
+        if not deletable:
+            deletable.extend(Ad.objects.filter(user=user, title='Телефон').order_by('-id')
+                             .values_list('id', flat=True)[:100])
+        return {'ad_id': deletable.pop() if deletable else 0}
+
+    # (endpoint, scenario, method, url, payload factory); writes run after reads so
+    # they do not change what the reads see
+    return [
+        ('user-info', 'default', 'get', '/user-info/', None),
+        ('categories', 'default', 'get', '/categories/', None),
+        ('conditions', 'default', 'get', '/conditions/', None),
+        ('ads', 'unfiltered', 'post', '/ads/', lambda: {}),
+        ('ads', 'query', 'post', '/ads/', lambda: {'query': rng.choice(['телефон', 'новый', 'кожаный рюкзак'])}),
+        ('ads', 'category', 'post', '/ads/', lambda: {'category': [rng.choice(CATEGORIES)]}),
+        ('ads', 'category+condition', 'post', '/ads/',
+         lambda: {'category': rng.sample(CATEGORIES, 2), 'condition': [rng.choice(CONDITIONS)]}),
+        ('ads', 'query+category', 'post', '/ads/',
+         lambda: {'query': 'новый', 'category': [rng.choice(CATEGORIES)]}),
+        ('ads', 'most_wanted', 'post', '/ads/', lambda: {'sort': 'most_wanted'}),
+        ('exchanges', 'unfiltered', 'post', '/exchanges/', lambda: {}),
+        ('exchanges', 'sender', 'post', '/exchanges/', lambda: {'sender_username': user.username}),
+        ('exchanges', 'receiver+status', 'post', '/exchanges/',
+         lambda: {'receiver_username': user.username, 'status': ['pending']}),
+        ('exchanges', 'compact', 'post', '/exchanges/', lambda: {'compact': True}),
+        ('my-ads', 'default', 'post', '/my-ads/', lambda: {}),
+        ('my-ads', 'page_size=100', 'post', '/my-ads/?page_size=100', lambda: {}),
+        ('export-ads', 'query+category', 'post', '/export-ads/',
+         lambda: {'query': 'винтажный', 'category': [rng.choice(CATEGORIES)]}),
+        ('export-exchanges', 'sender', 'post', '/export-exchanges/', lambda: {'sender_username': user.username}),
+        ('async/ads', 'category', 'apost', '/async/ads/', lambda: {'category': [rng.choice(CATEGORIES)]}),
+        ('async/exchanges', 'receiver+status', 'apost', '/async/exchanges/',
+         lambda: {'receiver_username': user.username, 'status': ['pending']}),
+        ('create-ad', 'default', 'post', '/create-ad/', new_ad),
+        ('create-ads', '50 ads', 'post', '/create-ads/', lambda: {'ads': [new_ad() for _ in range(50)]}),
+        ('edit-ad', 'default', 'post', '/edit-ad/',
+         lambda: {'ad_id': rng.choice(own_ad_ids), **new_ad(), 'title': 'Часы'}),
+        ('delete-ad', 'default', 'post', '/delete-ad/', delete_payload),
+        ('create-exchange', 'default', 'post', '/create-exchange/',
+         lambda: {'ad_sender_id': rng.choice(own_ad_ids), 'ad_receiver_id': rng.choice(other_ad_ids),
+                  'comment': 'Давай меняться?'}),
+        ('edit-exchange', 'default', 'post', '/edit-exchange/',
+         lambda: {'exchange_id': rng.choice(received_ids or [0]), 'status': rng.choice(['accepted', 'declined'])}),
+        ('edit-exchanges', '20 proposals', 'post', '/edit-exchanges/',
+         lambda: {'exchange_ids': rng.sample(received_ids, min(20, len(received_ids))) or [0],
+                  'status': rng.choice(['accepted', 'declined'])}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--only', default=None, help='comma-separated endpoints to run')
+    parser.add_argument('--listing-cache', action='store_true', help='keep the ads listing cache enabled')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    setup(args.db)
+
+    import django
+    from asgiref.sync import async_to_sync
+    from django.db import connection
+    from django.test import AsyncClient, Client, override_settings
+    from ads.authentication import ClaimsRefreshToken
+
+    commit = git_commit()
+    output = args.output or os.path.join(tempfile.gettempdir(), f'barter_endpoints_{commit}.json')
+    only = set(args.only.split(',')) if args.only else None
+    results = []
+
+    overrides = {} if args.listing_cache else {'ADS_LISTING_CACHE': None}
+    with override_settings(**overrides):
+        for size in [int(size) for size in args.sizes.split(',')]:
+            seed_ads(size)
+            seed_proposals(size)
+            analyze()
+
+            from django.contrib.auth.models import User
+            from ads.models import Ad
+
+            user = User.objects.get(id=Ad.objects.order_by('id').values_list('user_id', flat=True)[0])
+            headers = {'Authorization': f'Bearer {ClaimsRefreshToken.for_user(user).access_token}'}
+            client, async_client = Client(headers=headers), AsyncClient()
+
+            def send(method, url, payload):
+                if method == 'get':
+                    response = client.get(url)
+                elif method == 'post':
+                    response = client.post(url, payload, content_type='application/json')
+                else:
+                    response = async_to_sync(async_client.post)(url, payload, content_type='application/json',
+                                                                headers=headers)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                return response
+
+            print(f'{"size":>8} {"endpoint":<17} {"scenario":<19} {"status":>6} {"p50 ms":>9} {"p95 ms":>9} '
+                  f'{"p99 ms":>9} {"queries":>8} {"peak MB":>8}')
+            for endpoint, scenario, method, url, make_payload in build_scenarios(user):
+                if only and endpoint not in only:
+                    continue
+
+                # A warm-up request fills the caches; queries are counted through an execute wrapper,
+                # as the client resets connection.queries per request
+                send(method, url, make_payload() if make_payload else None)
+                queries = []
+                payload = make_payload() if make_payload else None
+                with connection.execute_wrapper(lambda execute, sql, *rest: queries.append(sql) or execute(sql, *rest)):
+                    response = send(method, url, payload)
+
+                payload = make_payload() if make_payload else None
+                tracemalloc.start()
+                send(method, url, payload)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                samples = []
+                for _ in range(args.repeat):
+                    payload = make_payload() if make_payload else None
+                    started = time.perf_counter()
+                    send(method, url, payload)
+                    samples.append(time.perf_counter() - started)
+
+                result = {
+                    'size': size, 'endpoint': endpoint, 'scenario': scenario, 'url': url,
+                    'status': response.status_code, 'queries': len(queries),
+                    'peak_mb': round(peak / 1024 / 1024, 2), **summarize(samples),
+                }
+                results.append(result)
+                print(f'{size:>8} {endpoint:<17} {scenario:<19} {result["status"]:>6} {result["p50_ms"]:>9} '
+                      f'{result["p95_ms"]:>9} {result["p99_ms"]:>9} {result["queries"]:>8} {result["peak_mb"]:>8}')
+
+    report = {
+        'commit': commit,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'repeat': args.repeat,
+        'listing_cache': args.listing_cache,
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'results written to {output}')
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+def compare(path, report):
+    with open(path) as f:
+        previous = json.load(f)
+    before = {(r['size'], r['endpoint'], r['scenario']): r for r in previous['results']}
+
+    print(f'\ncompared with {previous["commit"]}')
+    print(f'{"size":>8} {"endpoint":<17} {"scenario":<19} {"p50":>8} {"p99":>8} {"queries":>10}')
+    for result in report['results']:
+        old = before.get((result['size'], result['endpoint'], result['scenario']))
+        if old is None:
+            continue
+        p50 = f'{(result["p50_ms"] - old["p50_ms"]) / old["p50_ms"]:+.0%}' if old['p50_ms'] else '-'
+        p99 = f'{(result["p99_ms"] - old["p99_ms"]) / old["p99_ms"]:+.0%}' if old['p99_ms'] else '-'
+        print(f'{result["size"]:>8} {result["endpoint"]:<17} {result["scenario"]:<19} {p50:>8} {p99:>8} '
+              f'{old["queries"]:>4} → {result["queries"]:<4}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+ExchangesView latency and peak memory as the proposal table grows.
+
+    python -m benchmarks.exchanges --sizes 10000,100000,1000000
+
+The "unpaginated" rows serialize the whole filtered queryset the way
+ExchangesView did before cursor pagination; they are only run up to
+--unpaginated-limit proposals.
+"""
+import argparse
+import tracemalloc
+
+from benchmarks.utils import setup, seed_ads, seed_proposals, analyze, measure, summarize
+
+
+def peak_memory_mb(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--ads', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--unpaginated-limit', type=int, default=100_000)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    setup(args.db)
+    seed_ads(args.ads)
+
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from ads.serializers import ExchangeSerializer
+    from ads.services.exchanges_service import ExchangeService
+    from ads.views import ExchangesView
+
+    user = User.objects.order_by('id').first()
+    factory = APIRequestFactory()
+    view = ExchangesView.as_view()
+    filters = {
+        'unfiltered': {},
+        'receiver': {'receiver_username': user.username, 'status': ['pending']},
+    }
+
+    def paginated(data):
+        request = factory.post('/exchanges/', data, format='json')
+        force_authenticate(request, user=user)
+        response = view(request)
+        response.render()
+
+    def unpaginated(data):
+        ExchangeSerializer(ExchangeService().all_exchanges(data), many=True).data
+
+    print(f'{"proposals":>10} {"mode":<12} {"filter":<11} {"p50 ms":>10} {"p95 ms":>10} {"peak MB":>9}')
+    for size in [int(size) for size in args.sizes.split(',')]:
+        seed_proposals(size)
+        analyze()
+        modes = [('paginated', paginated, args.repeat)]
+        if size <= args.unpaginated_limit:
+            modes.append(('unpaginated', unpaginated, 3))
+
+        for mode, fn, repeat in modes:
+            for name, data in filters.items():
+                fn(data)
+                stats = summarize(measure(lambda: fn(data), repeat))
+                peak = peak_memory_mb(lambda: fn(data))
+                print(f'{size:>10} {mode:<12} {name:<11} {stats["p50_ms"]:>10} {stats["p95_ms"]:>10} {peak:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Idempotency keys: overhead on create-ad and duplicates under concurrent retries.
+
+    python -m benchmarks.idempotency --requests 500 --threads 8 --retries 4
+
+"plain" creates ads without a key, "first" with a new key each time and
+"replay" repeats those keys. The concurrency check starts --retries threads
+with the same key at once, --threads groups at a time, and counts the ads
+that were actually created.
+"""
+import argparse
+import threading
+import uuid
+
+from benchmarks.utils import setup, measure, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--retries', type=int, default=4)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    setup(args.db)
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from ads.models import Ad, Category, Condition
+    from ads.services.ads_service import AdsService
+    from ads.services.idempotency_service import IdempotencyService
+
+    user, _ = User.objects.get_or_create(username='bench_idempotency')
+    Category.objects.get_or_create(name='Техника')
+    Condition.objects.get_or_create(name='Б/у')
+    data = {'title': 'iPhone 13', 'description': 'Хорошее состояние', 'category': 'Техника', 'condition': 'Б/у'}
+
+    def create(key=None):
+        if key is None:
+            return AdsService().create_ad(user, data)
+        return IdempotencyService().run(user, key, 'create-ad', data, lambda: AdsService().create_ad(user, data))
+
+    keys = [str(uuid.uuid4()) for _ in range(args.requests)]
+    first, replay = iter(keys), iter(keys)
+    print(f'{"path":<8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    for name, fn in (('plain', create), ('first', lambda: create(next(first))), ('replay', lambda: create(next(replay)))):
+        stats = summarize(measure(fn, args.requests))
+        print(f'{name:<8} {stats["p50_ms"]:>8} {stats["p95_ms"]:>8} {stats["p99_ms"]:>8}')
+
+    before = Ad.objects.filter(user=user).count()
+    replayed = []
+    groups = [[str(uuid.uuid4())] * args.retries for _ in range(args.threads)]
+
+    def retry(key, barrier):
+        barrier.wait()
+        try:
+            replayed.append(create(key)[1])
+        finally:
+            connection.close()
+
+    barrier = threading.Barrier(args.threads * args.retries)
+    threads = [threading.Thread(target=retry, args=(key, barrier)) for group in groups for key in group]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f'concurrent: {len(threads)} requests, {len(groups)} keys, '
+          f'{Ad.objects.filter(user=user).count() - before} ads created, {sum(replayed)} replayed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Ad search latency: FTS5 index vs icontains scan.
+
+    python -m benchmarks.search --ads 1000000
+"""
+import argparse
+
+from benchmarks.utils import setup, seed_ads, analyze, measure, summarize
+
+QUERIES = ['новый', 'телефон', 'ЕЛКА', 'вин', 'кожаный рюкзак', 'модель4242']
+BACKENDS = {
+    'fts5': 'ads.services.search_service.SQLiteFTSSearchBackend',
+    'icontains': 'ads.services.search_service.ContainsSearchBackend',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    setup(args.db)
+    seed_ads(args.ads)
+    analyze()
+
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from ads.views import AdsView
+
+    user = User.objects.first()
+    factory = APIRequestFactory()
+    view = AdsView.as_view()
+
+    def search(query):
+        request = factory.post('/ads/', {'query': query}, format='json')
+        force_authenticate(request, user=user)
+        response = view(request)
+        response.render()
+        return response
+
+    print(f'{"backend":<10} {"query":<16} {"p50 ms":>10} {"p95 ms":>10} {"p99 ms":>10}')
+    for name, backend in BACKENDS.items():
+        with override_settings(ADS_SEARCH_BACKEND=backend, ADS_LISTING_CACHE=None):
+            for query in QUERIES:
+                search(query)
+                stats = summarize(measure(lambda: search(query), args.repeat))
+                print(f'{name:<10} {query:<16} {stats["p50_ms"]:>10} {stats["p95_ms"]:>10} {stats["p99_ms"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Serializer vs values() fast path and JSONRenderer vs FastJSONRenderer on list pages.
+
+    python -m benchmarks.serialization --ads 100000 --proposals 100000 --page-size 100
+
+"serializer" reads model instances and runs AdSerializer/ExchangeSerializer,
+"values" reads values() rows and builds the same dicts (AdsService.ad_page,
+ExchangeService.exchange_page). The render columns encode the resulting page.
+"""
+import argparse
+
+from benchmarks.utils import setup, seed_ads, seed_proposals, analyze, measure, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ads', type=int, default=100_000)
+    parser.add_argument('--proposals', type=int, default=100_000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    setup(args.db)
+    seed_ads(args.ads)
+    seed_proposals(args.proposals)
+    analyze()
+
+    from rest_framework.renderers import JSONRenderer
+    from ads.renderers import FastJSONRenderer
+    from ads.serializers import AdSerializer, ExchangeSerializer
+    from ads.services.ads_service import AdsService
+    from ads.services.exchanges_service import ExchangeService
+
+    ads = AdsService().all_ads({}).order_by('created_at')[:args.page_size]
+    exchanges = ExchangeService().all_exchanges({}).order_by('created_at', 'id')[:args.page_size]
+    paths = {
+        'ads': {
+            'serializer': lambda: AdSerializer(list(ads), many=True).data,
+            'values': lambda: AdsService().ad_page(list(AdsService().ad_values(ads))),
+        },
+        'exchanges': {
+            'serializer': lambda: ExchangeSerializer(list(exchanges), many=True).data,
+            'values': lambda: ExchangeService().exchange_page(list(ExchangeService().compact_exchanges(exchanges))),
+        },
+    }
+    renderers = {'JSONRenderer': JSONRenderer(), 'FastJSONRenderer': FastJSONRenderer()}
+
+    print(f'{"endpoint":<10} {"path":<11} {"p50 ms":>8} {"p95 ms":>8}   '
+          + '   '.join(f'{name + " p50":>20}' for name in renderers))
+    for endpoint, builders in paths.items():
+        for path, build in builders.items():
+            page = build()
+            stats = summarize(measure(build, args.repeat))
+            rendered = [summarize(measure(lambda: renderer.render(page), args.repeat))['p50_ms']
+                        for renderer in renderers.values()]
+            print(f'{endpoint:<10} {path:<11} {stats["p50_ms"]:>8} {stats["p95_ms"]:>8}   '
+                  + '   '.join(f'{p50:>20}' for p50 in rendered))
+
+
+if __name__ == '__main__':
+    main()
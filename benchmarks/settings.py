@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+# Benchmarks measure the production SQLite profile unless they override it
+os.environ.setdefault('SQLITE_PRODUCTION', '1')
+
+from barterapp.settings import *
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver']
+
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'NAME': os.environ.get('BENCH_DB', os.path.join(tempfile.gettempdir(), 'barter_bench.sqlite3')),
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
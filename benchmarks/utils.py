@@ -0,0 +1,150 @@
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+WORDS = [
+    'телефон', 'часы', 'куртка', 'велосипед', 'ноутбук', 'наушники', 'кроссовки', 'книга', 'гитара',
+    'ёлка', 'самокат', 'планшет', 'рюкзак', 'фотоаппарат', 'коляска', 'диван', 'лампа',
+    'iphone', 'samsung', 'casio', 'nike', 'lego', 'sony', 'xiaomi', 'dyson', 'ikea', 'apple',
+]
+ADJECTIVES = [
+    'новый', 'хороший', 'рабочий', 'отличный', 'детский', 'зимний', 'кожаный', 'черный', 'белый',
+    'большой', 'маленький', 'редкий', 'винтажный', 'удобный', 'легкий', 'мощный',
+]
+CATEGORIES = ['Техника', 'Часы', 'Одежда', 'Запчасти', 'Книги', 'Спорт', 'Дом', 'Детям']
+CONDITIONS = ['Новое', 'Б/у', 'На запчасти']
+
+
+def setup(db_name=None):
+    if db_name:
+        os.environ['BENCH_DB'] = db_name
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+SYLLABLES = ['ка', 'ло', 'ми', 'ре', 'ту', 'на', 'ви', 'со', 'ром', 'дек', 'пас', 'лин', 'тор', 'зе', 'бу']
+
+
+def build_vocabulary(size=3000, seed=0):
+    # Adjectives are the most frequent words, item names follow, then a long synthetic tail
+    rng = random.Random(seed)
+    vocabulary = list(dict.fromkeys(ADJECTIVES + WORDS))
+    while len(vocabulary) < size:
+        word = ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+        if word not in vocabulary:
+            vocabulary.append(word)
+    return vocabulary
+
+
+VOCABULARY = build_vocabulary()
+VOCABULARY_WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def random_text(rng, words):
+    # Zipf-distributed words plus a rare model number
+    text = rng.choices(VOCABULARY, weights=VOCABULARY_WEIGHTS, k=words)
+    text.append(f'модель{rng.randrange(100000)}')
+    return ' '.join(text)
+
+
+def seed_ads(count, users=1000, chunk_size=5000, seed=42):
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from ads.models import Ad, Category, Condition
+
+    existing = Ad.objects.count()
+    if existing >= count:
+        return existing
+
+    rng = random.Random(seed + existing)
+    categories = [Category.objects.get_or_create(name=name)[0] for name in CATEGORIES]
+    conditions = [Condition.objects.get_or_create(name=name)[0] for name in CONDITIONS]
+
+    if User.objects.count() < users:
+        User.objects.bulk_create(
+            [User(username=f'bench{i}', password='!') for i in range(User.objects.count(), users)],
+            batch_size=chunk_size,
+        )
+    user_ids = list(User.objects.values_list('id', flat=True)[:users])
+
+    for start in range(existing, count, chunk_size):
+        with transaction.atomic():
+            Ad.objects.bulk_create([
+                Ad(user_id=rng.choice(user_ids), title=random_text(rng, 3), description=random_text(rng, 12),
+                   category=rng.choice(categories), condition=rng.choice(conditions))
+                for _ in range(min(chunk_size, count - start))
+            ], batch_size=chunk_size)
+        if (start // chunk_size) % 20 == 19:
+            print(f'seeded {min(start + chunk_size, count)}/{count} ads', file=sys.stderr)
+    return count
+
+
+def seed_proposals(count, chunk_size=5000, seed=42):
+    from django.core.management import call_command
+    from django.db import transaction
+    from ads.models import Ad, ExchangeProposal
+
+    existing = ExchangeProposal.objects.count()
+    if existing >= count:
+        return existing
+
+    rng = random.Random(seed + existing)
+    ad_ids = list(Ad.objects.values_list('id', flat=True))
+    statuses = ['pending'] * 6 + ['accepted'] * 2 + ['declined'] * 2
+
+    for start in range(existing, count, chunk_size):
+        with transaction.atomic():
+            proposals = []
+            for _ in range(min(chunk_size, count - start)):
+                ad_sender_id, ad_receiver_id = rng.sample(ad_ids, 2)
+                proposals.append(ExchangeProposal(ad_sender_id=ad_sender_id, ad_receiver_id=ad_receiver_id,
+                                                  status=rng.choice(statuses), comment='Давай меняться?'))
+            # Repeated pending pairs are skipped by exchange_pending_pair_uniq
+            ExchangeProposal.objects.bulk_create(proposals, batch_size=chunk_size, ignore_conflicts=True)
+        if (start // chunk_size) % 20 == 19:
+            print(f'seeded {min(start + chunk_size, count)}/{count} proposals', file=sys.stderr)
+
+    # bulk_create bypasses the services, so the Ad proposal counters are recomputed afterwards
+    call_command('reconcile_proposal_counts', stdout=sys.stderr)
+    return count
+
+
+def analyze():
+    # Fresh planner statistics, as a production database gets from PRAGMA optimize
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        'p50_ms': round(percentile(50) * 1000, 3),
+        'p95_ms': round(percentile(95) * 1000, 3),
+        'p99_ms': round(percentile(99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+    }
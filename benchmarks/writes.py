@@ -0,0 +1,168 @@
+"""
+Concurrent write throughput: default SQLite settings vs the production profile.
+
+    python -m benchmarks.writes --threads 8 --ops 200 --readers 2
+
+Each profile runs in its own process against a fresh database file. Writer
+threads mix create-ad, edit-ad, create-exchange and edit-exchange service
+calls while reader threads list the first page of ads. The "default" profile
+uses SQLite's rollback journal, deferred transactions, no pragmas and no
+lock retries.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.utils import setup, seed_ads, summarize
+
+PROFILES = {
+    'default': {'SQLITE_PRAGMAS': {'journal_mode': 'DELETE'}, 'SQLITE_LOCK_RETRIES': 0,
+                'DATABASE_OPTIONS': {'transaction_mode': 'DEFERRED'}},
+    'production': {},
+}
+
+
+def run_profile(profile, threads, ops, readers, seed):
+    db_name = os.path.join(tempfile.gettempdir(), f'barter_writes_{profile}.sqlite3')
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(db_name + suffix):
+            os.remove(db_name + suffix)
+
+    os.environ['BENCH_DB'] = db_name
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    from django.conf import settings
+    for name, value in PROFILES[profile].items():
+        if name == 'DATABASE_OPTIONS':
+            settings.DATABASES['default']['OPTIONS'] = value
+        else:
+            setattr(settings, name, value)
+
+    setup()
+    seed_ads(1000, users=threads)
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from ads.models import Ad, ExchangeProposal
+    from ads.services.ads_service import AdsService
+    from ads.services.exchanges_service import ExchangeService
+
+    users = list(User.objects.order_by('id')[:threads])
+    ad_ids = {user.id: list(Ad.objects.filter(user=user).values_list('id', flat=True)) for user in users}
+    all_ad_ids = list(Ad.objects.values_list('id', flat=True))
+    connection.close()
+
+    latencies, failures, errors = [], [], []
+    stop_reading = threading.Event()
+    read_latencies = []
+    lock = threading.Lock()
+
+    def writer(user, rng):
+        own = ad_ids[user.id]
+        samples, failed = [], []
+        for _ in range(ops):
+            kind = rng.random()
+            started = time.perf_counter()
+            if kind < 0.5:
+                result = AdsService().create_ad(user, {'title': 'Телефон', 'description': 'Хороший телефон',
+                                                       'category': 'Техника', 'condition': 'Б/у'})
+                ok = result['is_created']
+            elif kind < 0.75:
+                result = AdsService().edit_ad(user, {'ad_id': rng.choice(own), 'title': 'Часы',
+                                                     'description': 'Крутые часы', 'category': 'Часы',
+                                                     'condition': 'Б/у'})
+                ok = result['is_edited']
+            elif kind < 0.9:
+                result = ExchangeService().create_exchange(user, {'ad_sender_id': rng.choice(own),
+                                                                  'ad_receiver_id': rng.choice(all_ad_ids)})
+                ok = result['is_created'] or 'yourself' in result['message']
+            else:
+                exchange_ids = list(ExchangeProposal.objects.filter(ad_receiver__user=user)
+                                    .values_list('id', flat=True)[:20])
+                result = ExchangeService().edit_exchanges(user, {'exchange_ids': exchange_ids or [0],
+                                                                'status': rng.choice(['accepted', 'declined'])})
+                ok = 'edited_ids' in result
+            samples.append(time.perf_counter() - started)
+            if not ok:
+                failed.append(result['message'])
+        connection.close()
+        with lock:
+            latencies.extend(samples)
+            failures.extend(failed)
+
+    def reader():
+        samples = []
+        while not stop_reading.is_set():
+            started = time.perf_counter()
+            try:
+                list(AdsService().all_ads({'category': ['Техника']}).order_by('-created_at')[:10])
+            except Exception as e:
+                errors.append(str(e))
+            samples.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            read_latencies.extend(samples)
+
+    writer_threads = [threading.Thread(target=writer, args=(user, random.Random(seed + i)))
+                      for i, user in enumerate(users)]
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+
+    started = time.perf_counter()
+    for thread in writer_threads + reader_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop_reading.set()
+    for thread in reader_threads:
+        thread.join()
+
+    locked = sum('locked' in message for message in failures)
+    return {
+        'profile': profile,
+        'writes': len(latencies),
+        'writes_per_s': round(len(latencies) / elapsed, 1),
+        'failed': len(failures),
+        'locked': locked,
+        'write': summarize(latencies),
+        'reads': len(read_latencies),
+        'read': summarize(read_latencies) if read_latencies else None,
+        'read_errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=200)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args.threads, args.ops, args.readers, args.seed)))
+        return
+
+    print(f'{"profile":<12} {"writes/s":>10} {"failed":>8} {"locked":>8} {"write p50":>10} {"write p99":>10} '
+          f'{"reads":>8} {"read p50":>10} {"read p99":>10}')
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.writes', '--profile', profile, '--threads', str(args.threads),
+             '--ops', str(args.ops), '--readers', str(args.readers), '--seed', str(args.seed)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        read = result['read'] or {'p50_ms': '-', 'p99_ms': '-'}
+        print(f'{profile:<12} {result["writes_per_s"]:>10} {result["failed"]:>8} {result["locked"]:>8} '
+              f'{result["write"]["p50_ms"]:>10} {result["write"]["p99_ms"]:>10} {result["reads"]:>8} '
+              f'{read["p50_ms"]:>10} {read["p99_ms"]:>10}')
+
+
+if __name__ == '__main__':
+    main()